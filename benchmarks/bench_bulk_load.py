@@ -0,0 +1,110 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bulk_load import bulk_load
+from config import DB_CONFIG
+from db_pool import ConnectionPool
+from ingest import INSERT_COLUMNS, INSERT_SQL, ingest_csv
+from synthetic_data import write_kaggle_csv
+
+METHODS = ['executemany', 'stream', 'bulk', 'bulk-noindex']
+
+
+# The pre-streaming load_data() path: whole file in memory, row tuples,
+# executemany in batches of 100 with a commit per batch
+def legacy_executemany(connection, path, batch_size=100):
+    df = pd.read_csv(path).dropna()
+    df.rename(columns={'Time': 'transaction_time', 'Class': 'is_fraud'}, inplace=True)
+    df.columns = [col.lower() for col in df.columns]
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT a.account_id, c.card_id
+            FROM Accounts a
+            JOIN CreditCards c ON a.account_id = c.account_id
+        """)
+        pairs = cursor.fetchall()
+        while len(pairs) < len(df):
+            pairs += random.sample(pairs, len(pairs))
+        pairs = pairs[:len(df)]
+        full_data = pd.concat([pd.DataFrame(pairs, columns=['account_id', 'card_id']), df.reset_index(drop=True)],
+                              axis=1)
+        values = [tuple(row) for row in full_data[INSERT_COLUMNS].values]
+        for i in range(0, len(values), batch_size):
+            cursor.executemany(INSERT_SQL, values[i:i + batch_size])
+            conn.commit()
+        cursor.close()
+    return {'rows_inserted': len(values)}
+
+
+def max_transaction_id(connection):
+    with connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT COALESCE(MAX(transaction_id), 0) FROM Transactions")
+        value = cursor.fetchone()[0]
+        cursor.close()
+    return value
+
+
+# Remove the benchmark's rows so every method starts from the same table
+def delete_after(connection, last_id, batch_size=50000):
+    with connection(autocommit=True) as conn:
+        cursor = conn.cursor()
+        while True:
+            cursor.execute("DELETE FROM Transactions WHERE transaction_id > %s LIMIT %s", (last_id, batch_size))
+            if cursor.rowcount < batch_size:
+                break
+        cursor.close()
+
+
+def run_method(method, connection, path):
+    if method == 'executemany':
+        return legacy_executemany(connection, path)
+    if method == 'stream':
+        return ingest_csv(connection, path)
+    if method == 'bulk':
+        return bulk_load(DB_CONFIG, path)
+    if method == 'bulk-noindex':
+        return bulk_load(DB_CONFIG, path, disable_indexes=True)
+    raise ValueError(f"Unknown method: {method}")
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare CSV load paths into Transactions")
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--csv', default=os.path.join('temp', 'bench_creditcard.csv'))
+    parser.add_argument('--methods', default=','.join(METHODS), help=f"comma-separated, from {METHODS}")
+    parser.add_argument('--keep', action='store_true', help="keep the loaded rows instead of deleting them")
+    parser.add_argument('--json', help="write results to this file")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.csv):
+        os.makedirs(os.path.dirname(args.csv) or '.', exist_ok=True)
+        print(f"Generating {args.rows} rows in {args.csv}...")
+        write_kaggle_csv(args.csv, args.rows)
+
+    pool = ConnectionPool(DB_CONFIG, size=2)
+    results = []
+    for method in args.methods.split(','):
+        last_id = max_transaction_id(pool.connection)
+        start = time.perf_counter()
+        stats = run_method(method, pool.connection, args.csv)
+        seconds = time.perf_counter() - start
+        rows = stats['rows_inserted']
+        results.append({'method': method, 'rows': rows, 'seconds': round(seconds, 3),
+                        'rows_per_sec': round(rows / seconds, 1), 'timings': stats.get('timings')})
+        print(f"✅ {method:<13} {rows:>9} rows in {seconds:8.2f}s ({rows / seconds:,.0f} rows/s)")
+        if not args.keep:
+            delete_after(pool.connection, last_id)
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'csv': args.csv, 'results': results}, f, indent=2)
@@ -0,0 +1,125 @@
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+
+import numpy as np
+from joblib import dump, load
+from sklearn.ensemble import RandomForestClassifier
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from forest_export import COMPILED_FILE, CompiledForest, save_compiled
+from model_registry import FEATURE_COLUMNS, MODELS_DIR, forest_predict_proba, read_active_version
+
+BATCH_SIZES = [1, 16, 256, 10000]
+
+
+# Model-shaped random data: a rare positive class driven by a few features.
+# Transactions' feature columns are NOT NULL, but a forest trained with missing
+# cells learns a NaN direction per split, and the compiled forest has to follow
+# it for any model publish_bundle accepts; `missing` sets the share of NaN cells.
+def synthetic_forest(rows, trees, max_depth, seed=0, missing=0.0):
+    rng = np.random.default_rng(seed)
+    X = rng.normal(size=(rows, len(FEATURE_COLUMNS)))
+    y = (X[:, 0] + X[:, 1] * X[:, 2] + rng.normal(size=rows) > 2.5).astype(np.int8)
+    X[rng.random(X.shape) < missing] = np.nan
+    return RandomForestClassifier(n_estimators=trees, max_depth=max_depth, n_jobs=-1, random_state=seed).fit(X, y)
+
+
+# The compiled forest must give exactly the forest's probabilities, with and
+# without missing values in the input, for a forest fitted with and without them
+def check_parity(rows=20000, trees=20, missing=0.05, seed=0):
+    rng = np.random.default_rng(seed + 1)
+    X = rng.normal(size=(5000, len(FEATURE_COLUMNS)))
+    X_missing = np.where(rng.random(X.shape) < missing, np.nan, X)
+    failures = []
+    for fitted_missing in (0.0, missing):
+        model = synthetic_forest(rows, trees, None, seed, fitted_missing)
+        model.n_jobs = None
+        path = os.path.join(tempfile.mkdtemp(), COMPILED_FILE)
+        save_compiled(model, path)
+        compiled = CompiledForest(path)
+        for name, batch in (('complete', X), ('missing', X_missing)):
+            if not np.array_equal(model.predict_proba(batch), compiled.predict_proba(batch)):
+                failures.append(f"fitted with {fitted_missing:.0%} missing, {name} input")
+    return failures
+
+
+def best_seconds(fn, repeats):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compare the pickled forest with its compiled export")
+    parser.add_argument('--version', help="published bundle to benchmark (default: the active one, if any)")
+    parser.add_argument('--synthetic', action='store_true', help="train a forest on random data instead")
+    parser.add_argument('--rows', type=int, default=100000, help="training rows for --synthetic")
+    parser.add_argument('--trees', type=int, default=100)
+    parser.add_argument('--max-depth', type=int)
+    parser.add_argument('--missing', type=float, default=0.0, help="share of missing cells in the --synthetic data")
+    parser.add_argument('--parity-only', action='store_true', help="only check compiled vs forest probabilities")
+    parser.add_argument('--repeats', type=int, default=5)
+    parser.add_argument('--json', help="write results to this file")
+    args = parser.parse_args()
+
+    failures = check_parity()
+    for failure in failures:
+        print(f"❌ Compiled forest differs from predict_proba: {failure}")
+    if not failures:
+        print("✅ Compiled forest matches predict_proba, with and without missing values")
+    if args.parity_only:
+        sys.exit(1 if failures else 0)
+
+    workdir = tempfile.mkdtemp()
+    version = args.version or read_active_version()
+    model_path = os.path.join(MODELS_DIR, version, 'model.pkl')
+    if args.synthetic or not os.path.exists(model_path):
+        print(f"Training {args.trees} trees on {args.rows} random rows...")
+        model_path = os.path.join(workdir, 'model.pkl')
+        dump(synthetic_forest(args.rows, args.trees, args.max_depth, missing=args.missing), model_path)
+    compiled_path = os.path.join(workdir, COMPILED_FILE)
+    start = time.perf_counter()
+    header = save_compiled(load(model_path), compiled_path)
+    print(f"✅ Compiled {header['n_trees']} trees, {header['nodes']} nodes, depth {header['max_depth']} "
+          f"in {time.perf_counter() - start:.2f}s")
+
+    # Cold-ish load: a fresh read of the file each time (the page cache stays warm)
+    results = {'model': model_path, 'trees': header['n_trees'], 'nodes': header['nodes'],
+               'max_depth': header['max_depth'],
+               'pickle_bytes': os.path.getsize(model_path), 'compiled_bytes': os.path.getsize(compiled_path),
+               'pickle_load_ms': best_seconds(lambda: load(model_path), args.repeats) * 1e3,
+               'pickle_mmap_load_ms': best_seconds(lambda: load(model_path, mmap_mode='r'), args.repeats) * 1e3,
+               'compiled_load_ms': best_seconds(lambda: CompiledForest(compiled_path), args.repeats) * 1e3,
+               'batches': []}
+    print(f"✅ Size: pickle {results['pickle_bytes'] / 2 ** 20:.1f} MB, "
+          f"compiled {results['compiled_bytes'] / 2 ** 20:.1f} MB")
+    print(f"✅ Load: pickle {results['pickle_load_ms']:.1f} ms, pickle mmap {results['pickle_mmap_load_ms']:.1f} ms, "
+          f"compiled {results['compiled_load_ms']:.2f} ms")
+
+    model = load(model_path, mmap_mode='r')
+    model.n_jobs = None
+    compiled = CompiledForest(compiled_path)
+    X = np.random.default_rng(1).normal(size=(max(BATCH_SIZES), header['n_features']))
+    print(f"{'rows':>6} {'predict_proba':>15} {'direct':>12} {'compiled':>12}   rows/s; identical")
+    for rows in BATCH_SIZES:
+        batch = X[:rows]
+        repeats = max(args.repeats, 1000 // rows)
+        identical = bool(np.array_equal(model.predict_proba(batch), compiled.predict_proba(batch)))
+        rates = {name: rows / best_seconds(lambda: fn(batch), repeats) for name, fn in
+                 [('predict_proba', model.predict_proba), ('direct', lambda b: forest_predict_proba(model, b)),
+                  ('compiled', compiled.predict_proba)]}
+        results['batches'].append({'rows': rows, 'identical': identical, 'rows_per_sec': rates})
+        print(f"{rows:>6} {rates['predict_proba']:>15,.0f} {rates['direct']:>12,.0f} {rates['compiled']:>12,.0f}   "
+              f"{'✅' if identical else '❌'}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
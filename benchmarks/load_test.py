@@ -0,0 +1,130 @@
+import argparse
+import http.cookiejar
+import json
+import os
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from model_registry import FEATURE_COLUMNS
+
+# Requests every simulated user cycles through; 'score' is a POST /api/score
+DEFAULT_PATHS = ['/', '/transactions', '/fraud-alerts', '/model/version', 'score']
+CONCURRENCY = [1, 4, 16, 32]
+
+
+# The login form answers with a redirect; only its session cookie is needed
+class _NoRedirect(urllib.request.HTTPRedirectHandler):
+    def redirect_request(self, *args, **kwargs):
+        return None
+
+
+# One analyst: a logged-in session issuing requests back to back
+class User:
+    def __init__(self, base_url, username, password, api_key=''):
+        self.base_url = base_url.rstrip('/')
+        self.api_key = api_key
+        cookies = urllib.request.HTTPCookieProcessor(http.cookiejar.CookieJar())
+        self.opener = urllib.request.build_opener(cookies)
+        form = urllib.parse.urlencode({'username': username, 'password': password}).encode()
+        try:
+            urllib.request.build_opener(cookies, _NoRedirect).open(f"{self.base_url}/login", data=form, timeout=60)
+            raise RuntimeError("❌ Login failed: check --username / --password")
+        except urllib.error.HTTPError as e:
+            if e.code != 302:
+                raise
+        self.rng = np.random.default_rng()
+
+    def request(self, path):
+        if path == 'score':
+            body = json.dumps({'features': self.rng.normal(size=len(FEATURE_COLUMNS)).tolist()}).encode()
+            request = urllib.request.Request(f"{self.base_url}/api/score", data=body,
+                                             headers={'Content-Type': 'application/json', 'X-API-Key': self.api_key})
+        else:
+            request = urllib.request.Request(f"{self.base_url}{path}")
+        with self.opener.open(request, timeout=120) as response:
+            response.read()
+            return response.status
+
+
+# `users` users loop over the paths for `duration` seconds after a warm-up pass
+def run_level(base_url, users, paths, duration, username, password, api_key=''):
+    latencies, errors = [], []
+    lock = threading.Lock()
+    sessions = [User(base_url, username, password, api_key) for _ in range(users)]
+    for path in paths:
+        sessions[0].request(path)
+    start = time.perf_counter()
+    deadline = start + duration
+
+    def loop(user, offset):
+        i = offset
+        while time.perf_counter() < deadline:
+            path = paths[i % len(paths)]
+            i += 1
+            began = time.perf_counter()
+            try:
+                user.request(path)
+                error = None
+            except (urllib.error.URLError, OSError) as e:
+                error = f"{path}: {e}"
+            seconds = time.perf_counter() - began
+            with lock:
+                latencies.append(seconds)
+                if error:
+                    errors.append(error)
+
+    threads = [threading.Thread(target=loop, args=(user, k)) for k, user in enumerate(sessions)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    ms = np.asarray(latencies) * 1000
+    return {
+        'users': users,
+        'requests': len(latencies),
+        'errors': len(errors),
+        'requests_per_sec': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(float(np.percentile(ms, 50)), 1) if len(ms) else None,
+        'p95_ms': round(float(np.percentile(ms, 95)), 1) if len(ms) else None,
+        'p99_ms': round(float(np.percentile(ms, 99)), 1) if len(ms) else None,
+        'first_errors': errors[:5],
+    }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Concurrent-user load test against a running instance of the app")
+    parser.add_argument('--url', default='http://127.0.0.1:5000',
+                        help="5000 for `python project1.py`, 8000 for `python serve.py`")
+    parser.add_argument('--users', default=','.join(map(str, CONCURRENCY)), help="comma-separated concurrency levels")
+    parser.add_argument('--duration', type=float, default=20, help="seconds per level")
+    parser.add_argument('--paths', default=','.join(DEFAULT_PATHS))
+    parser.add_argument('--username', default='admin')
+    parser.add_argument('--password', default='admin123')
+    parser.add_argument('--api-key', default=os.environ.get('SCORING_API_KEY', ''))
+    parser.add_argument('--label', default='', help="stored with the results, e.g. 'dev server' or 'serve.py'")
+    parser.add_argument('--json', help="write results to this file")
+    args = parser.parse_args()
+
+    paths = [path.strip() for path in args.paths.split(',') if path.strip()]
+    results = {'url': args.url, 'label': args.label, 'paths': paths, 'duration': args.duration, 'levels': []}
+    print(f"{'users':>6} {'req/s':>9} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'errors':>7}")
+    for users in [int(n) for n in args.users.split(',')]:
+        level = run_level(args.url, users, paths, args.duration, args.username, args.password, args.api_key)
+        results['levels'].append(level)
+        print(f"{users:>6} {level['requests_per_sec']:>9,.1f} {level['p50_ms']:>9} {level['p95_ms']:>9} "
+              f"{level['p99_ms']:>9} {level['errors']:>7}")
+        for error in level['first_errors']:
+            print(f"   ⚠️ {error}")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2)
@@ -0,0 +1,344 @@
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+import mysql.connector
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bench_bulk_load import delete_after, max_transaction_id
+from config import DB_CONFIG, TRAIN_N_JOBS, TRAIN_TREES
+from corr_stats import CorrelationAccumulator
+from dashboard_cache import DashboardAggregates
+from chart_data import chart_documents
+from db_pool import ConnectionPool
+from detection import StageTimer, run_backlog, run_recent
+from ingest import ingest_csv
+from model_registry import ModelRegistry, publish_bundle
+from online_scoring import OnlineScorer
+from prediction import peak_rss_mb, train_model
+from rule_engine import RuleEngine
+from stream_intake import STREAM_BATCH_ROWS, StreamIntake
+from synthetic_data import SCALES, ndjson_lines, seed_reference_data, training_arrays, write_kaggle_csv
+from velocity import VelocityEngine
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+RESULTS_DIR = os.path.join(BENCH_DIR, 'results')
+
+# In run order; the later stages reuse what the earlier ones produced
+# (the CSV, the trained model, the ingested rows)
+STAGES = ['generate', 'train', 'score', 'ingest', 'stream', 'detect', 'backlog', 'dashboard']
+DB_STAGES = {'ingest', 'stream', 'detect', 'backlog', 'dashboard'}
+
+# Single-row scoring requests timed by the 'score' stage
+SCORE_REQUESTS = 2000
+
+# Events the 'stream' stage sends, in requests of STREAM_BATCH_ROWS lines
+STREAM_EVENTS = 20000
+
+# Rows the 'train' stage fits on at most (the newest, as prediction.py --rows)
+TRAIN_MAX_ROWS = 1000000
+
+# A metric this much worse than in the --compare file counts as a regression
+REGRESSION_TOLERANCE = 0.10
+
+# Timings this short are mostly noise and are not compared
+NOISE_FLOOR_SECONDS = 0.1
+
+
+def rate(rows, seconds):
+    return round(rows / seconds, 1) if seconds else None
+
+
+def stage_generate(ctx):
+    path = os.path.join(ctx['workdir'], 'transactions.csv')
+    start = time.perf_counter()
+    write_kaggle_csv(path, ctx['rows'], ctx['seed'])
+    seconds = time.perf_counter() - start
+    ctx['csv'] = path
+    return {'rows': ctx['rows'], 'seconds': round(seconds, 3), 'rows_per_sec': rate(ctx['rows'], seconds),
+            'csv_mb': round(os.path.getsize(path) / 2 ** 20, 1)}
+
+
+# prediction.py's training step on generated rows, published to a scratch
+# models directory that the later stages score with
+def stage_train(ctx):
+    rows = min(ctx['rows'], ctx['train_rows'])
+    timer = StageTimer()
+    start = time.perf_counter()
+    with timer.stage('load'):
+        X, y = training_arrays(rows, ctx['seed'])
+    clf, scaler, report = train_model(X, y, timer, trees=ctx['trees'], n_jobs=ctx['n_jobs'], balance='class_weight')
+    seconds = time.perf_counter() - start
+    models_dir = os.path.join(ctx['workdir'], 'models')
+    with timer.stage('publish'):
+        publish_bundle(clf, scaler, {'training_rows': rows, 'benchmark': True}, models_dir=models_dir)
+    ctx['registry'] = ModelRegistry(models_dir)
+    fraud = report.get('1', {})
+    return {'rows': rows, 'trees': ctx['trees'], 'seconds': round(seconds, 3), 'rows_per_sec': rate(rows, seconds),
+            'timings': {name: round(value, 3) for name, value in timer.stages.items()},
+            'peak_rss_mb': peak_rss_mb(), 'fraud_recall': fraud.get('recall'), 'fraud_precision': fraud.get('precision')}
+
+
+def _registry(ctx):
+    if 'registry' not in ctx:
+        # Without the train stage, score with the app's active model
+        ctx['registry'] = ModelRegistry()
+    return ctx['registry']
+
+
+# /api/score and predict_transaction(): one row at a time through OnlineScorer,
+# then the same rows as one batch (the run_detection() scoring step)
+def stage_score(ctx):
+    registry = _registry(ctx)
+    bundle = registry.active()
+    X, _ = training_arrays(min(ctx['rows'], SCORE_REQUESTS), ctx['seed'] + 1)
+    X = X.astype(np.float64)
+    scorer = OnlineScorer(registry)
+    start = time.perf_counter()
+    for row in X:
+        scorer.score_vector(row)
+    seconds = time.perf_counter() - start
+    batch_start = time.perf_counter()
+    bundle.score(X)
+    batch_seconds = time.perf_counter() - batch_start
+    latency = scorer.latency.summary()
+    return {'requests': len(X), 'seconds': round(seconds, 3), 'rows_per_sec': rate(len(X), seconds),
+            'p50_ms': latency.get('p50_ms'), 'p99_ms': latency.get('p99_ms'),
+            'batch_rows_per_sec': rate(len(X), batch_seconds), 'model_version': bundle.version,
+            'compiled_forest': bundle.compiled is not None}
+
+
+# Customers, accounts and cards for the inserted transactions; the rows
+# after last_id are removed again when the run ends
+def _prepare_inserts(ctx):
+    pool = ctx['pool']
+    with pool.connection() as conn:
+        reference = seed_reference_data(conn, ctx['scale']['customers'], ctx['scale']['accounts'], ctx['seed'])
+    ctx.setdefault('last_id', max_transaction_id(pool.connection))
+    return reference
+
+
+# The load_data() upload path: ingest_csv with the correlation update per chunk
+def stage_ingest(ctx):
+    pool = ctx['pool']
+    reference = _prepare_inserts(ctx)
+    accumulator = CorrelationAccumulator()
+    stats = ingest_csv(pool.connection, ctx['csv'], seed=ctx['seed'], on_chunk=accumulator.update_frame)
+    return {'rows': stats['rows_inserted'], 'seconds': stats['seconds'],
+            'rows_per_sec': rate(stats['rows_inserted'], stats['seconds']), 'reference_rows_added': reference}
+
+
+# /api/transactions/stream: NDJSON events scored, rule-checked and alerted as they are inserted
+def stage_stream(ctx):
+    _prepare_inserts(ctx)
+    intake = StreamIntake(ctx['pool'].connection, _registry(ctx), seed=ctx['seed'])
+    lines = list(ndjson_lines(min(ctx['rows'], STREAM_EVENTS), ctx['seed'] + 2))
+    accepted, alerts, request_ms, timings = 0, 0, [], {}
+    start = time.perf_counter()
+    for i in range(0, len(lines), STREAM_BATCH_ROWS):
+        result = intake.process_lines(lines[i:i + STREAM_BATCH_ROWS], i + 1)
+        accepted += result['accepted']
+        alerts += result['alerts_created']
+        request_ms.append(result['seconds'] * 1000)
+        for name, value in result['timings'].items():
+            timings[name] = timings.get(name, 0.0) + value
+    seconds = time.perf_counter() - start
+    return {'rows': accepted, 'alerts': alerts, 'seconds': round(seconds, 3), 'rows_per_sec': rate(accepted, seconds),
+            'request_rows': STREAM_BATCH_ROWS, 'p50_request_ms': round(float(np.median(request_ms)), 1),
+            'max_request_ms': round(max(request_ms), 1),
+            'timings': {name: round(value, 3) for name, value in timings.items()}}
+
+
+# The run_detection() route: rules, the latest rows scored, velocity windows, write-back
+def stage_detect(ctx):
+    bundle = _registry(ctx).active()
+    timer = StageTimer()
+    with ctx['pool'].connection(autocommit=True) as conn:
+        cursor = conn.cursor()
+        with timer.stage('rules'):
+            cursor.execute("DELETE FROM FraudAlerts WHERE status = 'temporary'")
+            rule_engine = RuleEngine.from_db(cursor)
+        with timer.stage('velocity warm start'):
+            engine = VelocityEngine.from_db(cursor)
+            engine.warm_start(cursor)
+        result = run_recent(cursor, bundle, rule_engine, timer, velocity=engine.catch_up)
+        cursor.close()
+    return {**(result or {}), 'seconds': round(timer.total(), 3),
+            'timings': {name: round(value, 3) for name, value in timer.stages.items()}}
+
+
+# Backlog mode: every unscored transaction, chunk by chunk
+def stage_backlog(ctx):
+    start = time.perf_counter()
+    result = run_backlog(ctx['pool'].connection, _registry(ctx).active(), resume=False)
+    seconds = time.perf_counter() - start
+    return {'rows': result['rows_scored'], 'alerts': result['alerts_created'], 'seconds': round(seconds, 3),
+            'rows_per_sec': rate(result['rows_scored'], seconds),
+            'timings': {name: round(value, 3) for name, value in result['timings'].items()}}
+
+
+# dashboard(): the aggregate queries, then the chart JSON built from them
+def stage_dashboard(ctx):
+    aggregates = DashboardAggregates(ctx['pool'].connection, CorrelationAccumulator())
+    start = time.perf_counter()
+    data = aggregates.refresh(reseed=True)
+    query_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    documents = chart_documents(data)
+    chart_seconds = time.perf_counter() - start
+    return {'seconds': round(query_seconds + chart_seconds, 3), 'query_seconds': round(query_seconds, 3),
+            'chart_data_seconds': round(chart_seconds, 4),
+            'charts_kb': round(len(documents['all'][0]) / 1024, 1)}
+
+
+STAGE_FUNCTIONS = {'generate': stage_generate, 'train': stage_train, 'score': stage_score,
+                   'ingest': stage_ingest, 'stream': stage_stream, 'detect': stage_detect, 'backlog': stage_backlog,
+                   'dashboard': stage_dashboard}
+
+
+# Transactions added by the run (and their alerts) are removed again
+def cleanup(pool, last_id, batch_size=50000):
+    with pool.connection(autocommit=True) as conn:
+        cursor = conn.cursor()
+        while True:
+            cursor.execute("DELETE FROM FraudAlerts WHERE transaction_id > %s LIMIT %s", (last_id, batch_size))
+            if cursor.rowcount < batch_size:
+                break
+        cursor.close()
+    delete_after(pool.connection, last_id, batch_size)
+
+
+def environment():
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                cwd=BENCH_DIR, timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        commit = None
+    return {'python': platform.python_version(), 'platform': platform.platform(), 'cpus': os.cpu_count(),
+            'commit': commit}
+
+
+# Numeric leaves of a result as 'stage.metric' -> value
+def flatten(stages, prefix=''):
+    flat = {}
+    for name, value in stages.items():
+        if isinstance(value, dict):
+            flat.update(flatten(value, f'{prefix}{name}.'))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[f'{prefix}{name}'] = value
+    return flat
+
+
+# +1 when a larger value is better, -1 when smaller is, 0 for counts and settings
+def direction(metric):
+    name = metric.rsplit('.', 1)[-1]
+    if name.endswith('rows_per_sec'):
+        return 1
+    if name.endswith(('seconds', '_ms', '_mb')) or metric.split('.')[1:2] == ['timings']:
+        return -1
+    return 0
+
+
+def compare(current, previous, tolerance=REGRESSION_TOLERANCE):
+    now, before = flatten(current['stages']), flatten(previous['stages'])
+    regressions = []
+    print(f"\nCompared with {previous.get('started_at')} (commit {previous.get('environment', {}).get('commit')}):")
+    for metric in sorted(set(now) & set(before)):
+        sign = direction(metric)
+        if sign == 0 or not before[metric]:
+            continue
+        in_seconds = metric.endswith('seconds') or '.timings.' in metric
+        if in_seconds and max(now[metric], before[metric]) < NOISE_FLOOR_SECONDS:
+            continue
+        change = (now[metric] - before[metric]) / abs(before[metric])
+        worse = -change * sign > tolerance
+        if worse:
+            regressions.append(metric)
+        if worse or abs(change) > tolerance:
+            print(f"{'❌' if worse else '✅'} {metric}: {before[metric]} -> {now[metric]} ({change:+.1%})")
+    return regressions
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="End-to-end benchmarks on seeded synthetic data")
+    parser.add_argument('--scale', choices=list(SCALES), default='10k')
+    parser.add_argument('--rows', type=int, help="transactions (default: the scale's)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--stages', default=','.join(STAGES), help=f"comma-separated, from {STAGES}")
+    parser.add_argument('--no-db', action='store_true', help="skip the stages that need MySQL")
+    parser.add_argument('--trees', type=int, default=TRAIN_TREES)
+    parser.add_argument('--n-jobs', type=int, default=TRAIN_N_JOBS)
+    parser.add_argument('--train-rows', type=int, default=TRAIN_MAX_ROWS)
+    parser.add_argument('--keep', action='store_true', help="keep the ingested rows instead of deleting them")
+    parser.add_argument('--output', help="result JSON (default: benchmarks/results/<scale>-<time>.json)")
+    parser.add_argument('--compare', help="earlier result JSON; exit 1 on a regression")
+    parser.add_argument('--tolerance', type=float, default=REGRESSION_TOLERANCE)
+    args = parser.parse_args()
+
+    stages = [name.strip() for name in args.stages.split(',') if name.strip()]
+    unknown = [name for name in stages if name not in STAGES]
+    if unknown:
+        parser.error(f"unknown stages: {', '.join(unknown)}")
+    # Ingest loads the generated CSV
+    if 'ingest' in stages and 'generate' not in stages:
+        stages.append('generate')
+    stages = [name for name in STAGES if name in stages]
+
+    scale = dict(SCALES[args.scale])
+    rows = args.rows or scale['transactions']
+    result = {'scale': args.scale, 'rows': rows, 'seed': args.seed,
+              'started_at': datetime.now().isoformat(timespec='seconds'), 'environment': environment(),
+              'stages': {}, 'skipped': {}}
+
+    pool = None
+    db_reason = "--no-db" if args.no_db else None
+    if db_reason is None and DB_STAGES & set(stages):
+        try:
+            mysql.connector.connect(**DB_CONFIG).close()
+            pool = ConnectionPool(DB_CONFIG, size=2)
+        except mysql.connector.Error as e:
+            db_reason = f"MySQL unavailable: {e}"
+
+    ctx = {'rows': rows, 'seed': args.seed, 'scale': scale, 'trees': args.trees, 'n_jobs': args.n_jobs,
+           'train_rows': args.train_rows, 'workdir': tempfile.mkdtemp(prefix='fraud-bench-'), 'pool': pool}
+    try:
+        for name in stages:
+            if name in DB_STAGES and pool is None:
+                result['skipped'][name] = db_reason
+                print(f"⚠️ {name}: skipped ({db_reason})")
+                continue
+            try:
+                metrics = STAGE_FUNCTIONS[name](ctx)
+            except Exception as e:
+                result['skipped'][name] = f"failed: {e}"
+                print(f"❌ {name}: {e}")
+                continue
+            result['stages'][name] = metrics
+            per_sec = f", {metrics['rows_per_sec']:,.0f} rows/s" if metrics.get('rows_per_sec') else ''
+            print(f"✅ {name}: {metrics.get('seconds', 0):.2f}s{per_sec}")
+    finally:
+        if pool is not None and 'last_id' in ctx and not args.keep:
+            cleanup(pool, ctx['last_id'])
+        if pool is not None:
+            pool.close_all()
+
+    output = args.output or os.path.join(RESULTS_DIR, f"{args.scale}-{datetime.now():%Y%m%d-%H%M%S}.json")
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(result, f, indent=2)
+    print(f"✅ Results written to {output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(result, json.load(f), args.tolerance)
+        if regressions:
+            print(f"❌ {len(regressions)} regressions beyond {args.tolerance:.0%}")
+            sys.exit(1)
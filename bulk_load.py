@@ -0,0 +1,227 @@
+import argparse
+import os
+import time
+
+import mysql.connector
+import pandas as pd
+
+from detection import StageTimer
+from ingest import INSERT_COLUMNS, IngestCancelled, print_progress, read_header
+
+FEATURES = [f'v{i}' for i in range(1, 29)]
+
+# Raw values as they appear in the file; empty fields are loaded as NULL and rejected in the move
+STAGING_DDL = f"""
+    CREATE TEMPORARY TABLE transactions_staging (
+        seq INT AUTO_INCREMENT PRIMARY KEY,
+        pair_no INT,
+        transaction_time DOUBLE,
+        amount DECIMAL(15, 2),
+        {', '.join(f'{col} DECIMAL(12, 6)' for col in FEATURES)},
+        is_fraud DOUBLE
+    ) ENGINE=InnoDB
+"""
+
+# Account/card pairs numbered in the same order ingest.fetch_account_card_pairs() returns them
+PAIRS_DDL = """
+    CREATE TEMPORARY TABLE ingest_pairs (
+        pair_no INT PRIMARY KEY,
+        account_id INT NOT NULL,
+        card_id INT NOT NULL
+    ) ENGINE=InnoDB
+"""
+
+PAIRS_SQL = """
+    INSERT INTO ingest_pairs (pair_no, account_id, card_id)
+    SELECT ROW_NUMBER() OVER (ORDER BY a.account_id, c.card_id) - 1, a.account_id, c.card_id
+    FROM Accounts a
+    JOIN CreditCards c ON a.account_id = c.account_id
+"""
+
+# Same rule as ingest.pair_indices(): row i gets pair i while there are pairs left, then a random one
+ASSIGN_PAIRS_SQL = """
+    UPDATE transactions_staging
+    SET pair_no = IF(seq <= %s, seq - 1, FLOOR(RAND({seed}) * %s))
+"""
+
+# Set-based move: pairs are resolved with one join, rows keep file order
+MOVE_SQL = f"""
+    INSERT INTO Transactions ({', '.join(INSERT_COLUMNS)})
+    SELECT p.account_id, p.card_id, TRUNCATE(s.transaction_time, 0), s.amount,
+           {', '.join(f's.{col}' for col in FEATURES)}, TRUNCATE(s.is_fraud, 0)
+    FROM transactions_staging s
+    JOIN ingest_pairs p ON p.pair_no = s.pair_no
+    WHERE {' AND '.join(f's.{col} IS NOT NULL' for col in ['transaction_time', 'amount'] + FEATURES + ['is_fraud'])}
+    ORDER BY s.seq
+"""
+
+
+# LOAD DATA statement for this file's own header: columns are mapped by name
+# (in whatever order and case the file uses), unknown columns are skipped and
+# the line terminator is taken from the header line. This does the
+# normalization in the server's parser instead of rewriting the file in Python.
+def load_data_sql(path):
+    mapping = read_header(path)
+    header = list(pd.read_csv(path, nrows=0).columns)
+    with open(path, 'rb') as f:
+        first_line = f.readline()
+    terminator = '\\r\\n' if first_line.endswith(b'\r\n') else '\\n'
+
+    fields, assignments = [], []
+    for i, name in enumerate(header):
+        if name in mapping:
+            fields.append(f'@c{i}')
+            assignments.append(f"{mapping[name]} = NULLIF(TRIM(@c{i}), '')")
+        else:
+            fields.append('@skip')
+    return f"""
+        LOAD DATA LOCAL INFILE %s
+        INTO TABLE transactions_staging
+        FIELDS TERMINATED BY ',' OPTIONALLY ENCLOSED BY '"'
+        LINES TERMINATED BY '{terminator}'
+        IGNORE 1 LINES
+        ({', '.join(fields)})
+        SET {', '.join(assignments)}
+    """
+
+
+# Secondary indexes of a table that can be dropped and rebuilt around a load:
+# not the primary key, not unique, and not backing a foreign key.
+# Returns {index_name: [columns in order]}.
+def secondary_indexes(cursor, table='Transactions'):
+    cursor.execute("""
+        SELECT COLUMN_NAME
+        FROM information_schema.KEY_COLUMN_USAGE
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s AND REFERENCED_TABLE_NAME IS NOT NULL
+    """, (table,))
+    fk_columns = {row[0] for row in cursor.fetchall()}
+
+    cursor.execute("""
+        SELECT INDEX_NAME, NON_UNIQUE, COLUMN_NAME
+        FROM information_schema.STATISTICS
+        WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = %s
+        ORDER BY INDEX_NAME, SEQ_IN_INDEX
+    """, (table,))
+    indexes = {}
+    for name, non_unique, column in cursor.fetchall():
+        if name == 'PRIMARY' or not non_unique:
+            continue
+        indexes.setdefault(name, []).append(column)
+    return {name: cols for name, cols in indexes.items() if cols[0] not in fk_columns}
+
+
+def drop_indexes(cursor, indexes, table='Transactions'):
+    if indexes:
+        cursor.execute(f"ALTER TABLE {table} " + ', '.join(f"DROP INDEX {name}" for name in indexes))
+
+
+# One ALTER rebuilds every index in a single pass over the table
+def restore_indexes(cursor, indexes, table='Transactions'):
+    if indexes:
+        cursor.execute(f"ALTER TABLE {table} " + ', '.join(
+            f"ADD INDEX {name} ({', '.join(cols)})" for name, cols in indexes.items()))
+
+
+# Bulk-load a Kaggle-format CSV into Transactions:
+#   1. LOAD DATA LOCAL INFILE straight into a temporary staging table,
+#   2. number the account/card pairs and assign one to every staged row,
+#   3. one INSERT ... SELECT that moves the complete rows across.
+# The move is a single transaction, so a failed load leaves Transactions
+# untouched and is simply retried. With disable_indexes, unique and foreign key
+# checks are switched off for the session and the secondary indexes are
+# dropped for the move and rebuilt afterwards (InnoDB ignores
+# ALTER TABLE ... DISABLE KEYS); other sessions lose those indexes meanwhile.
+def bulk_load(config, path, disable_indexes=False, seed=None,
+              resume_from=None, checkpoint=None, progress=None, should_stop=None):
+    stats = {'rows_parsed': 0, 'rows_inserted': 0, 'rows_rejected': 0, 'chunks': 0,
+             'bytes_total': os.path.getsize(path), 'percent': 0.0, 'seconds': 0.0, 'rows_per_sec': 0.0}
+    # The move is all-or-nothing: a job with committed counters has nothing left to load
+    if resume_from and resume_from.get('chunks'):
+        stats.update({key: resume_from[key] for key in ('rows_parsed', 'rows_inserted', 'rows_rejected', 'chunks')})
+        stats['percent'] = 100.0
+        return stats
+
+    load_sql = load_data_sql(path)
+    timer = StageTimer()
+    start = time.perf_counter()
+
+    def report(percent):
+        stats['percent'] = percent
+        stats['seconds'] = time.perf_counter() - start
+        stats['rows_per_sec'] = round(stats['rows_parsed'] / stats['seconds'], 1) if stats['seconds'] else 0.0
+        if progress:
+            progress(dict(stats))
+        if should_stop and should_stop() and percent < 100:
+            raise IngestCancelled("Cancelled before moving staged rows")
+
+    conn = mysql.connector.connect(**config, allow_local_infile=True)
+    cursor = conn.cursor()
+    dropped = {}
+    try:
+        with timer.stage('load staging'):
+            cursor.execute(STAGING_DDL)
+            cursor.execute(load_sql, (os.path.abspath(path),))
+            stats['rows_parsed'] = cursor.rowcount
+            conn.commit()
+        report(50.0)
+
+        with timer.stage('assign pairs'):
+            cursor.execute(PAIRS_DDL)
+            cursor.execute(PAIRS_SQL)
+            n_pairs = cursor.rowcount
+            if not n_pairs:
+                raise ValueError("❌ No account/card pairs available in the database.")
+            cursor.execute(ASSIGN_PAIRS_SQL.format(seed='' if seed is None else int(seed)), (n_pairs, n_pairs))
+            conn.commit()
+        report(60.0)
+
+        if disable_indexes:
+            with timer.stage('drop indexes'):
+                dropped = secondary_indexes(cursor)
+                drop_indexes(cursor, dropped)
+                cursor.execute("SET SESSION unique_checks = 0")
+                cursor.execute("SET SESSION foreign_key_checks = 0")
+
+        with timer.stage('insert select'):
+            cursor.execute(MOVE_SQL)
+            stats['rows_inserted'] = cursor.rowcount
+            stats['rows_rejected'] = stats['rows_parsed'] - stats['rows_inserted']
+            stats['chunks'] = 1
+            if checkpoint:
+                checkpoint(cursor, stats)
+            conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        try:
+            if disable_indexes:
+                cursor.execute("SET SESSION unique_checks = 1")
+                cursor.execute("SET SESSION foreign_key_checks = 1")
+            if dropped:
+                with timer.stage('rebuild indexes'):
+                    restore_indexes(cursor, dropped)
+            cursor.execute("DROP TEMPORARY TABLE IF EXISTS transactions_staging, ingest_pairs")
+        finally:
+            cursor.close()
+            conn.close()
+
+    stats['timings'] = {name: round(seconds, 3) for name, seconds in timer.stages.items()}
+    report(100.0)
+    stats['seconds'] = round(stats['seconds'], 3)
+    return stats
+
+
+if __name__ == '__main__':
+    from config import DB_CONFIG
+
+    parser = argparse.ArgumentParser(description="Bulk-load a Kaggle-format CSV into Transactions")
+    parser.add_argument('csv')
+    parser.add_argument('--disable-indexes', action='store_true',
+                        help="drop secondary indexes during the load and rebuild them afterwards")
+    parser.add_argument('--seed', type=int)
+    args = parser.parse_args()
+
+    result = bulk_load(DB_CONFIG, args.csv, disable_indexes=args.disable_indexes, seed=args.seed,
+                       progress=print_progress)
+    print(f"✅ Bulk load finished: {result}")
@@ -0,0 +1,68 @@
+import hashlib
+import json
+
+import numpy as np
+
+# Log-spaced bins of the amount histogram
+AMOUNT_BINS = 50
+
+
+def _counts(rows, label, value):
+    return {'labels': [str(row[label]) for row in rows], 'values': [int(row[value]) for row in rows]}
+
+
+# Shared log-spaced bins for both classes; each class is given as its share
+# per bin (the density plot on a log axis)
+def amount_histogram(rows, bins=AMOUNT_BINS):
+    amount = np.asarray([float(row['amount']) for row in rows])
+    fraud = np.asarray([int(row['is_fraud']) for row in rows], dtype=bool)
+    positive = amount[amount > 0]
+    if len(positive) == 0:
+        return {'edges': [], 'legit': [], 'fraud': []}
+    low, high = positive.min(), positive.max()
+    edges = np.logspace(np.log10(low), np.log10(high if high > low else low * 10), bins + 1)
+    # Zero amounts go in the first bin (a log axis has no zero)
+    amount = np.clip(amount, low, None)
+    shares = {}
+    for name, mask in (('legit', ~fraud), ('fraud', fraud)):
+        counts, _ = np.histogram(amount[mask], edges)
+        shares[name] = np.round(counts / max(mask.sum(), 1), 5).tolist()
+    return {'edges': np.round(edges, 2).tolist(), **shares}
+
+
+# The correlation matrix with 3 decimals; undefined cells (constant columns) are null
+def correlation_matrix(corr):
+    values = np.round(corr.to_numpy(dtype=np.float64), 3)
+    return {'labels': [str(col).upper() if str(col).startswith('v') else str(col) for col in corr.columns],
+            'values': [[None if np.isnan(v) else float(v) for v in row] for row in values]}
+
+
+# Every dashboard chart as compact series from a DashboardAggregates snapshot;
+# the browser draws them
+def dashboard_chart_data(data):
+    return {
+        'fraud_vs_legit': {'labels': ['Legit', 'Fraud'],
+                           'values': [data['total_trans'] - data['fraud_trans'], data['fraud_trans']]},
+        'amounts': amount_histogram(data['amounts']),
+        'status': _counts(data['status'], 'status', 'count'),
+        'rules': _counts(data['rules'], 'rule_name', 'total_alerts'),
+        'severity': _counts(data['severity'], 'severity', 'count'),
+        'top_accounts': _counts(data['top_accounts'], 'account_number', 'alert_count'),
+        'cities': _counts(data['cities'], 'city', 'fraud_count'),
+        'correlation': correlation_matrix(data['correlation']),
+    }
+
+
+def _document(value):
+    body = json.dumps(value, separators=(',', ':'))
+    return body, hashlib.sha1(body.encode()).hexdigest()[:20]
+
+
+# JSON body and ETag per chart, plus 'all' with every chart. The ETag is a
+# hash of the body, so it is the same in every server process and only
+# changes when the numbers do.
+def chart_documents(data):
+    series = dashboard_chart_data(data)
+    documents = {name: _document(value) for name, value in series.items()}
+    documents['all'] = _document(series)
+    return documents
@@ -0,0 +1,59 @@
+import os
+
+# Database configuration (shared by the web app, training and batch jobs)
+DB_CONFIG = {
+    'host': 'localhost',
+    'user': 'fraud_account',
+    'password': 'secure_password125',
+    'database': 'BankFraudDetection'
+}
+
+# Connection pool settings
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 8))
+# Separate pool for the read-only pages (/transactions, /fraud-alerts), so a
+# burst of page views cannot take the connections detection and ingestion need
+DB_READ_POOL_SIZE = int(os.environ.get('DB_READ_POOL_SIZE', 4))
+DB_POOL_TIMEOUT = float(os.environ.get('DB_POOL_TIMEOUT', 30))
+DB_POOL_HEALTH_CHECK_SECONDS = float(os.environ.get('DB_POOL_HEALTH_CHECK_SECONDS', 30))
+
+# Print one line per scored transaction in run_detection()
+DETECTION_DEBUG = os.environ.get('DETECTION_DEBUG', '0') == '1'
+
+# Scoring processes for backlog detection (1 = score in the web process)
+DETECTION_WORKERS = int(os.environ.get('DETECTION_WORKERS', 1))
+
+# Shared secret for /api/score callers without a login session (unset = session only)
+SCORING_API_KEY = os.environ.get('SCORING_API_KEY', '')
+
+
+# Micro-batching for online scoring: concurrent single-row requests are flushed
+# as one batch at SCORING_BATCH_MAX_ROWS rows or SCORING_BATCH_MAX_WAIT_MS,
+# whichever comes first (SCORING_BATCH_MAX_ROWS=1 scores each request inline)
+SCORING_BATCH_MAX_ROWS = int(os.environ.get('SCORING_BATCH_MAX_ROWS', 64))
+SCORING_BATCH_MAX_WAIT_MS = float(os.environ.get('SCORING_BATCH_MAX_WAIT_MS', 2))
+
+# Background CSV ingestion jobs run at the same time
+INGEST_WORKERS = int(os.environ.get('INGEST_WORKERS', 2))
+
+# Load uploads with LOAD DATA LOCAL INFILE (bulk_load.py) instead of chunked INSERTs;
+# needs local_infile=ON on the server
+INGEST_BULK_LOAD = os.environ.get('INGEST_BULK_LOAD', '0') == '1'
+
+# Training (prediction.py): trees in the forest and cores used to fit it (-1 = all)
+TRAIN_TREES = int(os.environ.get('TRAIN_TREES', 100))
+TRAIN_N_JOBS = int(os.environ.get('TRAIN_N_JOBS', -1))
+
+# Named queries slower than this (seconds) are printed and kept in /metrics/slow-queries
+SLOW_QUERY_SECONDS = float(os.environ.get('SLOW_QUERY_SECONDS', 0.5))
+
+# Production serving (serve.py): gunicorn processes x threads per process.
+# Every process has its own pools (DB_POOL_SIZE + DB_READ_POOL_SIZE connections),
+# caches and model registry.
+SERVE_BIND = os.environ.get('SERVE_BIND', '0.0.0.0:8000')
+SERVE_WORKERS = int(os.environ.get('SERVE_WORKERS', 2))
+SERVE_THREADS = int(os.environ.get('SERVE_THREADS', 8))
+SERVE_TIMEOUT = int(os.environ.get('SERVE_TIMEOUT', 120))
+
+# Processes that score interactive detection runs off the request threads, so
+# CPU-bound work does not hold the GIL they need (0 = in the request thread)
+INFERENCE_WORKERS = int(os.environ.get('INFERENCE_WORKERS', 1))
@@ -0,0 +1,204 @@
+import os
+import threading
+from contextlib import contextmanager
+
+import numpy as np
+import pandas as pd
+
+try:
+    import fcntl
+except ImportError:
+    # Windows serves from a single process (serve.py), so there is nothing to lock against
+    fcntl = None
+
+CORR_COLUMNS = [f'v{i}' for i in range(1, 29)] + ['is_fraud']
+
+# Same population as the dashboard heatmap
+CORR_FILTER = 'amount > 800'
+
+
+# Streaming correlation matrix: keeps n, column sums and the cross-product
+# matrix, so each new row costs O(features^2) and corr() never rescans the table.
+# Values are accumulated relative to a fixed shift (the first batch mean) to
+# avoid cancellation when computing covariance from raw sums.
+# Server processes share the file at `path`: each keeps the rows it added since
+# its last sync() apart and merges them into the file under a lock, so no
+# process overwrites the others' rows.
+class CorrelationAccumulator:
+    def __init__(self, columns=CORR_COLUMNS, path=None):
+        self.columns = list(columns)
+        self.path = path
+        k = len(self.columns)
+        self.n = 0
+        self.shift = np.zeros(k)
+        self.sums = np.zeros(k)
+        self.cross = np.zeros((k, k))
+        # Rebuilds from the table (save()) so far; rows added before a rebuild are in it
+        self.generation = 0
+        self._lock = threading.Lock()
+        self._reset_pending()
+
+    # Rows added since the last sync, relative to self.shift
+    def _reset_pending(self):
+        k = len(self.columns)
+        self._pending_n = 0
+        self._pending_sums = np.zeros(k)
+        self._pending_cross = np.zeros((k, k))
+
+    def update(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if X.ndim == 1:
+            X = X.reshape(1, -1)
+        if len(X) == 0:
+            return
+        with self._lock:
+            if self.n == 0:
+                self.shift = X.mean(axis=0)
+            D = X - self.shift
+            sums, cross = D.sum(axis=0), D.T @ D
+            self.n += len(D)
+            self.sums += sums
+            self.cross += cross
+            self._pending_n += len(D)
+            self._pending_sums += sums
+            self._pending_cross += cross
+
+    def update_frame(self, df):
+        # Rows from load_data(); apply the same filter as the heatmap query
+        df = df[df['amount'] > 800]
+        self.update(df[self.columns].to_numpy(dtype=np.float64))
+
+    def covariance(self):
+        mean = self.sums / self.n
+        return self.cross / self.n - np.outer(mean, mean)
+
+    def corr(self):
+        with self._lock:
+            if self.n < 2:
+                return pd.DataFrame(np.nan, index=self.columns, columns=self.columns)
+            cov = self.covariance()
+        std = np.sqrt(np.clip(np.diag(cov), 0, None))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            corr = cov / np.outer(std, std)
+        corr[:, std == 0] = np.nan
+        corr[std == 0, :] = np.nan
+        corr = np.clip(corr, -1.0, 1.0)
+        np.fill_diagonal(corr, np.where(std == 0, np.nan, 1.0))
+        return pd.DataFrame(corr, index=self.columns, columns=self.columns)
+
+    # Rebuild the state from MySQL with a single aggregate query: the server
+    # returns the sums and cross-products, no rows are transferred.
+    def seed_from_db(self, cursor):
+        cols = self.columns
+        exprs = ['COUNT(*)'] + [f'SUM({c})' for c in cols]
+        pairs = [(i, j) for i in range(len(cols)) for j in range(i, len(cols))]
+        exprs += [f'SUM({cols[i]} * {cols[j]})' for i, j in pairs]
+        cursor.execute(f"SELECT {', '.join(exprs)} FROM Transactions WHERE {CORR_FILTER}")
+        row = cursor.fetchone()
+        if isinstance(row, dict):
+            row = list(row.values())
+        values = np.array([0 if v is None else float(v) for v in row])
+
+        k = len(cols)
+        cross = np.zeros((k, k))
+        for (i, j), v in zip(pairs, values[1 + k:]):
+            cross[i, j] = cross[j, i] = v
+        with self._lock:
+            self.n = int(values[0])
+            self.shift = np.zeros(k)
+            self.sums = values[1:1 + k]
+            self.cross = cross
+            self._reset_pending()
+
+    # Rebuild the state from the local feature store (feature_store.py), one
+    # memory-mapped partition at a time; same population as seed_from_db()
+    def seed_from_store(self, store):
+        from model_registry import FEATURE_COLUMNS
+
+        fresh = CorrelationAccumulator(self.columns)
+        for _, arrays in store.iter_partitions(['features', 'is_fraud']):
+            features, labels = arrays['features'], arrays['is_fraud']
+            keep = np.flatnonzero((features[:, FEATURE_COLUMNS.index('amount')] > 800) & (labels >= 0))
+            fresh.update(np.column_stack([labels[keep] if col == 'is_fraud' else
+                                          features[keep, FEATURE_COLUMNS.index(col)] for col in self.columns]))
+        with self._lock:
+            self.n, self.shift, self.sums, self.cross = fresh.n, fresh.shift, fresh.sums, fresh.cross
+            self._reset_pending()
+
+    @contextmanager
+    def _file_lock(self, path):
+        if fcntl is None:
+            yield
+            return
+        with open(path + '.lock', 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def _read(self, path):
+        if not os.path.exists(path):
+            return None
+        with np.load(path) as state:
+            if state['sums'].shape != (len(self.columns),):
+                return None
+            return {'n': int(state['n']), 'shift': state['shift'], 'sums': state['sums'], 'cross': state['cross'],
+                    'generation': int(state['generation']) if 'generation' in state else 0}
+
+    def _write(self, path, n, shift, sums, cross, generation):
+        tmp = path + '.tmp.npz'
+        np.savez(tmp, n=n, shift=shift, sums=sums, cross=cross, generation=generation)
+        os.replace(tmp, path)
+
+    def _adopt(self, state):
+        self.n, self.shift, self.sums, self.cross = state['n'], state['shift'], state['sums'], state['cross']
+        self.generation = state['generation']
+        self._reset_pending()
+
+    # Replace the shared state with this one, after a rebuild from the table;
+    # rows other processes have not synced yet are dropped (the rebuild has them)
+    def save(self, path=None):
+        path = path or self.path
+        if path is None:
+            return
+        with self._file_lock(path), self._lock:
+            current = self._read(path)
+            generation = (current['generation'] if current else self.generation) + 1
+            self._write(path, self.n, self.shift, self.sums, self.cross, generation)
+            self.generation = generation
+            self._reset_pending()
+
+    # Merge the rows added here since the last sync into the shared state and
+    # adopt the result, which includes the rows every other process synced
+    def sync(self, path=None):
+        path = path or self.path
+        if path is None:
+            return
+        with self._file_lock(path), self._lock:
+            current = self._read(path)
+            if current is None:
+                self._write(path, self.n, self.shift, self.sums, self.cross, self.generation)
+                self._reset_pending()
+                return
+            if self._pending_n and current['generation'] == self.generation:
+                # Re-express the pending sums relative to the file's shift: with
+                # d = shift - file shift, sum(x - s') = S + n d and
+                # sum((x - s')(x - s')^T) = C + S d^T + d S^T + n d d^T
+                n, S, C = self._pending_n, self._pending_sums, self._pending_cross
+                d = self.shift - current['shift']
+                current['n'] += n
+                current['sums'] = current['sums'] + S + n * d
+                current['cross'] = current['cross'] + C + np.outer(S, d) + np.outer(d, S) + n * np.outer(d, d)
+                self._write(path, current['n'], current['shift'], current['sums'], current['cross'],
+                            current['generation'])
+            self._adopt(current)
+
+    def load(self, path=None):
+        path = path or self.path
+        state = self._read(path)
+        if state is None:
+            return False
+        with self._lock:
+            self._adopt(state)
+        return True
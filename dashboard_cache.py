@@ -0,0 +1,248 @@
+import threading
+import time
+from collections import OrderedDict
+
+from metrics import METRICS
+
+# How often the refresher checks CacheVersions for changes made by other server processes
+STALE_POLL_SECONDS = 5
+
+
+
+# Thread-safe TTL cache with LRU eviction (used for the dashboard chart JSON)
+class TTLCache:
+    def __init__(self, ttl=600, max_entries=64):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._entries[key] = (value, time.time() + self.ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Every aggregate the dashboard needs, computed together on refresh
+DASHBOARD_QUERIES = {
+    'totals': """
+        SELECT COUNT(*) AS total, COALESCE(SUM(is_fraud), 0) AS fraud
+        FROM Transactions
+    """,
+    'recent_alerts': """
+        SELECT t.transaction_id, t.amount, t.transaction_date,
+               c.first_name, c.last_name, r.rule_name, fa.status
+        FROM FraudAlerts fa
+        JOIN Transactions t ON fa.transaction_id = t.transaction_id
+        JOIN Accounts a ON t.account_id = a.account_id
+        JOIN Customers c ON a.customer_id = c.customer_id
+        JOIN FraudRules r ON fa.rule_id = r.rule_id
+        WHERE fa.status IN ('confirmed', 'investigating')
+        ORDER BY t.transaction_date DESC
+        LIMIT 5
+    """,
+    'amounts': "SELECT amount, is_fraud FROM Transactions LIMIT 10000",
+    'status': """
+        SELECT status, COUNT(*) as count
+        FROM FraudAlerts
+        GROUP BY status
+    """,
+    'rules': """
+        SELECT r.rule_name, COUNT(*) as total_alerts
+        FROM FraudAlerts fa
+        JOIN FraudRules r ON fa.rule_id = r.rule_id
+        GROUP BY fa.rule_id
+    """,
+    'severity': """
+        SELECT r.severity, COUNT(*) as count
+        FROM FraudAlerts fa
+        JOIN FraudRules r ON fa.rule_id = r.rule_id
+        GROUP BY r.severity
+        ORDER BY r.severity
+    """,
+    'top_accounts': """
+        SELECT a.account_number, COUNT(*) as alert_count
+        FROM FraudAlerts fa
+        JOIN Transactions t ON fa.transaction_id = t.transaction_id
+        JOIN Accounts a ON t.account_id = a.account_id
+        GROUP BY a.account_number
+        ORDER BY alert_count DESC
+        LIMIT 10
+    """,
+    'cities': """
+        SELECT c.city, COUNT(*) as fraud_count
+        FROM Transactions t
+        JOIN Accounts a ON t.account_id = a.account_id
+        JOIN Customers c ON a.customer_id = c.customer_id
+        WHERE t.is_fraud = 1
+        GROUP BY c.city
+        ORDER BY fraud_count DESC
+        LIMIT 10
+    """,
+}
+
+
+# Precomputed dashboard aggregates, refreshed in the background.
+# A dashboard hit only reads the last snapshot; writers call mark_stale()
+# so the refresher picks up new data without waiting for the full interval.
+# Every server process keeps its own snapshot: mark_stale() also bumps a
+# shared counter in CacheVersions, which the refreshers of the other processes
+# poll, and the correlation state is synced through its shared file.
+class DashboardAggregates:
+    def __init__(self, connect, correlation, refresh_interval=300, cache_name='dashboard'):
+        self._connect = connect
+        self._correlation = correlation
+        self.refresh_interval = refresh_interval
+        self.cache_name = cache_name
+        # CacheVersions.version seen by the last refresh
+        self.shared_version = None
+        self._data = None
+        self._lock = threading.Lock()
+        self._refresh_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._reseed = False
+        self._thread = None
+        self.refreshed_at = None
+        self.refresh_seconds = None
+        self.version = 0
+
+    def _query_all(self, reseed=False):
+        with self._connect() as conn:
+            cursor = conn.cursor(dictionary=True)
+            data = {}
+            for name, sql in DASHBOARD_QUERIES.items():
+                with METRICS.query(f'dashboard.{name}', sql):
+                    cursor.execute(sql)
+                    data[name] = cursor.fetchall()
+
+            # The correlation accumulator is updated incrementally by load_data()
+            # and synced with the other processes; it is only rebuilt (one
+            # aggregate query) when empty or on a forced refresh
+            self._correlation.sync()
+            if reseed or self._correlation.n == 0:
+                with METRICS.query('dashboard.correlation'):
+                    self._correlation.seed_from_db(cursor)
+                self._correlation.save()
+            cursor.close()
+
+        totals = data.pop('totals')[0]
+        data['total_trans'] = int(totals['total'])
+        data['fraud_trans'] = int(totals['fraud'])
+        data['investigating_alerts'] = sum(
+            int(row['count']) for row in data['status'] if row['status'] == 'investigating'
+        )
+        data['correlation'] = self._correlation.corr()
+        return data
+
+    def _read_shared_version(self):
+        with self._connect(autocommit=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT version FROM CacheVersions WHERE name = %s", (self.cache_name,))
+            row = cursor.fetchone()
+            cursor.close()
+        return row[0] if row else 0
+
+    def _bump_shared_version(self):
+        try:
+            with self._connect(autocommit=True) as conn:
+                cursor = conn.cursor()
+                cursor.execute("""
+                    INSERT INTO CacheVersions (name, version) VALUES (%s, 1)
+                    ON DUPLICATE KEY UPDATE version = version + 1
+                """, (self.cache_name,))
+                cursor.close()
+        except Exception as e:
+            print(f"⚠️ Could not notify other processes of the dashboard change: {e}")
+
+    def refresh(self, reseed=False):
+        # Serialize refreshes so a forced refresh and the background thread don't both run
+        with self._refresh_lock:
+            start = time.time()
+            # Read before the queries, so a change made during them triggers another refresh
+            shared_version = self._read_shared_version()
+            data = self._query_all(reseed=reseed)
+            METRICS.observe('dashboard_refresh_seconds', time.time() - start)
+            with self._lock:
+                self._data = data
+                self.refreshed_at = time.time()
+                self.refresh_seconds = self.refreshed_at - start
+                self.version += 1
+                self.shared_version = shared_version
+        # A rebuilt correlation state is in the shared file now; let the others reload it
+        if reseed:
+            self._bump_shared_version()
+        return data
+
+    def get(self):
+        with self._lock:
+            data = self._data
+        if data is None:
+            data = self.refresh()
+        return data
+
+    # (version, data) of the same snapshot, for caches keyed on the version
+    def snapshot(self):
+        self.get()
+        with self._lock:
+            return self.version, self._data
+
+    def age(self):
+        if self.refreshed_at is None:
+            return None
+        return time.time() - self.refreshed_at
+
+    # reseed also rebuilds the correlation accumulator from the table on the next refresh
+    def mark_stale(self, reseed=False):
+        if reseed:
+            self._reseed = True
+        else:
+            self._bump_shared_version()
+        self._wakeup.set()
+
+    def start_background_refresh(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._refresh_loop, name='dashboard-refresh', daemon=True)
+        self._thread.start()
+
+    # Refresh when marked stale here, when another process marked it stale, or
+    # when the snapshot is older than the refresh interval
+    def _refresh_loop(self):
+        while True:
+            woken = self._wakeup.wait(min(self.refresh_interval, STALE_POLL_SECONDS))
+            self._wakeup.clear()
+            try:
+                age = self.age()
+                if not (woken or age is None or age >= self.refresh_interval
+                        or self._read_shared_version() != self.shared_version):
+                    continue
+                reseed, self._reseed = self._reseed, False
+                self.refresh(reseed=reseed)
+            except Exception as e:
+                print(f"⚠️ Dashboard refresh failed: {e}")
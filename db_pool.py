@@ -0,0 +1,184 @@
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+import mysql.connector
+
+from metrics import METRICS
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+# Bounded pool of MySQL connections.
+# Idle connections are reused LIFO (warmest first); a connection that sat idle
+# longer than health_check_interval is pinged before being handed out, and any
+# connection that fails is replaced. Connections always go back to the pool,
+# including when the caller raises. Waiters sleep on a condition that is
+# notified both when a connection is returned and when a slot is freed, so a
+# dropped connection lets a waiter open its replacement right away.
+class ConnectionPool:
+    def __init__(self, config, size=8, timeout=30, health_check_interval=30, connect=None):
+        self._config = dict(config)
+        self._connect = connect or (lambda: mysql.connector.connect(**self._config))
+        self.size = size
+        self.timeout = timeout
+        self.health_check_interval = health_check_interval
+        self._idle = deque()
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._created = 0
+        # Autocommit state per connection, so it is only changed when needed
+        self._autocommit = {}
+
+        # Metrics
+        self.checkouts = 0
+        self.misses = 0
+        self.timeouts = 0
+        self.in_use = 0
+        self.max_in_use = 0
+        self.health_failures = 0
+        self.discarded = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _open(self):
+        with METRICS.timer('db_connect_seconds'):
+            conn = self._connect()
+        self._autocommit[id(conn)] = False
+        return conn
+
+    # Gives back the slot of a connection that is gone and wakes one waiter
+    def _free_slot(self, discarded=True):
+        with self._available:
+            self._created -= 1
+            if discarded:
+                self.discarded += 1
+            self._available.notify()
+
+    def _check_idle(self, conn, last_used):
+        if time.time() - last_used > self.health_check_interval:
+            try:
+                conn.ping(reconnect=True, attempts=1, delay=0)
+                self._autocommit[id(conn)] = False
+            except mysql.connector.Error:
+                with self._lock:
+                    self.health_failures += 1
+                self._close(conn)
+                try:
+                    conn = self._open()
+                except Exception:
+                    # The slot was this connection's; give it back so the
+                    # pool can open a new one once the server is reachable
+                    self._free_slot()
+                    raise
+        return conn
+
+    def acquire(self):
+        start = time.perf_counter()
+        deadline = time.monotonic() + self.timeout
+        idle = None
+        with self._available:
+            # Reuse an idle connection, else open a new one if below size,
+            # else wait until either becomes possible
+            if not self._idle:
+                self.misses += 1
+            while True:
+                if self._idle:
+                    idle = self._idle.pop()
+                    break
+                if self._created < self.size:
+                    self._created += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self.timeouts += 1
+                    raise PoolTimeout(f"No database connection available after {self.timeout}s")
+                self._available.wait(remaining)
+
+        if idle:
+            conn = self._check_idle(*idle)
+        else:
+            try:
+                conn = self._open()
+            except Exception:
+                self._free_slot(discarded=False)
+                raise
+
+        waited = time.perf_counter() - start
+        METRICS.observe('db_pool_wait_seconds', waited)
+        with self._lock:
+            self.checkouts += 1
+            self.in_use += 1
+            self.max_in_use = max(self.max_in_use, self.in_use)
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+        return conn
+
+    def release(self, conn, broken=False):
+        with self._lock:
+            self.in_use -= 1
+        if not broken:
+            try:
+                # Never hand out a connection with an open transaction or pending rows
+                if conn.unread_result or conn.in_transaction:
+                    conn.rollback()
+            except mysql.connector.Error:
+                broken = True
+        if broken:
+            self._close(conn)
+            self._free_slot()
+            return
+        with self._available:
+            self._idle.append((conn, time.time()))
+            self._available.notify()
+
+    def _close(self, conn):
+        self._autocommit.pop(id(conn), None)
+        try:
+            conn.close()
+        except mysql.connector.Error:
+            pass
+
+    @contextmanager
+    def connection(self, autocommit=False):
+        conn = self.acquire()
+        broken = False
+        try:
+            if self._autocommit.get(id(conn)) != autocommit:
+                conn.autocommit = autocommit
+                self._autocommit[id(conn)] = autocommit
+            yield conn
+        except (mysql.connector.OperationalError, mysql.connector.InterfaceError):
+            broken = True
+            raise
+        finally:
+            self.release(conn, broken=broken)
+
+    def close_all(self):
+        with self._lock:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._created -= len(idle)
+        for conn, _ in idle:
+            self._close(conn)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': self.size,
+                'open': self._created,
+                'idle': len(self._idle),
+                'in_use': self.in_use,
+                'max_in_use': self.max_in_use,
+                'checkouts': self.checkouts,
+                'misses': self.misses,
+                'timeouts': self.timeouts,
+                'health_failures': self.health_failures,
+                'discarded': self.discarded,
+                'wait_seconds_total': round(self.wait_seconds_total, 6),
+                'wait_seconds_max': round(self.wait_seconds_max, 6),
+                'wait_seconds_avg': round(self.wait_seconds_total / self.checkouts, 6) if self.checkouts else 0.0,
+            }
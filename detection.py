@@ -0,0 +1,358 @@
+import argparse
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import mysql.connector
+import numpy as np
+
+from metrics import METRICS
+from model_registry import FEATURE_COLUMNS, ModelRegistry
+
+ML_ALERT_RULE_ID = 99
+ML_ALERT_CONFIDENCE = 0.8
+
+# Rows per multi-row INSERT statement (mysql.connector folds executemany into one statement)
+WRITE_BATCH_SIZE = 5000
+
+# Rows scored by the interactive run (the latest by transaction_time)
+RECENT_DETECTION_ROWS = 1000
+
+# Rows scored per chunk in backlog mode; memory use is bounded by this, not by table size
+BACKLOG_CHUNK_SIZE = 20000
+
+
+# Wall-clock timings per named stage, reported back to the user; with a
+# metric name every stage call is also recorded in that histogram
+class StageTimer:
+    def __init__(self, metric=None):
+        self.stages = OrderedDict()
+        self.metric = metric
+
+    @contextmanager
+    def stage(self, name):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            self.stages[name] = self.stages.get(name, 0.0) + elapsed
+            if self.metric:
+                METRICS.observe(self.metric, elapsed, stage=name)
+
+    def total(self):
+        return sum(self.stages.values())
+
+    def summary(self):
+        return ' · '.join(f"{name} {seconds:.2f}s" for name, seconds in self.stages.items())
+
+
+def ml_alert_rows(ids, preds, probs):
+    flagged = np.flatnonzero((preds == 1) & (probs >= ML_ALERT_CONFIDENCE))
+    return [(int(tx_id), ML_ALERT_RULE_ID, 'new') for tx_id in ids[flagged]]
+
+
+# Bulk write-back: load scores into a temporary table with large multi-row
+# INSERTs, then apply them with a single joined UPDATE
+def write_scores(cursor, ids, preds, probs, batch_size=WRITE_BATCH_SIZE):
+    cursor.execute("""
+        CREATE TEMPORARY TABLE IF NOT EXISTS ml_scores (
+            transaction_id INT PRIMARY KEY,
+            ml_prediction TINYINT,
+            ml_confidence FLOAT
+        ) ENGINE=MEMORY
+    """)
+    cursor.execute("TRUNCATE TABLE ml_scores")
+
+    rows = list(zip(ids.tolist(), preds.tolist(), probs.tolist()))
+    for i in range(0, len(rows), batch_size):
+        cursor.executemany("""
+            INSERT INTO ml_scores (transaction_id, ml_prediction, ml_confidence)
+            VALUES (%s, %s, %s)
+        """, rows[i:i + batch_size])
+
+    cursor.execute("""
+        UPDATE Transactions t
+        JOIN ml_scores s ON s.transaction_id = t.transaction_id
+        SET t.ml_prediction = s.ml_prediction,
+            t.ml_confidence = s.ml_confidence
+    """)
+    updated = cursor.rowcount
+    cursor.execute("DROP TEMPORARY TABLE IF EXISTS ml_scores")
+    return updated
+
+
+# Alerts from every rule are written with multi-row upserts straight into
+# FraudAlerts. The unique (transaction_id, rule_id) key makes an alert that
+# already exists a no-op, so re-running detection never duplicates and never
+# overwrites a status an analyst has set. Rows are written in key order so
+# concurrent runs lock index entries in the same order. Returns the number inserted.
+def insert_alerts(cursor, rows, batch_size=WRITE_BATCH_SIZE):
+    rows = sorted(rows)
+    inserted = 0
+    for i in range(0, len(rows), batch_size):
+        cursor.executemany("""
+            INSERT INTO FraudAlerts (transaction_id, rule_id, status)
+            VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE alert_id = alert_id
+        """, rows[i:i + batch_size])
+        # 1 per new alert, 0 per existing one (without CLIENT_FOUND_ROWS, which the pool does not set)
+        inserted += cursor.rowcount
+    return inserted
+
+
+def log_predictions(ids, amounts, preds, probs):
+    for tx_id, amount, prediction, confidence in zip(ids, amounts, preds, probs):
+        print(f"🔍 TX {tx_id} | ${amount:.2f} | ML_PRED: {prediction} | CONF: {confidence:.4f}")
+
+
+# The interactive detection pass (/run-detection): score the latest
+# transactions, evaluate the rules on the same rows, catch the velocity rules
+# up (velocity(cursor) returns their alerts; None skips them) and write
+# everything back. With a ParallelScorer the rows are scored in its worker
+# processes. Returns the counts, or None when there is nothing to score.
+def run_recent(cursor, bundle, rule_engine, timer, velocity=None, limit=RECENT_DETECTION_ROWS, debug=False,
+               scorer=None):
+    # Model features first (in model order), then any extra columns the rules test
+    columns = FEATURE_COLUMNS + [col for col in rule_engine.columns if col not in FEATURE_COLUMNS]
+    with timer.stage('fetch'):
+        cursor.execute(f"""
+            SELECT transaction_id, {', '.join(columns)}
+            FROM Transactions
+            ORDER BY transaction_time DESC
+            LIMIT %s
+        """, (limit,))
+        rows = cursor.fetchall()
+    if not rows:
+        return None
+
+    with timer.stage('features'):
+        data = np.asarray(rows, dtype=np.float64)
+        ids = data[:, 0].astype(np.int64)
+        X = data[:, 1:1 + len(FEATURE_COLUMNS)]
+
+    with timer.stage('score'):
+        if scorer is None:
+            preds, probs = bundle.score(X)
+        else:
+            _, _, preds, probs = next(scorer.score_ordered([(ids, X)]))
+        flagged_ml = ml_alert_rows(ids, preds, probs)
+
+    with timer.stage('rules'):
+        rule_alerts = rule_engine.alerts(cursor, ids, {col: data[:, i + 1] for i, col in enumerate(columns)})
+
+    velocity_matches = []
+    if velocity is not None:
+        with timer.stage('velocity'):
+            velocity_matches = velocity(cursor)
+
+    if debug:
+        log_predictions(ids, X[:, -1], preds, probs)
+
+    # Bulk write-back of ML results, then rule, velocity and ML alerts in one insert
+    with timer.stage('write'):
+        write_scores(cursor, ids, preds, probs)
+        created = insert_alerts(cursor, rule_alerts + velocity_matches + flagged_ml)
+
+    return {'transactions': len(ids), 'rule_alerts': len(rule_alerts), 'velocity_alerts': len(velocity_matches),
+            'ml_alerts': len(flagged_ml), 'created': created}
+
+
+# Find the run to continue (a crashed or interrupted one) or start a new one
+def _start_or_resume_run(cursor, resume=True):
+    if resume:
+        cursor.execute("""
+            SELECT run_id, last_transaction_id, rows_scored, alerts_created
+            FROM DetectionRuns
+            WHERE status IN ('running', 'failed')
+            ORDER BY run_id DESC
+            LIMIT 1
+        """)
+        row = cursor.fetchone()
+        if row:
+            cursor.execute("UPDATE DetectionRuns SET status = 'running', error = NULL WHERE run_id = %s", (row[0],))
+            return row
+    cursor.execute("INSERT INTO DetectionRuns (status) VALUES ('running')")
+    return cursor.lastrowid, 0, 0, 0
+
+
+# Unscored rows in transaction_id order, one chunk per keyset query
+def _iter_unscored(cursor, last_id, chunk_size, timer, store=None):
+    while True:
+        with timer.stage('fetch'):
+            if store is not None:
+                scanned, ids, X = _fetch_unscored_from_store(cursor, store, last_id, chunk_size)
+            else:
+                cursor.execute(f"""
+                    SELECT transaction_id, {', '.join(FEATURE_COLUMNS)}
+                    FROM Transactions
+                    WHERE ml_prediction IS NULL AND transaction_id > %s
+                    ORDER BY transaction_id
+                    LIMIT %s
+                """, (last_id, chunk_size))
+                data = np.asarray(cursor.fetchall(), dtype=np.float64).reshape(-1, 1 + len(FEATURE_COLUMNS))
+                ids = data[:, 0].astype(np.int64)
+                X = data[:, 1:]
+                scanned = int(ids[-1]) if len(ids) else None
+        if scanned is None:
+            return
+        last_id = scanned
+        if len(ids):
+            yield ids, X
+
+
+# With a feature store only the ids come from MySQL (an index-only scan of
+# idx_ml_pending); features are gathered from the memory-mapped snapshot and
+# only rows it does not hold yet are fetched from the table.
+# Returns (last id scanned or None when done, ids, features).
+def _fetch_unscored_from_store(cursor, store, last_id, chunk_size):
+    cursor.execute("""
+        SELECT transaction_id
+        FROM Transactions
+        WHERE ml_prediction IS NULL AND transaction_id > %s
+        ORDER BY transaction_id
+        LIMIT %s
+    """, (last_id, chunk_size))
+    ids = np.fromiter((row[0] for row in cursor.fetchall()), dtype=np.int64)
+    if len(ids) == 0:
+        return None, ids, None
+
+    found, stored = store.take(ids)
+    X = np.empty((len(ids), len(FEATURE_COLUMNS)), dtype=np.float64)
+    X[found] = stored
+    missing = np.flatnonzero(~found)
+    if len(missing):
+        cursor.execute(f"""
+            SELECT transaction_id, {', '.join(FEATURE_COLUMNS)}
+            FROM Transactions
+            WHERE transaction_id IN ({', '.join(['%s'] * len(missing))})
+            ORDER BY transaction_id
+        """, tuple(ids[missing].tolist()))
+        data = np.asarray(cursor.fetchall(), dtype=np.float64).reshape(-1, 1 + len(FEATURE_COLUMNS))
+        # Rows deleted since the id scan are skipped
+        fetched = missing[np.isin(ids[missing], data[:, 0].astype(np.int64))]
+        X[fetched] = data[:, 1:]
+        found[fetched] = True
+    return int(ids[-1]), ids[found], X[found]
+
+
+def _score_serial(chunks, bundle, timer):
+    for ids, X in chunks:
+        with timer.stage('score'):
+            preds, probs = bundle.score(X)
+        yield ids, X, preds, probs
+
+
+# Score every transaction that has no ml_prediction yet.
+# Walks the table in fixed-size chunks with a keyset on transaction_id; each
+# chunk's scores, alerts and checkpoint are committed together, so a crashed
+# run resumes from its last committed chunk. With a ParallelScorer the chunks
+# are scored by a process pool while the next ones are being fetched. With a
+# FeatureStore the features are read from the local snapshot instead of MySQL.
+def run_backlog(connection, bundle, chunk_size=BACKLOG_CHUNK_SIZE, resume=True, debug=False,
+                progress=None, scorer=None, store=None):
+    timer = StageTimer(metric='backlog_stage_seconds')
+    with connection() as conn:
+        cursor = conn.cursor()
+
+        # Only one backlog run at a time
+        cursor.execute("SELECT GET_LOCK('fraud_backlog_detection', 0)")
+        if not cursor.fetchone()[0]:
+            raise RuntimeError("Another backlog detection run is in progress")
+
+        try:
+            run_id, last_id, rows_scored, alerts_created = _start_or_resume_run(cursor, resume)
+            conn.commit()
+
+            try:
+                chunks = _iter_unscored(cursor, last_id, chunk_size, timer, store)
+                if scorer is None:
+                    scored = _score_serial(chunks, bundle, timer)
+                else:
+                    scored = scorer.score_ordered(chunks)
+
+                for ids, X, preds, probs in scored:
+                    alerts = ml_alert_rows(ids, preds, probs)
+                    if debug:
+                        log_predictions(ids, X[:, -1], preds, probs)
+
+                    with timer.stage('write'):
+                        write_scores(cursor, ids, preds, probs)
+                        alerts_created += insert_alerts(cursor, alerts)
+                        last_id = int(ids[-1])
+                        rows_scored += len(ids)
+                        cursor.execute("""
+                            UPDATE DetectionRuns
+                            SET last_transaction_id = %s, rows_scored = %s, alerts_created = %s
+                            WHERE run_id = %s
+                        """, (last_id, rows_scored, alerts_created, run_id))
+                        conn.commit()
+
+                    if progress:
+                        progress(run_id, last_id, rows_scored, alerts_created)
+
+                cursor.execute("UPDATE DetectionRuns SET status = 'completed' WHERE run_id = %s", (run_id,))
+                conn.commit()
+            except Exception as e:
+                # Record the failure; the checkpoint stays at the last committed chunk
+                try:
+                    conn.rollback()
+                    cursor.execute("UPDATE DetectionRuns SET status = 'failed', error = %s WHERE run_id = %s",
+                                   (str(e), run_id))
+                    conn.commit()
+                except mysql.connector.Error:
+                    pass
+                raise
+        finally:
+            # The lock is also released when the session ends, so a dead connection is fine here
+            try:
+                cursor.execute("SELECT RELEASE_LOCK('fraud_backlog_detection')")
+                cursor.fetchall()
+                cursor.close()
+            except mysql.connector.Error:
+                pass
+
+    return {
+        'run_id': run_id,
+        'model_version': bundle.version,
+        'last_transaction_id': last_id,
+        'rows_scored': rows_scored,
+        'alerts_created': alerts_created,
+        'timings': dict(timer.stages),
+        'throughput': scorer.throughput() if scorer is not None else None,
+    }
+
+
+if __name__ == '__main__':
+    from config import DB_CONFIG
+    from db_pool import ConnectionPool
+    from feature_store import FeatureStore
+    from parallel_scoring import ParallelScorer
+
+    parser = argparse.ArgumentParser(description="Score every transaction without an ML prediction")
+    parser.add_argument('--chunk-size', type=int, default=BACKLOG_CHUNK_SIZE)
+    parser.add_argument('--workers', type=int, default=1, help="scoring processes (1 = score in this process)")
+    parser.add_argument('--restart', action='store_true', help="start a new run instead of resuming")
+    parser.add_argument('--debug', action='store_true', help="print one line per transaction")
+    parser.add_argument('--feature-store', action='store_true',
+                        help="read features from the local feature store (python feature_store.py) instead of MySQL")
+    args = parser.parse_args()
+
+    pool = ConnectionPool(DB_CONFIG, size=1)
+    bundle = ModelRegistry().active()
+    scorer = ParallelScorer(bundle.version, args.workers) if args.workers > 1 else None
+    start = time.time()
+
+    def report(run_id, last_id, rows_scored, alerts_created):
+        elapsed = time.time() - start
+        print(f"✅ Run {run_id}: {rows_scored} scored, {alerts_created} ML alerts, "
+              f"last id {last_id} ({rows_scored / elapsed:.0f} rows/s)")
+
+    try:
+        result = run_backlog(pool.connection, bundle, chunk_size=args.chunk_size,
+                             resume=not args.restart, debug=args.debug, progress=report, scorer=scorer,
+                             store=FeatureStore() if args.feature_store else None)
+    finally:
+        if scorer is not None:
+            scorer.close()
+    print(f"✅ Backlog detection finished: {result}")
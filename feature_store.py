@@ -0,0 +1,289 @@
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+
+from model_registry import BASE_DIR, FEATURE_COLUMNS
+
+FEATURE_STORE_DIR = os.path.join(BASE_DIR, 'feature_store')
+MANIFEST_FILE = 'manifest.json'
+
+# Rows per partition; a smaller last partition is merged with the next refresh
+PARTITION_ROWS = 1000000
+
+# Rows fetched per round trip while exporting
+EXPORT_CHUNK_ROWS = 100000
+
+# One .npy file per array in every partition. The feature matrix is stored in
+# Fortran (column-major) order, so a single column is a contiguous slice of the
+# file, and it keeps FEATURE_COLUMNS order so rows can be scored as they are.
+# is_fraud is -1 where the label is NULL.
+ID_COLUMNS = ['transaction_id', 'account_id', 'card_id', 'transaction_time', 'is_fraud']
+ARRAY_DTYPES = {
+    'transaction_id': np.int64,
+    'account_id': np.int32,
+    'card_id': np.int32,
+    'transaction_time': np.int32,
+    'is_fraud': np.int8,
+    'features': np.float64,
+}
+
+# "+ 0E0" has the server send DOUBLEs, which are far cheaper to convert than DECIMAL
+EXPORT_SQL = f"""
+    SELECT {', '.join(ID_COLUMNS)}, {', '.join(f'{col} + 0E0' for col in FEATURE_COLUMNS)}
+    FROM Transactions
+    WHERE transaction_id > %s
+    ORDER BY transaction_id
+"""
+
+
+# Growable set of partition arrays, flushed when it reaches PARTITION_ROWS
+class _PartitionBuffer:
+    def __init__(self, capacity):
+        self.capacity = capacity
+        self.n = 0
+        self.arrays = {name: np.empty(capacity, dtype=dtype) for name, dtype in ARRAY_DTYPES.items()
+                       if name != 'features'}
+        self.arrays['features'] = np.empty((capacity, len(FEATURE_COLUMNS)), dtype=np.float64, order='F')
+
+    def free(self):
+        return self.capacity - self.n
+
+    def append(self, arrays):
+        count = len(arrays['transaction_id'])
+        for name, values in arrays.items():
+            self.arrays[name][self.n:self.n + count] = values
+        self.n += count
+
+    def contents(self):
+        contents = {name: values[:self.n] for name, values in self.arrays.items()}
+        # A row slice of a Fortran array is strided; np.save would write it in C order
+        contents['features'] = np.asfortranarray(contents['features'])
+        return contents
+
+
+# Local, append-only columnar snapshot of Transactions.
+# Partitions are directories of .npy files named by their transaction_id range
+# and listed in manifest.json. A refresh only fetches ids above the last
+# exported one. Every partition is fully written before it is renamed into
+# place and the manifest is swapped with os.replace, so readers never see a
+# partial partition. Readers memory-map the files: nothing is copied until it
+# is touched, and a single partition is read without any copy at all.
+# Rows updated or deleted in MySQL after they were exported are not refreshed;
+# rebuild() re-exports everything.
+class FeatureStore:
+    def __init__(self, path=FEATURE_STORE_DIR):
+        self.path = path
+
+    def manifest(self):
+        try:
+            with open(os.path.join(self.path, MANIFEST_FILE)) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {'features': FEATURE_COLUMNS, 'last_id': 0, 'rows': 0, 'partitions': []}
+
+    def exists(self):
+        return bool(self.manifest()['partitions'])
+
+    @property
+    def last_id(self):
+        return self.manifest()['last_id']
+
+    def _write_manifest(self, manifest):
+        manifest['rows'] = sum(part['rows'] for part in manifest['partitions'])
+        manifest['updated_at'] = time.strftime('%Y-%m-%dT%H:%M:%S')
+        tmp = os.path.join(self.path, MANIFEST_FILE + '.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.replace(tmp, os.path.join(self.path, MANIFEST_FILE))
+
+    def load_partition(self, part, names=None, mmap_mode='r'):
+        path = os.path.join(self.path, part['name'])
+        return {name: np.load(os.path.join(path, name + '.npy'), mmap_mode=mmap_mode)
+                for name in (names or ARRAY_DTYPES)}
+
+    # (partition entry, memory-mapped arrays) for every partition with ids above min_id
+    def iter_partitions(self, names=None, min_id=0):
+        for part in self.manifest()['partitions']:
+            if part['last_id'] > min_id:
+                yield part, self.load_partition(part, names)
+
+    # Whole arrays across partitions: the memory map itself for a single
+    # partition, otherwise one copy into a new array of the requested dtype
+    def read(self, names=None, dtype=None):
+        parts = [arrays for _, arrays in self.iter_partitions(names)]
+        result = {}
+        for name in (names or ARRAY_DTYPES):
+            if len(parts) == 1 and (dtype is None or parts[0][name].dtype == dtype):
+                result[name] = parts[0][name]
+            elif not parts:
+                result[name] = np.empty((0, len(FEATURE_COLUMNS)) if name == 'features' else 0,
+                                        dtype=dtype or ARRAY_DTYPES[name])
+            else:
+                result[name] = np.concatenate([arrays[name] for arrays in parts]).astype(dtype or ARRAY_DTYPES[name],
+                                                                                        copy=False)
+        return result
+
+    # Feature rows for ids sorted ascending: (found mask, rows for the found ids)
+    def take(self, ids):
+        ids = np.asarray(ids, dtype=np.int64)
+        found = np.zeros(len(ids), dtype=bool)
+        X = np.empty((len(ids), len(FEATURE_COLUMNS)), dtype=np.float64)
+        if len(ids) == 0:
+            return found, X[:0]
+        for part, arrays in self.iter_partitions(['transaction_id', 'features'], min_id=int(ids[0]) - 1):
+            if part['first_id'] > ids[-1]:
+                break
+            stored = arrays['transaction_id']
+            pos = np.searchsorted(stored, ids)
+            hit = (pos < len(stored)) & (stored[np.minimum(pos, len(stored) - 1)] == ids) & ~found
+            X[hit] = arrays['features'][pos[hit]]
+            found |= hit
+        return found, X[found]
+
+    # Labeled rows for training, newest first when capped: float32 features and int8 labels,
+    # filled partition by partition without a float64 copy of the table
+    def training_arrays(self, limit=None):
+        parts = list(self.iter_partitions(['is_fraud', 'features']))
+        masks = [arrays['is_fraud'] >= 0 for _, arrays in parts]
+        total = sum(int(mask.sum()) for mask in masks)
+        n = total if limit is None else min(total, limit)
+        X = np.empty((n, len(FEATURE_COLUMNS)), dtype=np.float32)
+        y = np.empty(n, dtype=np.int8)
+        filled = 0
+        for (_, arrays), mask in zip(reversed(parts), reversed(masks)):
+            if filled == n:
+                break
+            rows = np.flatnonzero(mask)[-(n - filled):]
+            X[filled:filled + len(rows)] = arrays['features'][rows]
+            y[filled:filled + len(rows)] = arrays['is_fraud'][rows]
+            filled += len(rows)
+        return X, y
+
+    def _flush(self, manifest, buffer, replaces=None):
+        arrays = buffer.contents()
+        ids = arrays['transaction_id']
+        first_id, last_id = int(ids[0]), int(ids[-1])
+        name = f'p{first_id:010d}-{last_id:010d}'
+        tmp = os.path.join(self.path, f'.tmp-{name}')
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        for key, values in arrays.items():
+            np.save(os.path.join(tmp, key + '.npy'), values)
+        final = os.path.join(self.path, name)
+        # Left behind by a refresh that died before its manifest swap
+        shutil.rmtree(final, ignore_errors=True)
+        os.rename(tmp, final)
+
+        entry = {'name': name, 'first_id': first_id, 'last_id': last_id, 'rows': len(ids)}
+        if replaces is not None:
+            manifest['partitions'].remove(replaces)
+        manifest['partitions'].append(entry)
+        manifest['last_id'] = last_id
+        self._write_manifest(manifest)
+        # Open memory maps keep the old files readable where the OS allows it
+        if replaces is not None:
+            shutil.rmtree(os.path.join(self.path, replaces['name']), ignore_errors=True)
+        return entry
+
+    # Append every transaction above the last exported id. Returns the number
+    # of rows added. One writer at a time.
+    def refresh(self, conn, chunk_rows=EXPORT_CHUNK_ROWS, partition_rows=PARTITION_ROWS, progress=None):
+        os.makedirs(self.path, exist_ok=True)
+        manifest = self.manifest()
+        if manifest['features'] != FEATURE_COLUMNS:
+            raise ValueError("❌ Feature store was built with other feature columns; rebuild it.")
+        added = 0
+
+        buffer = _PartitionBuffer(partition_rows)
+        # A partial last partition is rewritten together with the new rows
+        tail = manifest['partitions'][-1] if manifest['partitions'] else None
+        if tail is not None and tail['rows'] < partition_rows:
+            buffer.append(self.load_partition(tail, mmap_mode=None))
+        else:
+            tail = None
+
+        cursor = conn.cursor(buffered=False)
+        cursor.execute(EXPORT_SQL, (manifest['last_id'],))
+        while True:
+            rows = cursor.fetchmany(chunk_rows)
+            if not rows:
+                break
+            data = np.asarray(rows, dtype=np.float64)
+            start = 0
+            while start < len(data):
+                part = data[start:start + buffer.free()]
+                arrays = {name: part[:, i] for i, name in enumerate(ID_COLUMNS)}
+                arrays['is_fraud'] = np.nan_to_num(arrays['is_fraud'], nan=-1)
+                arrays['features'] = part[:, len(ID_COLUMNS):]
+                buffer.append(arrays)
+                start += len(part)
+                added += len(part)
+                if buffer.free() == 0:
+                    self._flush(manifest, buffer, tail)
+                    buffer, tail = _PartitionBuffer(partition_rows), None
+            if progress:
+                progress(added, int(data[-1, 0]))
+        cursor.close()
+        if added and buffer.n:
+            self._flush(manifest, buffer, tail)
+        return added
+
+    # Rows an earlier refresh could not see: ids below the last exported one
+    # that were committed later (e.g. by a concurrent load). Non-zero means
+    # the snapshot needs a rebuild.
+    def missing_rows(self, conn):
+        manifest = self.manifest()
+        cursor = conn.cursor()
+        cursor.execute("SELECT COUNT(*) FROM Transactions WHERE transaction_id <= %s", (manifest['last_id'],))
+        count = cursor.fetchone()[0]
+        cursor.close()
+        return count - manifest['rows']
+
+    def rebuild(self, conn, **kwargs):
+        shutil.rmtree(self.path, ignore_errors=True)
+        return self.refresh(conn, **kwargs)
+
+
+if __name__ == '__main__':
+    import mysql.connector
+    from config import DB_CONFIG
+
+    parser = argparse.ArgumentParser(description="Append new transactions to the local feature snapshot")
+    parser.add_argument('--path', default=FEATURE_STORE_DIR)
+    parser.add_argument('--rebuild', action='store_true', help="drop the snapshot and export everything again")
+    parser.add_argument('--chunk-rows', type=int, default=EXPORT_CHUNK_ROWS)
+    parser.add_argument('--corr', action='store_true',
+                        help="afterwards, print the features most correlated with is_fraud (read from the snapshot)")
+    args = parser.parse_args()
+
+    store = FeatureStore(args.path)
+    conn = mysql.connector.connect(**DB_CONFIG)
+    start = time.time()
+
+    def report(added, last_id):
+        print(f"✅ {added} rows exported, last id {last_id} ({added / (time.time() - start):.0f} rows/s)")
+
+    if args.rebuild:
+        added = store.rebuild(conn, chunk_rows=args.chunk_rows, progress=report)
+    else:
+        added = store.refresh(conn, chunk_rows=args.chunk_rows, progress=report)
+    missing = store.missing_rows(conn)
+    conn.close()
+    manifest = store.manifest()
+    print(f"✅ Feature store: {added} new rows, {manifest['rows']} total in {len(manifest['partitions'])} partitions, "
+          f"last id {manifest['last_id']}")
+    if missing > 0:
+        print(f"⚠️ {missing} rows below the last exported id were committed after it was exported; run with --rebuild")
+
+    if args.corr:
+        from corr_stats import CorrelationAccumulator
+
+        accumulator = CorrelationAccumulator()
+        accumulator.seed_from_store(store)
+        fraud_corr = accumulator.corr()['is_fraud'].drop('is_fraud').sort_values(key=abs, ascending=False)
+        print(f"✅ Correlation with is_fraud over {accumulator.n} rows with amount > 800:")
+        print(fraud_corr.head(10).to_string())
@@ -0,0 +1,202 @@
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from joblib import load
+
+from model_registry import COMPILED_FILE, MODELS_DIR, read_active_version
+
+MAGIC = b'FOREST01'
+
+# Arrays start on this boundary so every memory-mapped view is aligned
+ALIGNMENT = 64
+
+# Rows evaluated together; bounds the (rows x trees) index arrays to a few MB
+EVAL_BLOCK_ROWS = 8192
+
+# Levels stepped between removing the (row, tree) pairs that reached a leaf
+COMPACT_EVERY = 8
+
+
+# One tree renumbered breadth-first so both children of a split are adjacent:
+# the right child of node n is child[n] + 1. A leaf is its own child and has
+# threshold +inf, so it keeps every non-NaN row where it is; evaluation can step
+# all pairs several levels between checks for the ones that already finished.
+# Leaves are found by child[n] == n, not by the threshold: a forest fitted on
+# data with missing values also has +inf thresholds on real splits (missing
+# values to one side, everything else to the other).
+def _flatten_tree(tree, offset):
+    left, right = tree.children_left, tree.children_right
+    levels = []
+    level = np.array([0], dtype=np.int64)
+    while level.size:
+        levels.append(level)
+        internal = level[left[level] != -1]
+        level = np.column_stack([left[internal], right[internal]]).ravel()
+    order = np.concatenate(levels)
+    new_id = np.empty(len(order), dtype=np.int64)
+    new_id[order] = np.arange(len(order))
+
+    is_leaf = left[order] == -1
+    child = np.where(is_leaf, np.arange(len(order)), new_id[np.maximum(left[order], 0)]) + offset
+    feature = np.where(is_leaf, 0, tree.feature[order])
+    threshold = np.where(is_leaf, np.inf, tree.threshold[order])
+    missing_left = np.where(is_leaf, 1, tree.missing_go_to_left[order])
+    return {
+        'feature': feature.astype(np.int32),
+        'threshold': threshold.astype(np.float64),
+        'child': child.astype(np.int32),
+        'missing_left': missing_left.astype(np.uint8),
+        # Class fractions per node, exactly what DecisionTreeClassifier.predict_proba returns for a leaf
+        'value': np.ascontiguousarray(tree.value[order, 0, :], dtype=np.float64),
+    }
+
+
+# Flat node arrays for every tree of a fitted single-output forest, trees
+# concatenated in estimator order; roots[t] is the first node of tree t
+def compile_forest(model):
+    if not hasattr(model, 'estimators_') or getattr(model, 'n_outputs_', 1) != 1:
+        raise ValueError("❌ Only fitted single-output tree ensembles can be compiled.")
+    flat, roots, offset = [], [], 0
+    for estimator in model.estimators_:
+        roots.append(offset)
+        flat.append(_flatten_tree(estimator.tree_, offset))
+        offset += estimator.tree_.node_count
+    if offset >= 2 ** 31:
+        raise ValueError("❌ Forest has too many nodes for 32-bit node indices.")
+    arrays = {name: np.concatenate([tree[name] for tree in flat]) for name in flat[0]}
+    arrays['roots'] = np.asarray(roots, dtype=np.int32)
+    header = {
+        'n_trees': len(model.estimators_),
+        'n_features': int(model.n_features_in_),
+        'classes': np.asarray(model.classes_).tolist(),
+        'max_depth': max(int(estimator.tree_.max_depth) for estimator in model.estimators_),
+        'nodes': offset,
+    }
+    return header, arrays
+
+
+# File layout: MAGIC, 8-byte little-endian header length, JSON header (with
+# the dtype, shape and offset of every array), then the raw arrays, each
+# starting on an ALIGNMENT boundary
+def save_compiled(model, path):
+    header, arrays = compile_forest(model)
+    layout, position = {}, 0
+    for name, values in arrays.items():
+        layout[name] = {'dtype': values.dtype.str, 'shape': list(values.shape), 'offset': position}
+        position += -(-values.nbytes // ALIGNMENT) * ALIGNMENT
+    header['arrays'] = layout
+    encoded = json.dumps(header).encode()
+    data_start = -(-(len(MAGIC) + 8 + len(encoded)) // ALIGNMENT) * ALIGNMENT
+
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(MAGIC)
+        f.write(len(encoded).to_bytes(8, 'little'))
+        f.write(encoded)
+        for name, values in arrays.items():
+            f.seek(data_start + layout[name]['offset'])
+            f.write(np.ascontiguousarray(values).tobytes())
+        f.truncate(data_start + position)
+    os.replace(tmp, path)
+    return header
+
+
+# A compiled forest read through one read-only memory map: opening it costs a
+# header parse, and the OS pages nodes in as they are visited and shares them
+# between processes. predict_proba gives the same float64 values as
+# RandomForestClassifier.predict_proba with n_jobs=1.
+class CompiledForest:
+    def __init__(self, path):
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f"❌ {path} is not a compiled forest.")
+            size = int.from_bytes(f.read(8), 'little')
+            header = json.loads(f.read(size))
+        data_start = -(-(len(MAGIC) + 8 + size) // ALIGNMENT) * ALIGNMENT
+
+        self.path = path
+        self.n_trees = header['n_trees']
+        self.n_features = header['n_features']
+        self.max_depth = header['max_depth']
+        self.classes_ = np.asarray(header['classes'])
+        self.n_classes_ = len(self.classes_)
+        # Plain ndarray views of the map: indexing a np.memmap subclass costs microseconds per call
+        raw = np.asarray(np.memmap(path, dtype=np.uint8, mode='r'))
+        for name, spec in header['arrays'].items():
+            dtype = np.dtype(spec['dtype'])
+            start = data_start + spec['offset']
+            count = int(np.prod(spec['shape']))
+            setattr(self, name, raw[start:start + count * dtype.itemsize].view(dtype).reshape(spec['shape']))
+
+    # Leaf node reached by every (row, tree) pair of a block. All unfinished
+    # pairs step down one level at a time in flat index arrays; every few
+    # levels the pairs that reached a leaf are set aside, since most paths end
+    # well above the deepest leaf.
+    def apply(self, X32):
+        rows = len(X32)
+        leaves = np.empty(rows * self.n_trees, dtype=np.intp)
+        pairs = np.arange(rows * self.n_trees)
+        nodes = np.tile(self.roots.astype(np.intp), rows)
+        row_base = np.repeat(np.arange(rows, dtype=np.intp) * self.n_features, self.n_trees)
+        flat_X = X32.ravel()
+        has_nan = bool(np.isnan(flat_X).any())
+        depth = 0
+        while len(nodes):
+            for _ in range(COMPACT_EVERY):
+                x = flat_X[row_base + self.feature[nodes]]
+                go_right = x > self.threshold[nodes]
+                if has_nan:
+                    # NaN follows the side the split sent missing values to during fitting
+                    go_right = np.where(np.isnan(x), self.missing_left[nodes] == 0, go_right)
+                nodes = self.child[nodes] + go_right
+            depth += COMPACT_EVERY
+            done = self.child[nodes] == nodes if depth < self.max_depth else np.ones(len(nodes), dtype=bool)
+            leaves[pairs[done]] = nodes[done]
+            active = ~done
+            pairs, nodes, row_base = pairs[active], nodes[active], row_base[active]
+        return leaves.reshape(rows, self.n_trees)
+
+    def predict_proba(self, X, block_rows=EVAL_BLOCK_ROWS):
+        # Same input cast as the sklearn trees (float32, compared against float64 thresholds)
+        X32 = np.ascontiguousarray(X, dtype=np.float32)
+        if X32.ndim != 2 or X32.shape[1] != self.n_features:
+            raise ValueError(f"❌ Expected {self.n_features} features, got shape {X32.shape}.")
+        proba = np.zeros((len(X32), self.n_classes_))
+        for start in range(0, len(X32), block_rows):
+            leaves = self.apply(X32[start:start + block_rows])
+            # (trees, rows, classes): the sum over the outer axis adds one tree
+            # after the other in estimator order, like the forest, so the result
+            # is bit-identical
+            proba[start:start + block_rows] = self.value[leaves.T].sum(axis=0)
+        proba /= self.n_trees
+        return proba
+
+    def info(self):
+        return {'path': self.path, 'trees': self.n_trees, 'nodes': len(self.feature), 'max_depth': self.max_depth,
+                'bytes': os.path.getsize(self.path)}
+
+
+# Compile a published bundle's model.pkl next to it (bundles published before
+# publish_bundle wrote forest.bin, or after a change to the format)
+def export_version(version, models_dir=MODELS_DIR):
+    path = os.path.join(models_dir, version)
+    model = load(os.path.join(path, 'model.pkl'), mmap_mode='r')
+    return save_compiled(model, os.path.join(path, COMPILED_FILE))
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Compile a published forest into a memory-mappable node file")
+    parser.add_argument('version', nargs='?', help="bundle version (default: the active one)")
+    parser.add_argument('--models-dir', default=MODELS_DIR)
+    args = parser.parse_args()
+
+    version = args.version or read_active_version(args.models_dir)
+    start = time.perf_counter()
+    header = export_version(version, args.models_dir)
+    path = os.path.join(args.models_dir, version, COMPILED_FILE)
+    print(f"✅ Compiled {header['n_trees']} trees ({header['nodes']} nodes, depth {header['max_depth']}) "
+          f"into {path}: {os.path.getsize(path) / 2 ** 20:.1f} MB in {time.perf_counter() - start:.2f}s")
@@ -0,0 +1,166 @@
+import os
+import time
+
+import mysql.connector
+import numpy as np
+import pandas as pd
+
+# Kaggle creditcard.csv header (case-insensitive) -> Transactions column
+KAGGLE_COLUMNS = {'time': 'transaction_time', 'amount': 'amount', 'class': 'is_fraud',
+                  **{f'v{i}': f'v{i}' for i in range(1, 29)}}
+
+# Column order of the INSERT below
+INSERT_COLUMNS = ['account_id', 'card_id', 'transaction_time', 'amount'] + \
+                 [f'v{i}' for i in range(1, 29)] + ['is_fraud']
+
+# Rows parsed per chunk; memory use is bounded by this, not by the file size
+INGEST_CHUNK_ROWS = 50000
+
+# Rows per multi-row INSERT statement (mysql.connector folds executemany into one statement)
+INSERT_BATCH_ROWS = 5000
+
+# Counters carried over when a job resumes from its checkpoint
+RESUME_COUNTERS = ('rows_parsed', 'rows_inserted', 'rows_rejected', 'chunks')
+
+
+class IngestCancelled(Exception):
+    pass
+
+
+INSERT_SQL = f"""
+    INSERT INTO Transactions ({', '.join(INSERT_COLUMNS)})
+    VALUES ({', '.join(['%s'] * len(INSERT_COLUMNS))})
+"""
+
+
+# Read only the header and map the CSV's own column names to Transactions columns
+def read_header(path):
+    header = pd.read_csv(path, nrows=0).columns
+    by_name = {col.strip().lower(): col for col in header}
+    missing = [name for name in KAGGLE_COLUMNS if name not in by_name]
+    if missing:
+        raise ValueError(f"❌ Missing column in CSV: {', '.join(missing)}")
+    return {by_name[name]: column for name, column in KAGGLE_COLUMNS.items()}
+
+
+# Parse the file in fixed-size chunks as float64 columns. A column the parser
+# could not read as numbers (a stray non-numeric cell) is coerced cell by cell,
+# so bad cells become NaN and only their rows are rejected instead of failing
+# the whole job; Class is float too, so a blank value is rejected the same way.
+# skip_rows data rows (after the header) are skipped when resuming.
+def iter_csv_chunks(source, columns, chunk_rows=INGEST_CHUNK_ROWS, skip_rows=0):
+    reader = pd.read_csv(source, usecols=list(columns), skiprows=range(1, skip_rows + 1) if skip_rows else None,
+                         chunksize=chunk_rows, low_memory=False)
+    for chunk in reader:
+        for col in chunk.columns:
+            if chunk[col].dtype != np.float64:
+                chunk[col] = pd.to_numeric(chunk[col], errors='coerce').astype(np.float64)
+        yield chunk.rename(columns=columns)
+
+
+def fetch_account_card_pairs(cursor):
+    cursor.execute("""
+        SELECT a.account_id, c.card_id
+        FROM Accounts a
+        JOIN CreditCards c ON a.account_id = c.account_id
+        ORDER BY a.account_id, c.card_id
+    """)
+    pairs = np.asarray(cursor.fetchall(), dtype=np.int64).reshape(-1, 2)
+    if len(pairs) == 0:
+        raise ValueError("❌ No account/card pairs available in the database.")
+    return pairs
+
+
+# Row i of the file gets pair i while there are pairs left, then a random one
+def pair_indices(n_pairs, first_row, n, rng):
+    idx = np.arange(first_row, first_row + n)
+    beyond = idx >= n_pairs
+    idx[beyond] = rng.integers(0, n_pairs, beyond.sum())
+    return idx
+
+
+def assign_pairs(pairs, first_row, n, rng):
+    return pairs[pair_indices(len(pairs), first_row, n, rng)]
+
+
+def insert_rows(cursor, frame, batch_size=INSERT_BATCH_ROWS):
+    # Per-column tolist() gives plain Python ints/floats, which the connector can send
+    columns = [frame[col].tolist() for col in INSERT_COLUMNS]
+    rows = list(zip(*columns))
+    for i in range(0, len(rows), batch_size):
+        cursor.executemany(INSERT_SQL, rows[i:i + batch_size])
+    return len(rows)
+
+
+# Stream a Kaggle-format CSV into Transactions.
+# Each chunk is cleaned, given account/card pairs and bulk-inserted in its own
+# transaction, so memory stays flat however large the file is. on_chunk(frame)
+# is called with every committed chunk and progress(stats) after it.
+# checkpoint(cursor, stats) runs inside each chunk's transaction, so a job that
+# stops can pass the saved counters back as resume_from and continue after the
+# last committed chunk. should_stop() is checked between chunks.
+def ingest_csv(connection, path, chunk_rows=INGEST_CHUNK_ROWS, on_chunk=None, progress=None, seed=None,
+               resume_from=None, checkpoint=None, should_stop=None):
+    columns = read_header(path)
+    rng = np.random.default_rng(seed)
+    stats = {'rows_parsed': 0, 'rows_inserted': 0, 'rows_rejected': 0, 'chunks': 0,
+             'bytes_total': os.path.getsize(path), 'percent': 0.0, 'seconds': 0.0, 'rows_per_sec': 0.0}
+    for key in RESUME_COUNTERS:
+        stats[key] = int((resume_from or {}).get(key) or 0)
+    skip_rows = stats['rows_parsed']
+    start = time.perf_counter()
+
+    with connection() as conn, open(path, 'rb') as source:
+        cursor = conn.cursor()
+        pairs = fetch_account_card_pairs(cursor)
+
+        for chunk in iter_csv_chunks(source, columns, chunk_rows, skip_rows):
+            if should_stop and should_stop():
+                raise IngestCancelled(f"Cancelled after {stats['rows_inserted']} rows")
+            parsed = len(chunk)
+            chunk = chunk.dropna()
+            chunk['transaction_time'] = chunk['transaction_time'].astype(np.int64)
+            chunk['is_fraud'] = chunk['is_fraud'].astype(np.int8)
+
+            assigned = assign_pairs(pairs, stats['rows_inserted'], len(chunk), rng)
+            chunk['account_id'] = assigned[:, 0]
+            chunk['card_id'] = assigned[:, 1]
+
+            done = dict(stats)
+            done['rows_parsed'] += parsed
+            done['rows_inserted'] += len(chunk)
+            done['rows_rejected'] += parsed - len(chunk)
+            done['chunks'] += 1
+            try:
+                insert_rows(cursor, chunk)
+                if checkpoint:
+                    checkpoint(cursor, done)
+                conn.commit()
+            except mysql.connector.Error:
+                conn.rollback()
+                raise
+
+            stats = done
+            # The parser reads ahead, so the file position is a close upper bound
+            if stats['bytes_total']:
+                stats['percent'] = round(min(100.0, 100.0 * source.tell() / stats['bytes_total']), 1)
+            stats['seconds'] = time.perf_counter() - start
+            # Throughput of this session only (rows skipped on resume are not counted)
+            parsed_here = stats['rows_parsed'] - skip_rows
+            stats['rows_per_sec'] = round(parsed_here / stats['seconds'], 1) if stats['seconds'] else 0.0
+
+            if on_chunk:
+                on_chunk(chunk)
+            if progress:
+                progress(dict(stats))
+
+        cursor.close()
+
+    stats['percent'] = 100.0
+    stats['seconds'] = round(time.perf_counter() - start, 3)
+    return stats
+
+
+def print_progress(stats):
+    print(f"✅ Chunk {stats['chunks']} ({stats['percent']:.0f}%): {stats['rows_parsed']} parsed, "
+          f"{stats['rows_inserted']} inserted, {stats['rows_rejected']} rejected ({stats['rows_per_sec']:.0f} rows/s)")
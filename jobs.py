@@ -0,0 +1,313 @@
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from ingest import RESUME_COUNTERS, IngestCancelled, ingest_csv, print_progress
+
+# A process refreshes heartbeat_at of the jobs it runs, and picks up cancel
+# requests for them, this often
+HEARTBEAT_SECONDS = 5
+
+# A 'running' job whose heartbeat is older than this belonged to a process that
+# died or hung; it is marked failed so it can be resumed
+STALE_JOB_SECONDS = 60
+
+JOB_COLUMNS = """
+    job_id, filename, status, created_at, updated_at, bytes_total,
+    rows_parsed, rows_inserted, rows_rejected, chunks, error
+"""
+
+
+# The job was released (its heartbeat went stale) and may now run elsewhere
+class JobReleased(Exception):
+    pass
+
+
+# Runs CSV uploads as background ingestion jobs on a small thread pool.
+# Every job is a row in IngestJobs; its counters are updated in the same
+# transaction as each chunk's inserts, so a failed, cancelled or interrupted
+# job resumes after its last committed chunk instead of starting over.
+# loader(path, resume_from, checkpoint, progress, should_stop) replaces the
+# default chunked ingest_csv(), e.g. with a wrapper around bulk_load.bulk_load().
+# A running job is owned by one manager (host:pid:token in IngestJobs.owner),
+# which keeps its heartbeat fresh; running jobs whose owner is gone are
+# released on every heartbeat of any process. Cancel requests and progress go
+# through IngestJobs too, so with several server processes any of them can
+# cancel a job or report its progress, whichever process runs it.
+class IngestJobManager:
+    def __init__(self, connection, workers=2, on_chunk=None, on_finish=None, loader=None):
+        self._connect = connection
+        self.workers = workers
+        self.on_chunk = on_chunk
+        self.on_finish = on_finish
+        self.loader = loader or partial(ingest_csv, connection, on_chunk=on_chunk)
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='ingest')
+        self._lock = threading.Lock()
+        self._started = False
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self._heartbeat = None
+        # job_id -> cancel event, for jobs queued or running in this process
+        self._cancel = {}
+        # Jobs running in this process
+        self._running = set()
+
+    # Pick up jobs still queued, release jobs orphaned by a dead process and
+    # start the heartbeat; safe to call repeatedly
+    def start(self):
+        if self._started:
+            return
+        self.release_orphans()
+        with self._connect(autocommit=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SELECT job_id FROM IngestJobs WHERE status = 'queued' ORDER BY job_id")
+            queued = [row[0] for row in cursor.fetchall()]
+            cursor.close()
+        self._started = True
+        for job_id in queued:
+            self._enqueue(job_id)
+
+    # An owner that is certainly gone: an earlier process on this host, dead or
+    # restarted under the same pid. Owners on other hosts only go stale.
+    def _owner_gone(self, owner):
+        host, _, rest = (owner or '').partition(':')
+        pid = rest.partition(':')[0]
+        if owner == self.owner or host != socket.gethostname() or not pid.isdigit() or os.name != 'posix':
+            return False
+        if int(pid) == os.getpid():
+            return True
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return True
+        except PermissionError:
+            pass
+        return False
+
+    # Mark running jobs whose owner is gone or whose heartbeat is stale as
+    # failed, so they can be resumed
+    def release_orphans(self):
+        with self._connect(autocommit=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                SELECT job_id, owner, COALESCE(heartbeat_at, updated_at) < NOW() - INTERVAL %s SECOND
+                FROM IngestJobs WHERE status = 'running'
+            """, (STALE_JOB_SECONDS,))
+            orphans = [(job_id, owner) for job_id, owner, stale in cursor.fetchall()
+                       if stale or self._owner_gone(owner)]
+            for job_id, owner in orphans:
+                cursor.execute("""
+                    UPDATE IngestJobs SET status = 'failed', error = 'interrupted', owner = NULL
+                    WHERE job_id = %s AND status = 'running' AND owner <=> %s
+                """, (job_id, owner))
+                if cursor.rowcount:
+                    print(f"⚠️ Ingest job {job_id} released: its process is gone")
+            cursor.close()
+
+    def _heartbeat_loop(self):
+        while True:
+            time.sleep(HEARTBEAT_SECONDS)
+            try:
+                if self._running:
+                    with self._connect(autocommit=True) as conn:
+                        cursor = conn.cursor()
+                        cursor.execute("UPDATE IngestJobs SET heartbeat_at = NOW() "
+                                       "WHERE owner = %s AND status = 'running'", (self.owner,))
+                        cursor.execute("SELECT job_id FROM IngestJobs "
+                                       "WHERE owner = %s AND status = 'running' AND cancel_requested = 1",
+                                       (self.owner,))
+                        cancelled = [row[0] for row in cursor.fetchall()]
+                        cursor.close()
+                    with self._lock:
+                        for job_id in cancelled:
+                            if job_id in self._cancel:
+                                self._cancel[job_id].set()
+                self.release_orphans()
+            except Exception as e:
+                print(f"⚠️ Ingest heartbeat failed: {e}")
+
+    def submit(self, path, filename):
+        with self._connect(autocommit=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO IngestJobs (filename, file_path, status, bytes_total)
+                VALUES (%s, %s, 'queued', %s)
+            """, (filename, path, os.path.getsize(path)))
+            job_id = cursor.lastrowid
+            cursor.close()
+        self._enqueue(job_id)
+        return job_id
+
+    # Continue a failed or cancelled job (or a running one whose owner is gone) from its checkpoint
+    def resume(self, job_id):
+        self.release_orphans()
+        with self._connect(autocommit=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE IngestJobs SET status = 'queued', error = NULL, cancel_requested = 0
+                WHERE job_id = %s AND status IN ('failed', 'cancelled')
+            """, (job_id,))
+            resumed = cursor.rowcount == 1
+            cursor.close()
+        if resumed:
+            self._enqueue(job_id)
+        return resumed
+
+    # A queued job is cancelled at once and never starts; a running one stops
+    # before its next chunk, at once in this process and within a heartbeat in another
+    def cancel(self, job_id):
+        with self._connect(autocommit=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE IngestJobs SET cancel_requested = 1, status = IF(status = 'queued', 'cancelled', status)
+                WHERE job_id = %s AND status IN ('queued', 'running')
+            """, (job_id,))
+            requested = cursor.rowcount == 1
+            if not requested:
+                # Already requested (an unchanged row counts as not affected)
+                cursor.execute("SELECT 1 FROM IngestJobs WHERE job_id = %s AND status = 'running' "
+                               "AND cancel_requested = 1", (job_id,))
+                requested = cursor.fetchone() is not None
+            cursor.close()
+        with self._lock:
+            event = self._cancel.get(job_id)
+        if requested and event is not None:
+            event.set()
+        return requested
+
+    def _enqueue(self, job_id):
+        with self._lock:
+            if job_id in self._cancel:
+                return
+            self._cancel[job_id] = threading.Event()
+            if self._heartbeat is None:
+                self._heartbeat = threading.Thread(target=self._heartbeat_loop, name='ingest-heartbeat',
+                                                   daemon=True)
+                self._heartbeat.start()
+        self._executor.submit(self._run, job_id)
+
+    # Only one worker (in any process) gets to move a queued job to running
+    def _claim(self, job_id):
+        with self._connect(autocommit=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE IngestJobs
+                SET status = 'running', owner = %s, heartbeat_at = NOW(), run_started_at = NOW(),
+                    start_percent = NULL, percent = NULL, rows_per_sec = NULL
+                WHERE job_id = %s AND status = 'queued'
+            """, (self.owner, job_id))
+            claimed = cursor.rowcount == 1
+            cursor.close()
+        return claimed
+
+    # Only the owner finishes a running job; a released one is left to whoever resumed it
+    def _set_status(self, job_id, status, error=None):
+        with self._connect(autocommit=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE IngestJobs SET status = %s, error = %s, owner = NULL
+                WHERE job_id = %s AND (status = 'queued' OR owner = %s)
+            """, (status, error, job_id, self.owner))
+            cursor.close()
+
+    def _run(self, job_id):
+        cancel = self._cancel[job_id]
+        try:
+            # Fails for a job cancelled while queued, or claimed by another process
+            if not self._claim(job_id):
+                return
+            with self._connect() as conn:
+                cursor = conn.cursor(dictionary=True)
+                cursor.execute(f"SELECT {JOB_COLUMNS}, file_path FROM IngestJobs WHERE job_id = %s", (job_id,))
+                job = cursor.fetchone()
+                cursor.close()
+            self._running.add(job_id)
+            # Progress of this session is measured from the first report
+            start_percent = None if job['rows_parsed'] else 0.0
+
+            # Raising here rolls back the chunk, so a released job never commits twice
+            def checkpoint(cursor, stats):
+                cursor.execute(f"""
+                    UPDATE IngestJobs
+                    SET {', '.join(f'{key} = %s' for key in RESUME_COUNTERS)}, heartbeat_at = NOW()
+                    WHERE job_id = %s AND status = 'running' AND owner = %s
+                """, tuple(stats[key] for key in RESUME_COUNTERS) + (job_id, self.owner))
+                if cursor.rowcount != 1:
+                    raise JobReleased(f"Ingest job {job_id} was released")
+
+            def progress(stats):
+                with self._connect(autocommit=True) as conn:
+                    cursor = conn.cursor()
+                    cursor.execute("""
+                        UPDATE IngestJobs
+                        SET percent = %s, rows_per_sec = %s, start_percent = COALESCE(start_percent, %s),
+                            heartbeat_at = NOW()
+                        WHERE job_id = %s AND owner = %s
+                    """, (stats['percent'], stats['rows_per_sec'],
+                          stats['percent'] if start_percent is None else start_percent, job_id, self.owner))
+                    cursor.close()
+                print_progress(stats)
+
+            self.loader(job['file_path'], resume_from=job, checkpoint=checkpoint, progress=progress,
+                        should_stop=cancel.is_set)
+
+            self._set_status(job_id, 'completed')
+            os.remove(job['file_path'])
+            print(f"✅ Ingest job {job_id} completed")
+        except IngestCancelled:
+            # The upload is kept so the job can be resumed later
+            self._set_status(job_id, 'cancelled')
+            print(f"⚠️ Ingest job {job_id} cancelled")
+        except JobReleased as e:
+            print(f"⚠️ {e}; stopped")
+        except Exception as e:
+            print(f"❌ Ingest job {job_id} failed: {e}")
+            try:
+                self._set_status(job_id, 'failed', str(e))
+            except Exception:
+                pass
+        finally:
+            with self._lock:
+                self._cancel.pop(job_id, None)
+            self._running.discard(job_id)
+            if self.on_finish:
+                self.on_finish()
+
+    # DB row plus live throughput and ETA while the job is running (in any process)
+    def status(self, job_id):
+        with self._connect() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f"""
+                SELECT {JOB_COLUMNS}, cancel_requested, percent, start_percent, rows_per_sec,
+                       TIMESTAMPDIFF(SECOND, run_started_at, NOW()) AS elapsed_seconds
+                FROM IngestJobs WHERE job_id = %s
+            """, (job_id,))
+            job = cursor.fetchone()
+            cursor.close()
+        if job is None:
+            return None
+
+        start_percent = job.pop('start_percent')
+        elapsed = job.pop('elapsed_seconds')
+        if job['status'] == 'running' and job['percent'] is not None:
+            done = job['percent'] - start_percent
+            job.update(elapsed_seconds=elapsed,
+                       eta_seconds=round(elapsed * (100 - job['percent']) / done, 1) if done > 0 else None)
+        elif job['status'] == 'completed':
+            job['percent'] = 100.0
+        else:
+            job.pop('percent')
+            job.pop('rows_per_sec')
+        job['cancel_requested'] = bool(job['cancel_requested'])
+        return job
+
+    def recent(self, limit=20):
+        with self._connect() as conn:
+            cursor = conn.cursor(dictionary=True)
+            cursor.execute(f"SELECT {JOB_COLUMNS} FROM IngestJobs ORDER BY job_id DESC LIMIT %s", (limit,))
+            jobs = cursor.fetchall()
+            cursor.close()
+        return jobs
@@ -0,0 +1,171 @@
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+from config import SLOW_QUERY_SECONDS
+
+# Upper bounds (seconds) of the latency histogram buckets
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+# Slow queries kept for /metrics/slow-queries
+SLOW_QUERY_LOG_SIZE = 200
+
+METRIC_HELP = {
+    'http_request_seconds': "Time spent serving a request, by endpoint",
+    'http_requests_total': "Requests served, by endpoint and status code",
+    'db_connect_seconds': "Time to open a new MySQL connection",
+    'db_pool_wait_seconds': "Time waiting to borrow a pooled connection",
+    'db_query_seconds': "Time to execute and fetch a named query",
+    'db_slow_queries_total': "Named queries slower than the slow-query threshold",
+    'model_load_seconds': "Time to load a model bundle",
+    'model_predict_seconds': "Time in ModelBundle.predict_proba, by evaluation path",
+    'model_predict_rows_total': "Rows scored by ModelBundle.predict_proba, by evaluation path",
+    'score_request_seconds': "Time to score one transaction for an online caller",
+    'detection_stage_seconds': "Time per stage of an interactive detection run",
+    'backlog_stage_seconds': "Time per stage of backlog detection, summed per run",
+    'dashboard_refresh_seconds': "Time to recompute the dashboard aggregates",
+    'chart_data_seconds': "Time to build the dashboard chart JSON from a snapshot",
+    'stream_stage_seconds': "Time per stage of streaming intake, summed per request",
+    'stream_events_total': "Streamed transaction events, by result (accepted, rejected, failed)",
+}
+
+
+# Fixed-bucket histogram: observe() is one bisect and a few additions under a lock
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = tuple(buckets)
+        self.counts = [0] * (len(self.buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def observe(self, value):
+        i = bisect_left(self.buckets, value)
+        with self._lock:
+            self.counts[i] += 1
+            self.sum += value
+            self.count += 1
+
+    def snapshot(self):
+        with self._lock:
+            return list(self.counts), self.sum, self.count
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _label_text(labels):
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in labels) + '}'
+
+
+# Process-wide histograms and counters, keyed by (metric name, sorted labels),
+# rendered in the Prometheus text format. Collectors add gauges that are read
+# at scrape time (pool sizes, queue depths) instead of being pushed.
+class MetricsRegistry:
+    def __init__(self, slow_query_seconds=SLOW_QUERY_SECONDS, slow_log_size=SLOW_QUERY_LOG_SIZE):
+        self.slow_query_seconds = slow_query_seconds
+        self._histograms = {}
+        self._counters = {}
+        self._collectors = []
+        self._lock = threading.Lock()
+        self.slow_queries = deque(maxlen=slow_log_size)
+
+    def histogram(self, name, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        hist = self._histograms.get(key)
+        if hist is None:
+            with self._lock:
+                hist = self._histograms.setdefault(key, Histogram())
+        return hist
+
+    def observe(self, name, seconds, **labels):
+        self.histogram(name, **labels).observe(seconds)
+
+    def inc(self, name, value=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    @contextmanager
+    def timer(self, name, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(name, time.perf_counter() - start, **labels)
+
+    # Times a named query (execute + fetch inside the block); queries over the
+    # threshold are printed and kept in the slow-query log with their SQL
+    @contextmanager
+    def query(self, name, sql=None):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self.observe('db_query_seconds', seconds, query=name)
+            if seconds >= self.slow_query_seconds:
+                self.inc('db_slow_queries_total', query=name)
+                self.slow_queries.append({
+                    'query': name,
+                    'seconds': round(seconds, 4),
+                    'at': datetime.now().isoformat(timespec='seconds'),
+                    'sql': re.sub(r'\s+', ' ', sql).strip()[:500] if sql else None,
+                })
+                print(f"🐢 Slow query {name}: {seconds:.3f}s")
+
+    # fn() returns (name, labels dict, value) gauges, read on every scrape
+    def register_collector(self, fn):
+        self._collectors.append(fn)
+
+    def slow_query_log(self):
+        return list(reversed(self.slow_queries))
+
+    def render(self):
+        lines = []
+        described = set()
+
+        def describe(name, kind):
+            if name not in described:
+                described.add(name)
+                if name in METRIC_HELP:
+                    lines.append(f"# HELP {name} {METRIC_HELP[name]}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+        for (name, labels), hist in histograms:
+            describe(name, 'histogram')
+            counts, total, count = hist.snapshot()
+            cumulative = 0
+            for bound, bucket_count in zip(hist.buckets + (float('inf'),), counts):
+                cumulative += bucket_count
+                le = '+Inf' if bound == float('inf') else repr(bound)
+                lines.append(f"{name}_bucket{_label_text(labels + (('le', le),))} {cumulative}")
+            lines.append(f"{name}_sum{_label_text(labels)} {total!r}")
+            lines.append(f"{name}_count{_label_text(labels)} {count}")
+        for (name, labels), value in counters:
+            describe(name, 'counter')
+            lines.append(f"{name}{_label_text(labels)} {value}")
+        for collect in self._collectors:
+            try:
+                gauges = list(collect())
+            except Exception as e:
+                print(f"⚠️ Metrics collector failed: {e}")
+                continue
+            for name, labels, value in gauges:
+                describe(name, 'gauge')
+                lines.append(f"{name}{_label_text(tuple(sorted(labels.items())))} {value}")
+        return '\n'.join(lines) + '\n'
+
+
+# The registry every module records into; /metrics renders it
+METRICS = MetricsRegistry()
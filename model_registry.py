@@ -0,0 +1,227 @@
+import json
+import os
+import shutil
+import threading
+import time
+from datetime import datetime
+
+import numpy as np
+from joblib import dump, load
+
+from metrics import METRICS
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODELS_DIR = os.path.join(BASE_DIR, 'models')
+ACTIVE_FILE = 'ACTIVE'
+
+# Compiled copy of the forest next to model.pkl (see forest_export.py)
+COMPILED_FILE = 'forest.bin'
+
+# Files written by older versions of prediction.py, used when no versioned bundle exists
+LEGACY_VERSION = 'legacy'
+LEGACY_MODEL = os.path.join(BASE_DIR, 'fraud_model.pkl')
+LEGACY_SCALER = os.path.join(BASE_DIR, 'scaler.pkl')
+
+# Feature order the model is trained on (see prediction.py)
+FEATURE_COLUMNS = [f'v{i}' for i in range(1, 29)] + ['amount']
+
+
+# Below this many rows the forest's joblib dispatch costs far more than walking
+# the trees, so small batches take the direct path in ModelBundle.predict_proba()
+# (the compiled forest when the bundle has one). Larger batches are faster in
+# sklearn's compiled tree code.
+SMALL_BATCH_ROWS = 256
+
+
+# Same arithmetic as RandomForestClassifier.predict_proba with n_jobs=1
+# (float32 input, per-tree probabilities summed in estimator order, then
+# averaged), without the per-call Parallel overhead
+def forest_predict_proba(model, X):
+    X32 = np.ascontiguousarray(X, dtype=np.float32)
+    proba = np.zeros((len(X32), model.n_classes_))
+    for estimator in model.estimators_:
+        proba += estimator.predict_proba(X32, check_input=False)
+    proba /= len(model.estimators_)
+    return proba
+
+
+# A model and the preprocessing it was trained with; every scoring path goes through here.
+# With a compiled forest (forest_export.py) the pickle is only loaded when a
+# large batch or a caller needs the sklearn object.
+class ModelBundle:
+    def __init__(self, version, model, scaler, manifest=None, compiled=None, model_path=None):
+        self.version = version
+        self._model = model
+        self._model_path = model_path
+        self._n_jobs = None
+        self.compiled = compiled
+        self.scaler = scaler
+        self.manifest = manifest or {}
+        self.loaded_at = time.time()
+        self.classes_ = compiled.classes_ if compiled is not None else model.classes_
+        self._direct_forest = (compiled is None and hasattr(model, 'estimators_')
+                               and getattr(model, 'n_outputs_', 1) == 1)
+        self._direct_scaler = (type(scaler).__name__ == 'StandardScaler'
+                               and getattr(scaler, 'mean_', None) is not None
+                               and getattr(scaler, 'scale_', None) is not None)
+
+    @property
+    def model(self):
+        if self._model is None:
+            self._model = load(self._model_path, mmap_mode='r')
+            self._apply_n_jobs()
+        return self._model
+
+    # n_jobs for the sklearn model: set now if it is loaded, otherwise when it is
+    def set_n_jobs(self, n_jobs):
+        self._n_jobs = n_jobs
+        if self._model is not None:
+            self._apply_n_jobs()
+
+    def _apply_n_jobs(self):
+        if self._n_jobs is not None and hasattr(self._model, 'n_jobs'):
+            self._model.n_jobs = self._n_jobs
+
+    def preprocess(self, X):
+        X = np.asarray(X, dtype=np.float64)
+        if self.scaler is None:
+            return X
+        if self._direct_scaler and len(X) <= SMALL_BATCH_ROWS:
+            # StandardScaler.transform without input validation
+            return (X - self.scaler.mean_) / self.scaler.scale_
+        return self.scaler.transform(X)
+
+    def predict_proba(self, X):
+        start = time.perf_counter()
+        X = self.preprocess(X)
+        if len(X) <= SMALL_BATCH_ROWS and self.compiled is not None:
+            path, proba = 'compiled', self.compiled.predict_proba(X)
+        elif len(X) <= SMALL_BATCH_ROWS and self._direct_forest:
+            path, proba = 'direct', forest_predict_proba(self.model, X)
+        else:
+            path, proba = 'sklearn', self.model.predict_proba(X)
+        METRICS.observe('model_predict_seconds', time.perf_counter() - start, path=path)
+        METRICS.inc('model_predict_rows_total', len(X), path=path)
+        return proba
+
+    # One predict_proba pass gives both the class and the confidence
+    def score(self, X):
+        proba = self.predict_proba(X)
+        preds = self.classes_[np.argmax(proba, axis=1)].astype(np.int8)
+        probs = proba[:, list(self.classes_).index(1)]
+        return preds, probs
+
+    def info(self):
+        return {
+            'version': self.version,
+            'loaded_at': datetime.fromtimestamp(self.loaded_at).isoformat(timespec='seconds'),
+            'manifest': self.manifest,
+            'compiled': self.compiled.info() if self.compiled is not None else None,
+        }
+
+
+def read_active_version(models_dir=MODELS_DIR):
+    try:
+        with open(os.path.join(models_dir, ACTIVE_FILE)) as f:
+            return f.read().strip() or LEGACY_VERSION
+    except FileNotFoundError:
+        return LEGACY_VERSION
+
+
+# Large numpy arrays inside the pickles are memory-mapped instead of copied
+def load_bundle(version, models_dir=MODELS_DIR):
+    if version == LEGACY_VERSION:
+        model = load(LEGACY_MODEL, mmap_mode='r')
+        scaler = load(LEGACY_SCALER) if os.path.exists(LEGACY_SCALER) else None
+        return ModelBundle(version, model, scaler)
+
+    path = os.path.join(models_dir, version)
+    with open(os.path.join(path, 'manifest.json')) as f:
+        manifest = json.load(f)
+    scaler_path = os.path.join(path, 'scaler.pkl')
+    scaler = load(scaler_path) if os.path.exists(scaler_path) else None
+    model_path = os.path.join(path, 'model.pkl')
+    compiled_path = os.path.join(path, COMPILED_FILE)
+    if os.path.exists(compiled_path):
+        from forest_export import CompiledForest
+
+        return ModelBundle(version, None, scaler, manifest, CompiledForest(compiled_path), model_path)
+    model = load(model_path, mmap_mode='r')
+    return ModelBundle(version, model, scaler, manifest)
+
+
+# Write a new versioned bundle and make it active.
+# The bundle directory is fully written before it is renamed into place, and
+# ACTIVE is swapped with os.replace, so readers never see a partial version.
+def publish_bundle(model, scaler, metadata=None, models_dir=MODELS_DIR):
+    os.makedirs(models_dir, exist_ok=True)
+    version = datetime.now().strftime('v%Y%m%d-%H%M%S')
+    while os.path.exists(os.path.join(models_dir, version)):
+        version += 'a'
+
+    tmp_path = os.path.join(models_dir, f'.tmp-{version}')
+    os.makedirs(tmp_path)
+    try:
+        # Uncompressed so the arrays can be memory-mapped on load
+        dump(model, os.path.join(tmp_path, 'model.pkl'))
+        if scaler is not None:
+            dump(scaler, os.path.join(tmp_path, 'scaler.pkl'))
+        if hasattr(model, 'estimators_') and getattr(model, 'n_outputs_', 1) == 1:
+            from forest_export import save_compiled
+
+            save_compiled(model, os.path.join(tmp_path, COMPILED_FILE))
+        manifest = {
+            'version': version,
+            'created_at': datetime.now().isoformat(timespec='seconds'),
+            'features': FEATURE_COLUMNS,
+            'model_type': type(model).__name__,
+            **(metadata or {}),
+        }
+        with open(os.path.join(tmp_path, 'manifest.json'), 'w') as f:
+            json.dump(manifest, f, indent=2)
+        os.rename(tmp_path, os.path.join(models_dir, version))
+    except Exception:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        raise
+
+    active_tmp = os.path.join(models_dir, ACTIVE_FILE + '.tmp')
+    with open(active_tmp, 'w') as f:
+        f.write(version)
+    os.replace(active_tmp, os.path.join(models_dir, ACTIVE_FILE))
+    return version
+
+
+# Keeps the active bundle warm in memory and hot-swaps it when ACTIVE changes.
+# The new bundle is loaded completely before the reference is swapped, so
+# in-flight requests keep scoring with the version they started with.
+class ModelRegistry:
+    def __init__(self, models_dir=MODELS_DIR, check_interval=5):
+        self.models_dir = models_dir
+        self.check_interval = check_interval
+        self._bundle = None
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+
+    def active(self):
+        if self._bundle is None or time.time() - self._last_check > self.check_interval:
+            self.reload()
+        return self._bundle
+
+    def reload(self, force=False):
+        self._last_check = time.time()
+        version = read_active_version(self.models_dir)
+        if not force and self._bundle is not None and self._bundle.version == version:
+            return self._bundle
+        with self._lock:
+            if force or self._bundle is None or self._bundle.version != version:
+                with METRICS.timer('model_load_seconds'):
+                    bundle = load_bundle(version, self.models_dir)
+                self._bundle = bundle
+                print(f"✅ Model version {version} loaded")
+        return self._bundle
+
+    def versions(self):
+        if not os.path.isdir(self.models_dir):
+            return []
+        return sorted(name for name in os.listdir(self.models_dir)
+                      if os.path.isfile(os.path.join(self.models_dir, name, 'manifest.json')))
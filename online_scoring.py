@@ -0,0 +1,215 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+from metrics import METRICS
+from model_registry import FEATURE_COLUMNS
+
+# Published latency objective for inline scoring (server-side, per request)
+SCORE_P99_TARGET_MS = 5.0
+
+# Same cut-off as model.predict() for a binary forest (argmax of the two probabilities)
+DECISION_THRESHOLD = 0.5
+
+N_FEATURES = len(FEATURE_COLUMNS)
+
+
+# Fixed-size ring buffer of recent latencies (ms) with percentile summaries
+class LatencyTracker:
+    def __init__(self, size=10000, target_ms=SCORE_P99_TARGET_MS):
+        self._samples = np.zeros(size)
+        self._next = 0
+        self.count = 0
+        self.target_ms = target_ms
+        self._lock = threading.Lock()
+
+    def record(self, ms):
+        with self._lock:
+            self._samples[self._next] = ms
+            self._next = (self._next + 1) % len(self._samples)
+            self.count += 1
+
+    def summary(self):
+        with self._lock:
+            window = self._samples[:min(self.count, len(self._samples))].copy()
+        if len(window) == 0:
+            return {'count': 0, 'target_p99_ms': self.target_ms}
+        p50, p90, p99 = np.percentile(window, [50, 90, 99])
+        return {
+            'count': self.count,
+            'window': len(window),
+            'p50_ms': round(float(p50), 3),
+            'p90_ms': round(float(p90), 3),
+            'p99_ms': round(float(p99), 3),
+            'max_ms': round(float(window.max()), 3),
+            'target_p99_ms': self.target_ms,
+            'within_target': bool(p99 <= self.target_ms),
+        }
+
+
+# Coalesces concurrent single-row requests into one NumPy batch.
+# A background thread takes the first queued row, then keeps collecting until
+# max_rows rows are in hand or max_wait_ms has passed since that first row was
+# queued, scores them with one predict_proba call and resolves each caller's
+# future. Queue depth, batch sizes and the wait added per row are recorded.
+class MicroBatcher:
+    def __init__(self, registry, max_rows=64, max_wait_ms=2.0):
+        self.registry = registry
+        self.max_rows = max_rows
+        self.max_wait = max_wait_ms / 1000
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = None
+
+        # Metrics
+        self.added_latency = LatencyTracker(target_ms=max_wait_ms)
+        self.batches = 0
+        self.rows = 0
+        self.max_queue_depth = 0
+        self.failed_batches = 0
+        # Upper bound of each power-of-two bucket -> batches flushed with that many rows
+        self.batch_size_histogram = {}
+        bound = 1
+        while bound < max_rows:
+            self.batch_size_histogram[bound] = 0
+            bound *= 2
+        self.batch_size_histogram[max_rows] = 0
+
+    def _ensure_started(self):
+        if self._thread is None:
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name='score-batcher', daemon=True)
+                    self._thread.start()
+
+    def submit(self, features):
+        self._ensure_started()
+        future = Future()
+        self._queue.put((features, time.perf_counter(), future))
+        return future
+
+    # Blocks until the row's batch is scored; returns (probability, model_version)
+    def score(self, features, timeout=None):
+        return self.submit(features).result(timeout)
+
+    def _run(self):
+        buf = np.empty((self.max_rows, N_FEATURES), dtype=np.float64)
+        while True:
+            first = self._queue.get()
+            batch = [first]
+            deadline = first[1] + self.max_wait
+            while len(batch) < self.max_rows:
+                remaining = deadline - time.perf_counter()
+                try:
+                    if remaining > 0:
+                        batch.append(self._queue.get(timeout=remaining))
+                    else:
+                        # Past the deadline: still take rows that are already waiting
+                        batch.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            self._flush(batch, buf)
+
+    def _flush(self, batch, buf):
+        n = len(batch)
+        started = time.perf_counter()
+        depth = self._queue.qsize()
+        with self._lock:
+            self.batches += 1
+            self.rows += n
+            self.max_queue_depth = max(self.max_queue_depth, depth + n)
+            bucket = next(b for b in self.batch_size_histogram if n <= b)
+            self.batch_size_histogram[bucket] += 1
+        for _, queued_at, _ in batch:
+            self.added_latency.record((started - queued_at) * 1000)
+
+        try:
+            X = buf[:n]
+            for i, (features, _, _) in enumerate(batch):
+                X[i, :] = features
+            bundle = self.registry.active()
+            proba = bundle.predict_proba(X)
+            fraud_col = list(bundle.classes_).index(1)
+        except Exception as e:
+            with self._lock:
+                self.failed_batches += 1
+            for _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        for i, (_, _, future) in enumerate(batch):
+            future.set_result((float(proba[i, fraud_col]), bundle.version))
+
+    def stats(self):
+        with self._lock:
+            return {
+                'max_rows': self.max_rows,
+                'max_wait_ms': self.max_wait * 1000,
+                'queue_depth': self._queue.qsize(),
+                'max_queue_depth': self.max_queue_depth,
+                'batches': self.batches,
+                'rows': self.rows,
+                'avg_batch_size': round(self.rows / self.batches, 2) if self.batches else 0.0,
+                'failed_batches': self.failed_batches,
+                'batch_size_histogram': {f'<={b}': count for b, count in self.batch_size_histogram.items()},
+                'added_latency': self.added_latency.summary(),
+            }
+
+
+# Single-transaction scoring for inline callers (payment gateway).
+# Each thread reuses a preallocated 1 x n_features buffer, and one
+# predict_proba pass gives both the probability and the decision.
+# With a MicroBatcher, concurrent requests share one predict_proba call instead.
+class OnlineScorer:
+    def __init__(self, registry, batcher=None):
+        self.registry = registry
+        self.batcher = batcher
+        self._local = threading.local()
+        self.latency = LatencyTracker()
+
+    def _buffer(self):
+        buf = getattr(self._local, 'buffer', None)
+        if buf is None:
+            buf = self._local.buffer = np.empty((1, N_FEATURES), dtype=np.float64)
+        return buf
+
+    def score_vector(self, features):
+        start = time.perf_counter()
+        if len(features) != N_FEATURES:
+            raise ValueError(f"Expected {N_FEATURES} features ({', '.join(FEATURE_COLUMNS)}), got {len(features)}")
+        if self.batcher is not None:
+            probability, version = self.batcher.score(features)
+        else:
+            buf = self._buffer()
+            buf[0, :] = features
+            bundle = self.registry.active()
+            proba = bundle.predict_proba(buf)[0]
+            probability = float(proba[list(bundle.classes_).index(1)])
+            version = bundle.version
+        latency_ms = (time.perf_counter() - start) * 1000
+        self.latency.record(latency_ms)
+        METRICS.observe('score_request_seconds', latency_ms / 1000)
+        return {
+            'probability': probability,
+            'decision': 'fraud' if probability > DECISION_THRESHOLD else 'legit',
+            'model_version': version,
+            'latency_ms': round(latency_ms, 3),
+        }
+
+    def stats(self):
+        return {
+            'latency': self.latency.summary(),
+            'batching': self.batcher.stats() if self.batcher is not None else None,
+        }
+
+    def fetch_features(self, cursor, transaction_id):
+        with METRICS.query('score.fetch_features'):
+            cursor.execute(f"""
+                SELECT {', '.join(FEATURE_COLUMNS)}
+                FROM Transactions
+                WHERE transaction_id = %s
+            """, (transaction_id,))
+            return cursor.fetchone()
@@ -0,0 +1,92 @@
+import base64
+import binascii
+from datetime import datetime
+
+
+# Opaque cursor for keyset (seek) pagination: the (sort value, id) of a boundary
+# row; a NULL sort value is encoded as an empty string
+def encode_cursor(sort_value, row_id):
+    token = f"{'' if sort_value is None else sort_value.isoformat()}|{row_id}"
+    return base64.urlsafe_b64encode(token.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    if not token:
+        return None
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        sort_value, row_id = base64.urlsafe_b64decode(padded).decode().split('|')
+        return (datetime.fromisoformat(sort_value) if sort_value else None), int(row_id)
+    except (ValueError, binascii.Error, UnicodeDecodeError):
+        return None
+
+
+# Fetch one page ordered by (sort_col DESC, id_col DESC).
+# 'after' moves to older rows, 'before' back to newer ones; both seek directly
+# on the index, so any page costs the same as the first one. Rows with a NULL
+# sort value come after all others (MySQL sorts NULL lowest), by id.
+# Each of several (condition, params) branches gets its own ordered, limited
+# read and the pages are merged, so an equality on the leading index column
+# stays an index-ordered seek where an IN list would filesort every match.
+def fetch_keyset_page(cursor, select_sql, where, params, sort_col, id_col,
+                      sort_key, id_key, per_page, after=None, before=None,
+                      branches=None):
+    where = list(where)
+    params = list(params)
+
+    boundary = decode_cursor(before) or decode_cursor(after)
+    backwards = decode_cursor(before) is not None
+    if boundary:
+        op = '>' if backwards else '<'
+        value, row_id = boundary
+        if value is None:
+            # Within the NULL tail; going back, every non-NULL row is newer
+            where.append(f"{sort_col} IS NULL AND {id_col} {op} %s" if not backwards else
+                         f"{sort_col} IS NOT NULL OR {id_col} {op} %s")
+            params += [row_id]
+        else:
+            # Leading single-column range lets MySQL seek on the index; going
+            # forward, the NULL tail (the lowest index entries) follows
+            seek = f"{sort_col} {op}= %s AND ({sort_col} {op} %s OR {id_col} {op} %s)"
+            where.append(seek if backwards else f"{sort_col} IS NULL OR ({seek})")
+            params += [value, value, row_id]
+
+    order = 'ASC' if backwards else 'DESC'
+    limit = int(per_page) + 1
+
+    def page_sql(clauses):
+        sql = select_sql
+        if clauses:
+            sql += " WHERE " + " AND ".join(f"({w})" for w in clauses)
+        return sql + f" ORDER BY {sort_col} {order}, {id_col} {order} LIMIT {limit}"
+
+    if branches and len(branches) > 1:
+        sql = " UNION ALL ".join(f"SELECT * FROM ({page_sql([cond] + where)}) AS b{i}"
+                                 for i, (cond, _) in enumerate(branches))
+        sql += f" ORDER BY {sort_key} {order}, {id_key} {order} LIMIT {limit}"
+        params = [p for _, branch_params in branches for p in list(branch_params) + params]
+    else:
+        if branches:
+            where.insert(0, branches[0][0])
+            params = list(branches[0][1]) + params
+        sql = page_sql(where)
+
+    cursor.execute(sql, tuple(params))
+    rows = cursor.fetchall()
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    if backwards:
+        has_newer, has_older = has_more, True
+    else:
+        has_newer, has_older = boundary is not None, has_more
+
+    next_cursor = prev_cursor = None
+    if rows and has_older:
+        next_cursor = encode_cursor(rows[-1][sort_key], rows[-1][id_key])
+    if rows and has_newer:
+        prev_cursor = encode_cursor(rows[0][sort_key], rows[0][id_key])
+
+    return rows, next_cursor, prev_cursor
@@ -0,0 +1,84 @@
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from model_registry import load_bundle
+
+# Per-process model bundle, loaded once by the pool initializer
+_bundle = None
+
+
+def _init_worker(version):
+    global _bundle
+    _bundle = load_bundle(version)
+    # Parallelism comes from the process pool; avoid nested threads inside each
+    # worker. A compiled forest keeps the pickled model unloaded until needed.
+    _bundle.set_n_jobs(1)
+
+
+def _score_chunk(X):
+    start = time.perf_counter()
+    preds, probs = _bundle.score(X)
+    return os.getpid(), preds, probs, time.perf_counter() - start
+
+
+# Fans chunks of feature rows out to a process pool and yields results in
+# submission order. Every worker loads the same model version as the caller.
+# At most max_in_flight chunks are queued, so memory stays bounded even when
+# the producer is much faster than the workers.
+# mp_context selects the start method (e.g. 'spawn' inside a threaded server).
+class ParallelScorer:
+    def __init__(self, version, workers=None, max_in_flight=None, mp_context=None):
+        self.version = version
+        self.workers = workers or os.cpu_count() or 1
+        self.max_in_flight = max_in_flight or self.workers * 2
+        context = multiprocessing.get_context(mp_context) if mp_context else None
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                             initargs=(version,), mp_context=context)
+        self._started = None
+        self.rows = 0
+        # pid -> [rows, busy seconds]
+        self.worker_stats = {}
+
+    def score_ordered(self, chunks):
+        if self._started is None:
+            self._started = time.perf_counter()
+        pending = deque()
+        for ids, X in chunks:
+            pending.append((ids, X, self._executor.submit(_score_chunk, X)))
+            if len(pending) >= self.max_in_flight:
+                yield self._collect(*pending.popleft())
+        while pending:
+            yield self._collect(*pending.popleft())
+
+    def _collect(self, ids, X, future):
+        pid, preds, probs, seconds = future.result()
+        stats = self.worker_stats.setdefault(pid, [0, 0.0])
+        stats[0] += len(ids)
+        stats[1] += seconds
+        self.rows += len(ids)
+        return ids, X, preds, probs
+
+    def throughput(self):
+        elapsed = time.perf_counter() - self._started if self._started else 0.0
+        return {
+            'workers': self.workers,
+            'rows': self.rows,
+            'rows_per_sec': round(self.rows / elapsed, 1) if elapsed else 0.0,
+            'per_worker_rows_per_sec': {
+                pid: round(rows / seconds, 1) if seconds else 0.0
+                for pid, (rows, seconds) in self.worker_stats.items()
+            },
+        }
+
+    # wait=False returns at once; the workers exit after the chunks already submitted
+    def close(self, wait=True):
+        self._executor.shutdown(wait=wait)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -1,70 +1,215 @@
-import pandas as pd
+import argparse
+import json
+import time
+from contextlib import contextmanager
+
 import numpy as np
-import joblib
 import mysql.connector
 from sklearn.ensemble import RandomForestClassifier
 from sklearn.model_selection import train_test_split
 from sklearn.preprocessing import StandardScaler
 from sklearn.metrics import classification_report
 from imblearn.over_sampling import SMOTE
+from config import DB_CONFIG, TRAIN_N_JOBS, TRAIN_TREES
+from detection import StageTimer
+from feature_store import FeatureStore
+from model_registry import FEATURE_COLUMNS, publish_bundle
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+# Rows fetched per round trip while streaming the training set
+TRAIN_CHUNK_ROWS = 100000
+
+# The original training sample: the latest 1000 labeled high-amount transactions
+SAMPLE_WHERE = "amount > 800 AND is_fraud IS NOT NULL"
+SAMPLE_ORDER = "transaction_time DESC"
+SAMPLE_ROWS = 1000
+
+# --full: every labeled transaction, read in primary key order
+FULL_WHERE = "is_fraud IS NOT NULL"
+FULL_ORDER = "transaction_id DESC"
+
+
+# Peak resident memory of this process so far (None where getrusage is unavailable)
+def peak_rss_mb():
+    if resource is None:
+        return None
+    # ru_maxrss is in kilobytes on Linux
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+@contextmanager
+def logged_stage(timer, name):
+    with timer.stage(name):
+        yield
+    peak = peak_rss_mb()
+    print(f"⏱️ {name}: {timer.stages[name]:.2f}s" + (f", peak RSS {peak:.0f} MB" if peak is not None else ""))
+
+
+# Stream labeled rows into preallocated float32 / int8 arrays. The cursor is
+# unbuffered, so only one chunk of Python rows exists at a time and memory is
+# ~ rows x (features + 1) x 4 bytes however large the table is.
+def load_training_data(conn, features=FEATURE_COLUMNS, where=FULL_WHERE, order=FULL_ORDER, limit=None,
+                       chunk_rows=TRAIN_CHUNK_ROWS):
+    cursor = conn.cursor()
+    cursor.execute(f"SELECT COUNT(*) FROM Transactions WHERE {where}")
+    n = cursor.fetchone()[0]
+    cursor.close()
+    if limit is not None:
+        n = min(n, limit)
+
+    X = np.empty((n, len(features)), dtype=np.float32)
+    y = np.empty(n, dtype=np.int8)
+    filled = 0
+    cursor = conn.cursor(buffered=False)
+    # "+ 0E0" has the server send DOUBLEs, which are far cheaper to convert than DECIMAL
+    cursor.execute(f"""
+        SELECT {', '.join(f'{col} + 0E0' for col in features)}, is_fraud
+        FROM Transactions
+        WHERE {where}
+        ORDER BY {order}
+        LIMIT %s
+    """, (n,))
+    while True:
+        rows = cursor.fetchmany(chunk_rows)
+        if not rows:
+            break
+        chunk = np.asarray(rows, dtype=np.float32)
+        X[filled:filled + len(chunk)] = chunk[:, :-1]
+        y[filled:filled + len(chunk)] = chunk[:, -1]
+        filled += len(chunk)
+    cursor.close()
+    # Rows deleted between the COUNT and the SELECT leave the tail unused
+    return X[:filled], y[:filled]
+
+
+# balance: 'smote' oversamples the fraud class (the original behaviour),
+# 'class_weight' reweights it inside every tree instead, which needs no extra
+# memory on the full table, and 'none' trains on the data as it is
+def train_model(X, y, timer, trees=TRAIN_TREES, n_jobs=TRAIN_N_JOBS, balance='smote', max_samples=None,
+                max_depth=None, max_features='sqrt', smote_ratio='auto', test_size=0.2, seed=42):
+    with logged_stage(timer, 'split'):
+        train_idx, test_idx = train_test_split(np.arange(len(y)), stratify=y, test_size=test_size,
+                                               random_state=seed)
+        X_train, y_train = X[train_idx], y[train_idx]
+        X_test, y_test = X[test_idx], y[test_idx]
+        del train_idx, test_idx
+
+    if balance == 'smote':
+        with logged_stage(timer, 'smote'):
+            X_train, y_train = SMOTE(sampling_strategy=smote_ratio, random_state=seed).fit_resample(X_train, y_train)
+            X_train = X_train.astype(np.float32, copy=False)
+
+    # Scaled in place: no second copy of the training matrix
+    with logged_stage(timer, 'scale'):
+        scaler = StandardScaler(copy=False)
+        X_train = scaler.fit_transform(X_train)
+        X_test = scaler.transform(X_test)
+
+    with logged_stage(timer, 'fit'):
+        clf = RandomForestClassifier(n_estimators=trees, n_jobs=n_jobs, random_state=seed, max_samples=max_samples,
+                                     max_depth=max_depth, max_features=max_features,
+                                     class_weight='balanced_subsample' if balance == 'class_weight' else None)
+        clf.fit(X_train, y_train)
+        del X_train, y_train
+
+    with logged_stage(timer, 'evaluate'):
+        y_pred = clf.predict(X_test)
+        report = classification_report(y_test, y_pred, output_dict=True)
+        print("✅ Model Evaluation:\n")
+        print(classification_report(y_test, y_pred))
+
+    # Scoring decides its own parallelism (MicroBatcher, ParallelScorer); the
+    # published model predicts single-threaded as before
+    clf.n_jobs = None
+    return clf, scaler, report
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Train the fraud model and publish it as a new version")
+    parser.add_argument('--full', action='store_true',
+                        help=f"train on all labeled transactions (default: the latest {SAMPLE_ROWS} with amount > 800)")
+    parser.add_argument('--from-store', action='store_true',
+                        help="like --full, but refresh the local feature store and read it instead of MySQL")
+    parser.add_argument('--rows', type=int, help="cap on training rows (the most recent ones)")
+    parser.add_argument('--features', default=','.join(FEATURE_COLUMNS),
+                        help="comma-separated Transactions columns; the web app scores with the default set")
+    parser.add_argument('--trees', type=int, default=TRAIN_TREES)
+    parser.add_argument('--n-jobs', type=int, default=TRAIN_N_JOBS, help="cores used to fit (-1 = all)")
+    parser.add_argument('--balance', choices=['smote', 'class_weight', 'none'],
+                        help="default: smote for the sample, class_weight with --full")
+    parser.add_argument('--max-samples', type=float, help="fraction of rows bootstrapped per tree")
+    parser.add_argument('--max-depth', type=int)
+    parser.add_argument('--max-features', default='sqrt', help="'sqrt', 'log2' or a fraction of the features")
+    parser.add_argument('--smote-ratio', type=float, help="fraud/legit ratio after SMOTE (default: 1.0)")
+    parser.add_argument('--params', help="tuning report (tuning.py) whose best config to train")
+    parser.add_argument('--chunk-rows', type=int, default=TRAIN_CHUNK_ROWS)
+    parser.add_argument('--no-publish', action='store_true', help="train and evaluate only")
+    args = parser.parse_args()
+
+    features = [col.strip().lower() for col in args.features.split(',') if col.strip()]
+    if features != FEATURE_COLUMNS and not args.no_publish:
+        parser.error("custom --features cannot be published (scoring uses FEATURE_COLUMNS); add --no-publish")
+    if features != FEATURE_COLUMNS and args.from_store:
+        parser.error("the feature store holds FEATURE_COLUMNS only; drop --features or --from-store")
+    args.full = args.full or args.from_store
+    if args.params:
+        with open(args.params) as f:
+            best = json.load(f)['best']
+        args.trees, args.max_depth, args.max_features = best['n_estimators'], best['max_depth'], best['max_features']
+        args.smote_ratio = best['smote_ratio']
+        args.balance = args.balance or ('none' if best['smote_ratio'] is None else 'smote')
+    max_features = args.max_features if args.max_features in ('sqrt', 'log2') else float(args.max_features)
+    balance = args.balance or ('class_weight' if args.full else 'smote')
+    timer = StageTimer()
+    start = time.perf_counter()
+
+    # Step 1: Stream the labeled history from the DB (or append only the new rows to the
+    # feature store and read it memory-mapped)
+    with logged_stage(timer, 'load'):
+        conn = mysql.connector.connect(**DB_CONFIG)
+        if args.from_store:
+            store = FeatureStore()
+            store.refresh(conn, chunk_rows=args.chunk_rows)
+            X, y = store.training_arrays(args.rows)
+        elif args.full:
+            X, y = load_training_data(conn, features, FULL_WHERE, FULL_ORDER, args.rows, args.chunk_rows)
+        else:
+            X, y = load_training_data(conn, features, SAMPLE_WHERE, SAMPLE_ORDER, args.rows or SAMPLE_ROWS,
+                                      args.chunk_rows)
+        conn.close()
 
-# Database config
-DB_CONFIG = {
-    'host': 'localhost',
-    'user': 'fraud_account',
-    'password': 'secure_password125',
-    'database': 'BankFraudDetection'
-}
-
-# Step 1: Connect to DB and fetch data
-conn = mysql.connector.connect(**DB_CONFIG)
-query = """
-    SELECT 
-        v1, v2, v3, v4, v5, v6, v7, v8, v9, v10,
-        v11, v12, v13, v14, v15, v16, v17, v18, v19, v20,
-        v21, v22, v23, v24, v25, v26, v27, v28,
-        amount, is_fraud
-    FROM Transactions
-    WHERE amount > 800 AND is_fraud IS NOT NULL
-    ORDER BY transaction_time DESC
-    LIMIT 1000
-"""
-df = pd.read_sql(query, conn)
-conn.close()
-
-# Step 2: Check if enough fraud cases exist
-if df['is_fraud'].sum() < 10:
-    print("⚠️ WARNING: Not enough fraud samples for training. Model may underperform.")
-else:
-    print("✅ Loaded data. Fraud samples:", df['is_fraud'].sum())
-
-# Step 3: Separate features and labels
-X = df.drop(columns=['is_fraud'])
-y = df['is_fraud']
-
-# Step 4: Train/test split and SMOTE
-X_train, X_test, y_train, y_test = train_test_split(X, y, stratify=y, test_size=0.2, random_state=42)
-
-# Step 5: Balance classes with SMOTE
-X_train_bal, y_train_bal = SMOTE(random_state=42).fit_resample(X_train, y_train)
-
-# Step 6: Scale the features
-scaler = StandardScaler()
-X_train_scaled = scaler.fit_transform(X_train_bal)
-X_test_scaled = scaler.transform(X_test)
-
-# Step 7: Train the classifier
-clf = RandomForestClassifier(n_estimators=100, random_state=42)
-clf.fit(X_train_scaled, y_train_bal)
-
-# Step 8: Evaluate
-y_pred = clf.predict(X_test_scaled)
-print("✅ Model Evaluation:\n")
-print(classification_report(y_test, y_pred))
-
-# Step 9: Save the model and scaler
-joblib.dump(clf, "fraud_model.pkl")
-joblib.dump(scaler, "scaler.pkl")
-print("✅ Model and scaler saved as 'fraud_model.pkl' and 'scaler.pkl'")
+    # Step 2: Check if enough fraud cases exist
+    fraud_samples = int(y.sum())
+    if fraud_samples < 10:
+        print("⚠️ WARNING: Not enough fraud samples for training. Model may underperform.")
+    else:
+        print(f"✅ Loaded {len(y)} rows x {len(features)} features ({X.nbytes / 2 ** 20:.0f} MB). "
+              f"Fraud samples: {fraud_samples}")
 
+    # Steps 3-5: Split, balance, scale, fit and evaluate
+    clf, scaler, report = train_model(X, y, timer, trees=args.trees, n_jobs=args.n_jobs, balance=balance,
+                                      max_samples=args.max_samples, max_depth=args.max_depth,
+                                      max_features=max_features, smote_ratio=args.smote_ratio or 'auto')
+    wall = time.perf_counter() - start
+    peak = peak_rss_mb()
+    print(f"✅ Trained in {wall:.2f}s ({timer.summary()})" + (f", peak RSS {peak:.0f} MB" if peak is not None else ""))
 
+    # Step 6: Publish the model and scaler as a new version; the web app hot-swaps to it
+    if not args.no_publish:
+        version = publish_bundle(clf, scaler, {
+            'training_rows': int(len(y)),
+            'fraud_samples': fraud_samples,
+            'trees': args.trees,
+            'max_depth': args.max_depth,
+            'max_features': max_features,
+            'balance': balance,
+            'wall_seconds': round(wall, 3),
+            'timings': {name: round(seconds, 3) for name, seconds in timer.stages.items()},
+            'peak_rss_mb': None if peak is None else round(peak, 1),
+            'report': report,
+        })
+        print(f"✅ Model and scaler published as version {version}")
@@ -120,7 +120,9 @@ CREATE TABLE FraudAlerts (
     FOREIGN KEY (transaction_id) REFERENCES Transactions(transaction_id),
     FOREIGN KEY (rule_id) REFERENCES FraudRules(rule_id),
     INDEX idx_alert_status (status),
-    INDEX idx_alert_date (alert_date)
+    INDEX idx_alert_date (alert_date),
+    -- One alert per (transaction, rule); alert writers upsert against it
+    UNIQUE KEY uq_alert_transaction_rule (transaction_id, rule_id)
 ) ENGINE=InnoDB;
 
 -- 4. OPTIMIZED DATA GENERATION PROCEDURES
@@ -730,56 +732,68 @@ ON DUPLICATE KEY UPDATE
     severity = VALUES(severity),
     is_active = VALUES(is_active);
 
--- 2. Confirmed Alerts (is_fraud = 1)
-INSERT INTO FraudAlerts (transaction_id, rule_id, status)
-SELECT t.transaction_id, 1, 'confirmed'
-FROM Transactions t
-WHERE t.is_fraud = 1
-  AND NOT EXISTS (
-    SELECT 1 FROM FraudAlerts fa 
-    WHERE fa.transaction_id = t.transaction_id AND fa.rule_id = 1
-);
+-- Idempotent alerts: one alert per (transaction, rule), enforced by
+-- uq_alert_transaction_rule, which every alert writer upserts against.
+-- New databases get the key from CREATE TABLE FraudAlerts; an older one gets it
+-- here, before the first upsert: duplicates collapse onto the oldest alert,
+-- which keeps the furthest review status of the group
+-- (ENUM order: new < investigating < confirmed < false_positive).
+DROP PROCEDURE IF EXISTS AddAlertUniqueKey;
 
--- 3. Investigating Alerts (each rule)
-INSERT INTO FraudAlerts (transaction_id, rule_id, status)
-SELECT t.transaction_id, 2, 'investigating'
-FROM Transactions t
-WHERE t.is_fraud = 0 AND t.v14 < -3.5
-  AND NOT EXISTS (
-    SELECT 1 FROM FraudAlerts fa WHERE fa.transaction_id = t.transaction_id AND fa.rule_id = 2
-);
+DELIMITER //
 
-INSERT INTO FraudAlerts (transaction_id, rule_id, status)
-SELECT t.transaction_id, 3, 'investigating'
-FROM Transactions t
-WHERE t.is_fraud = 0 AND t.v17 < -2.5
-  AND NOT EXISTS (
-    SELECT 1 FROM FraudAlerts fa WHERE fa.transaction_id = t.transaction_id AND fa.rule_id = 3
-);
+CREATE PROCEDURE AddAlertUniqueKey()
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema = DATABASE() AND table_name = 'FraudAlerts'
+          AND index_name = 'uq_alert_transaction_rule'
+    ) THEN
+        UPDATE FraudAlerts fa
+        JOIN (
+            SELECT transaction_id, rule_id, MIN(alert_id) AS keep_id, MAX(status + 0) AS status_no
+            FROM FraudAlerts
+            GROUP BY transaction_id, rule_id
+            HAVING COUNT(*) > 1
+        ) d ON fa.alert_id = d.keep_id
+        SET fa.status = d.status_no;
+
+        DELETE fa
+        FROM FraudAlerts fa
+        JOIN (
+            SELECT transaction_id, rule_id, MIN(alert_id) AS keep_id
+            FROM FraudAlerts
+            GROUP BY transaction_id, rule_id
+            HAVING COUNT(*) > 1
+        ) d ON fa.transaction_id = d.transaction_id AND fa.rule_id = d.rule_id AND fa.alert_id > d.keep_id;
 
-INSERT INTO FraudAlerts (transaction_id, rule_id, status)
-SELECT t.transaction_id, 4, 'investigating'
-FROM Transactions t
-WHERE t.is_fraud = 0 AND t.v12 < -2.0
-  AND NOT EXISTS (
-    SELECT 1 FROM FraudAlerts fa WHERE fa.transaction_id = t.transaction_id AND fa.rule_id = 4
-);
+        ALTER TABLE FraudAlerts ADD UNIQUE KEY uq_alert_transaction_rule (transaction_id, rule_id);
+    END IF;
+END //
 
-INSERT INTO FraudAlerts (transaction_id, rule_id, status)
-SELECT t.transaction_id, 5, 'investigating'
-FROM Transactions t
-WHERE t.is_fraud = 0 AND t.v10 < -2.0
-  AND NOT EXISTS (
-    SELECT 1 FROM FraudAlerts fa WHERE fa.transaction_id = t.transaction_id AND fa.rule_id = 5
-);
+DELIMITER ;
+
+CALL AddAlertUniqueKey();
+DROP PROCEDURE AddAlertUniqueKey;
 
+-- 2./3. Confirmed (is_fraud = 1) and investigating alerts for rules 1-6 in one pass.
+-- STRAIGHT_JOIN keeps Transactions as the outer table, so it is scanned once and
+-- each row is checked against the handful of rules instead of one scan per rule.
+-- rule_engine.py applies the same conditions from FraudRules.condition_sql.
 INSERT INTO FraudAlerts (transaction_id, rule_id, status)
-SELECT t.transaction_id, 6, 'investigating'
+SELECT t.transaction_id, r.rule_id, IF(r.rule_id = 1, 'confirmed', 'investigating')
 FROM Transactions t
-WHERE t.amount > 800
-  AND NOT EXISTS (
-    SELECT 1 FROM FraudAlerts fa WHERE fa.transaction_id = t.transaction_id AND fa.rule_id = 6
-);
+STRAIGHT_JOIN FraudRules r ON r.rule_id BETWEEN 1 AND 6 AND r.is_active = TRUE
+WHERE CASE r.rule_id
+        WHEN 1 THEN t.is_fraud = 1
+        WHEN 2 THEN t.is_fraud = 0 AND t.v14 < -3.5
+        WHEN 3 THEN t.is_fraud = 0 AND t.v17 < -2.5
+        WHEN 4 THEN t.is_fraud = 0 AND t.v12 < -2.0
+        WHEN 5 THEN t.is_fraud = 0 AND t.v10 < -2.0
+        WHEN 6 THEN t.amount > 800
+      END
+-- Existing (transaction, rule) alerts are left as they are (unique key uq_alert_transaction_rule)
+ON DUPLICATE KEY UPDATE alert_id = alert_id;
 
 -- 4. View Alerts by Severity
 SELECT 
@@ -851,3 +865,131 @@ ALTER TABLE Transactions ADD INDEX idx_v14 (v14);
 ALTER TABLE Transactions ADD COLUMN ml_prediction TINYINT DEFAULT NULL;
 ALTER TABLE Transactions ADD COLUMN ml_confidence FLOAT DEFAULT NULL;
 
+
+-- Keyset pagination support for /fraud-alerts: seek on (status, alert_date, alert_id).
+-- /transactions already seeks on idx_transaction_date, which InnoDB extends with the primary key.
+ALTER TABLE FraudAlerts ADD INDEX idx_alert_status_date (status, alert_date);
+
+-- Backlog detection: checkpoint table so an interrupted run resumes from its last committed chunk
+CREATE TABLE IF NOT EXISTS DetectionRuns (
+    run_id INT AUTO_INCREMENT PRIMARY KEY,
+    started_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    status ENUM('running', 'completed', 'failed') DEFAULT 'running',
+    last_transaction_id INT NOT NULL DEFAULT 0,
+    rows_scored INT NOT NULL DEFAULT 0,
+    alerts_created INT NOT NULL DEFAULT 0,
+    error TEXT,
+    INDEX idx_detection_status (status)
+) ENGINE=InnoDB;
+
+-- Lets the backlog scan seek straight to unscored rows (ml_prediction IS NULL) in transaction_id order
+ALTER TABLE Transactions ADD INDEX idx_ml_pending (ml_prediction, transaction_id);
+
+-- Background CSV ingestion jobs; counters are checkpointed with every committed chunk
+CREATE TABLE IF NOT EXISTS IngestJobs (
+    job_id INT AUTO_INCREMENT PRIMARY KEY,
+    filename VARCHAR(255) NOT NULL,
+    file_path VARCHAR(500) NOT NULL,
+    status ENUM('queued', 'running', 'completed', 'failed', 'cancelled') DEFAULT 'queued',
+    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    bytes_total BIGINT NOT NULL DEFAULT 0,
+    rows_parsed BIGINT NOT NULL DEFAULT 0,
+    rows_inserted BIGINT NOT NULL DEFAULT 0,
+    rows_rejected BIGINT NOT NULL DEFAULT 0,
+    chunks INT NOT NULL DEFAULT 0,
+    error TEXT,
+    -- host:pid:token of the process running the job, and its last sign of life
+    owner VARCHAR(100) DEFAULT NULL,
+    heartbeat_at DATETIME DEFAULT NULL,
+    INDEX idx_ingest_status (status)
+) ENGINE=InnoDB;
+
+-- Rule engine (rule_engine.py): condition_sql is the whole condition, and each rule
+-- carries the status its alerts are created with
+ALTER TABLE FraudRules
+    ADD COLUMN alert_status ENUM('new', 'investigating', 'confirmed') NOT NULL DEFAULT 'investigating';
+
+INSERT INTO FraudRules (rule_id, rule_name, description, condition_sql, severity, is_active, alert_status)
+VALUES
+    (1, 'Confirmed is_fraud', 'Transaction labeled fraud by system (is_fraud = 1)', 't.is_fraud = 1', 5, TRUE, 'confirmed'),
+    (2, 'V14 Rule', 'V14 < -3.5', 't.is_fraud = 0 AND t.v14 < -3.5', 4, TRUE, 'investigating'),
+    (3, 'V17 Rule', 'V17 < -2.5', 't.is_fraud = 0 AND t.v17 < -2.5', 3, TRUE, 'investigating'),
+    (4, 'V12 Rule', 'V12 < -2.0', 't.is_fraud = 0 AND t.v12 < -2.0', 2, TRUE, 'investigating'),
+    (5, 'V10 Rule', 'V10 < -2.0', 't.is_fraud = 0 AND t.v10 < -2.0', 1, TRUE, 'investigating'),
+    (6, 'High Amount Rule', 'Transaction amount exceeds $800', 't.amount > 800', 6, TRUE, 'investigating'),
+    -- Alerts for this rule come from the model in detection.py, not from condition_sql
+    (99, 'ML Model', 'Random forest predicts fraud with confidence >= 0.8', 'ML fraud_probability >= 0.8', 5, TRUE, 'new')
+ON DUPLICATE KEY UPDATE
+    rule_name = VALUES(rule_name),
+    description = VALUES(description),
+    condition_sql = VALUES(condition_sql),
+    severity = VALUES(severity),
+    is_active = VALUES(is_active),
+    alert_status = VALUES(alert_status);
+
+-- Velocity rules (velocity.py): sliding windows per account / card on transaction_time,
+-- evaluated in memory instead of the correlated subqueries RunFraudDetection() used
+INSERT INTO FraudRules (rule_id, rule_name, description, condition_sql, severity, is_active, alert_status)
+VALUES
+    (7, 'Account Velocity', '3 or more other transactions on the account within 60 seconds',
+     'VELOCITY account_id WITHIN 60 COUNT >= 3', 4, TRUE, 'investigating'),
+    (8, 'Card V14 Swing', 'Another transaction on the card within 360 seconds with |V14 difference| > 5',
+     'VELOCITY card_id WITHIN 360 DELTA v14 > 5', 4, TRUE, 'investigating')
+ON DUPLICATE KEY UPDATE
+    rule_name = VALUES(rule_name),
+    description = VALUES(description),
+    condition_sql = VALUES(condition_sql),
+    severity = VALUES(severity),
+    is_active = VALUES(is_active),
+    alert_status = VALUES(alert_status);
+
+DROP PROCEDURE IF EXISTS RunFraudDetection;
+
+DELIMITER //
+
+CREATE PROCEDURE RunFraudDetection()
+BEGIN
+    -- Clear previous temporary alerts
+    DELETE FROM FraudAlerts WHERE status = 'temporary';
+
+    -- Amount rule only; the velocity rules run in velocity.py
+    INSERT INTO FraudAlerts (transaction_id, rule_id, status)
+    SELECT t.transaction_id, r.rule_id, 'temporary'
+    FROM Transactions t
+    JOIN FraudRules r ON r.is_active = TRUE AND r.rule_id = 1
+    WHERE t.amount > 500
+    ON DUPLICATE KEY UPDATE alert_id = alert_id;
+
+    -- Update status of new alerts
+    UPDATE FraudAlerts SET status = 'new' WHERE status = 'temporary';
+
+    SELECT CONCAT(COUNT(*), ' new fraud alerts generated') AS result
+    FROM FraudAlerts
+    WHERE status = 'new';
+END //
+
+DELIMITER ;
+
+-- Several server processes (serve.py): state they must agree on lives here.
+-- Cached data is invalidated by bumping its counter, which every process polls.
+CREATE TABLE IF NOT EXISTS CacheVersions (
+    name VARCHAR(64) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
+) ENGINE=InnoDB;
+
+-- Ingest job control and progress, readable from any process: a cancel request,
+-- and the running session's start, starting percent, percent and throughput
+ALTER TABLE IngestJobs
+    ADD COLUMN cancel_requested TINYINT(1) NOT NULL DEFAULT 0,
+    ADD COLUMN run_started_at DATETIME DEFAULT NULL,
+    ADD COLUMN start_percent FLOAT DEFAULT NULL,
+    ADD COLUMN percent FLOAT DEFAULT NULL,
+    ADD COLUMN rows_per_sec FLOAT DEFAULT NULL;
+
+-- Streaming intake (stream_intake.py) tags each batch's rows with a random token
+-- and reads their ids back: concurrent multi-row inserts do not get consecutive
+-- auto-increment ids under innodb_autoinc_lock_mode = 2 (the MySQL 8 default)
+ALTER TABLE Transactions ADD COLUMN intake_batch BIGINT DEFAULT NULL;
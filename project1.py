@@ -1,26 +1,39 @@
-import pandas as pd
-import matplotlib.pyplot as plt
-import seaborn as sns
-import mysql.connector
-from sqlalchemy import create_engine
-from flask import Flask, render_template, request, redirect, url_for, session, flash
+from flask import Flask, Response, g, render_template, request, redirect, url_for, flash, jsonify
+from werkzeug.utils import secure_filename
 from flask_login import LoginManager, UserMixin, login_user, login_required, logout_user, current_user
 import os
-from io import BytesIO
-import base64
-import joblib
-model = joblib.load('fraud_model.pkl')  # Load once
+import hmac
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from functools import wraps
+from config import (DB_CONFIG, DB_POOL_SIZE, DB_POOL_TIMEOUT, DB_POOL_HEALTH_CHECK_SECONDS, DB_READ_POOL_SIZE,
+                    DETECTION_DEBUG, DETECTION_WORKERS, SCORING_API_KEY, SCORING_BATCH_MAX_ROWS,
+                    SCORING_BATCH_MAX_WAIT_MS, INGEST_WORKERS, INGEST_BULK_LOAD, INFERENCE_WORKERS)
+from db_pool import ConnectionPool
+from dashboard_cache import DashboardAggregates, TTLCache
+from corr_stats import CorrelationAccumulator
+from chart_data import chart_documents
+from pagination import fetch_keyset_page
+from jobs import IngestJobManager
+from metrics import METRICS
+from bulk_load import bulk_load
+from detection import StageTimer, run_backlog, run_recent
+from model_registry import ModelRegistry
+from rule_engine import RuleEngine
+from velocity import VelocityEngine
+from online_scoring import MicroBatcher, OnlineScorer
+from parallel_scoring import ParallelScorer
+from stream_intake import StreamIntake
 
 app = Flask(__name__)
 app.secret_key = 'your_secret_key_here'  # Change this for production!
 
-# Database configuration
-DB_CONFIG = {
-    'host': 'localhost',
-    'user': 'fraud_account',
-    'password': 'secure_password125',
-    'database': 'BankFraudDetection'
-}
+# Dashboard caching (seconds)
+DASHBOARD_REFRESH_SECONDS = 300
+CHART_CACHE_TTL = 600
+COUNT_CACHE_TTL = 120
 
 
 # User model for authentication
@@ -33,28 +46,163 @@ class User(UserMixin):
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
-def plot_to_base64(fig):
-    buf = BytesIO()
-    fig.savefig(buf, format="png", bbox_inches="tight")
-    plt.close(fig)
-    return base64.b64encode(buf.getvalue()).decode("utf-8")
 
 @login_manager.user_loader
 def load_user(user_id):
     return User(user_id)
 
 
-# Helper function to create database connection
-def get_db_connection():
-    return mysql.connector.connect(**DB_CONFIG)
+# JSON API access: a logged-in session or the X-API-Key header (for the payment gateway)
+def api_auth_required(view):
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        api_key = request.headers.get('X-API-Key', '')
+        if SCORING_API_KEY and hmac.compare_digest(api_key, SCORING_API_KEY):
+            return view(*args, **kwargs)
+        if current_user.is_authenticated:
+            return view(*args, **kwargs)
+        return jsonify({'error': 'unauthorized'}), 401
+    return wrapped
+
+
+# Shared connection pool used by every route and background job
+db_pool = ConnectionPool(DB_CONFIG, size=DB_POOL_SIZE, timeout=DB_POOL_TIMEOUT,
+                         health_check_interval=DB_POOL_HEALTH_CHECK_SECONDS)
+
+
+# Helper function to borrow a pooled database connection (returned on exit, even on errors)
+def db_connection(autocommit=False):
+    return db_pool.connection(autocommit=autocommit)
+
+
+# Read-only pages borrow from their own pool; autocommit gives every SELECT a
+# fresh snapshot instead of keeping a transaction open on an idle connection
+read_pool = ConnectionPool(DB_CONFIG, size=DB_READ_POOL_SIZE, timeout=DB_POOL_TIMEOUT,
+                           health_check_interval=DB_POOL_HEALTH_CHECK_SECONDS)
+
+
+def read_connection():
+    return read_pool.connection(autocommit=True)
+
+
+# Active model + scaler, loaded once and hot-swapped when prediction.py publishes a new version
+model_registry = ModelRegistry()
+model_registry.active()
+# Concurrent single-row requests are coalesced into one batch (see MicroBatcher)
+score_batcher = (MicroBatcher(model_registry, SCORING_BATCH_MAX_ROWS, SCORING_BATCH_MAX_WAIT_MS)
+                 if SCORING_BATCH_MAX_ROWS > 1 else None)
+online_scorer = OnlineScorer(model_registry, score_batcher)
+
+# Velocity rules keep their sliding windows between detection runs; each run
+# only feeds the transactions committed since the previous one, including rows
+# of overlapping ingest jobs that commit below ids already seen
+velocity_engine = None
+velocity_lock = threading.Lock()
+
+# Running sums behind the V1-V28 correlation heatmap, persisted across restarts
+corr_accumulator = CorrelationAccumulator(path=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'corr_stats.npz'))
+corr_accumulator.load()
+
+# Cached row counts for the paginated pages
+count_cache = TTLCache(ttl=COUNT_CACHE_TTL, max_entries=64)
+
+
+def velocity_alerts(cursor):
+    global velocity_engine
+    with velocity_lock:
+        if velocity_engine is None:
+            engine = VelocityEngine.from_db(cursor)
+            engine.warm_start(cursor)
+            velocity_engine = engine
+        return velocity_engine.catch_up(cursor)
+
+
+def cached_count(cursor, key, sql, params=()):
+    total = count_cache.get(key)
+    if total is None:
+        with METRICS.query(f"count.{key if isinstance(key, str) else key[0]}", sql):
+            cursor.execute(sql, params)
+            total = cursor.fetchone()['total']
+        count_cache.set(key, total)
+    return total
+
+
+# Dashboard aggregates are refreshed in the background; chart JSON is cached per snapshot
+dashboard_aggregates = DashboardAggregates(db_connection, corr_accumulator,
+                                           refresh_interval=DASHBOARD_REFRESH_SECONDS)
+chart_cache = TTLCache(ttl=CHART_CACHE_TTL, max_entries=32)
+
+# Batch scoring for /run-detection runs in executor processes (started on
+# first use, with 'spawn' since the server is threaded) so it does not hold
+# the GIL the request threads need
+inference_scorer = None
+inference_lock = threading.Lock()
+# scorer -> detection runs still using it
+inference_leases = {}
+
+
+# Chart series are only rebuilt when the aggregates change: (body, etag) per chart
+def dashboard_chart_documents():
+    version, data = dashboard_aggregates.snapshot()
+    cache_key = ('chart_documents', version)
+    documents = chart_cache.get(cache_key)
+    if documents is None:
+        with METRICS.timer('chart_data_seconds'):
+            documents = chart_documents(data)
+        chart_cache.set(cache_key, documents)
+    return documents
+
+
+# Worker processes holding the active model version, leased for one detection
+# run. When the version changes a new scorer takes over, and the old one is
+# shut down once the last run using it returns its lease.
+@contextmanager
+def detection_scorer(bundle):
+    global inference_scorer
+    if INFERENCE_WORKERS < 1:
+        yield None
+        return
+    with inference_lock:
+        if inference_scorer is None or inference_scorer.version != bundle.version:
+            previous = inference_scorer
+            inference_scorer = ParallelScorer(bundle.version, INFERENCE_WORKERS, mp_context='spawn')
+            if previous is not None and previous not in inference_leases:
+                previous.close(wait=False)
+        scorer = inference_scorer
+        inference_leases[scorer] = inference_leases.get(scorer, 0) + 1
+    try:
+        yield scorer
+    finally:
+        with inference_lock:
+            inference_leases[scorer] -= 1
+            retired = inference_leases[scorer] == 0 and scorer is not inference_scorer
+            if inference_leases[scorer] == 0:
+                del inference_leases[scorer]
+        if retired:
+            scorer.close(wait=False)
+
+
+def ingest_finished():
+    corr_accumulator.sync()
+    dashboard_aggregates.mark_stale()
+    count_cache.clear()
+
 
+def bulk_ingest(path, **kwargs):
+    stats = bulk_load(DB_CONFIG, path, **kwargs)
+    # Bulk loads skip the per-chunk correlation updates, so rebuild it on the next refresh
+    dashboard_aggregates.mark_stale(reseed=True)
+    return stats
 
-# Helper function to plot to base64 for HTML
-def plot_to_base64(fig):
-    buf = BytesIO()
-    fig.savefig(buf, format='png', bbox_inches='tight')
-    plt.close(fig)
-    return base64.b64encode(buf.getvalue()).decode('utf-8')
+
+# Uploads are ingested in the background; progress is polled from /jobs/<id>
+ingest_jobs = IngestJobManager(db_connection, workers=INGEST_WORKERS,
+                               on_chunk=corr_accumulator.update_frame, on_finish=ingest_finished,
+                               loader=bulk_ingest if INGEST_BULK_LOAD else None)
+
+# Real-time intake: streamed events are scored, rule-checked and alerted as they are inserted
+stream_intake = StreamIntake(db_connection, model_registry, velocity=velocity_alerts,
+                             on_batch=corr_accumulator.update_frame)
 
 
 # Routes
@@ -62,178 +210,111 @@ def plot_to_base64(fig):
 @login_required
 def dashboard():
     try:
-        # Get basic stats
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        dashboard_aggregates.start_background_refresh()
+        data = dashboard_aggregates.get()
 
-        # Total transactions
-        cursor.execute("SELECT COUNT(*) as total FROM Transactions")
-        total_trans = cursor.fetchone()['total']
+        # Charts are drawn in the browser from /api/charts
+        total_trans = data['total_trans']
+        fraud_trans = data['fraud_trans']
+        fraud_percent = (fraud_trans / total_trans) * 100 if total_trans > 0 else 0
 
-        # Fraud transactions
-        cursor.execute("SELECT COUNT(*) as fraud FROM Transactions WHERE is_fraud = 1")
-        fraud_trans = cursor.fetchone()['fraud']
+        return render_template('dashboard.html',
+                               total_trans=total_trans,
+                               fraud_trans=fraud_trans,
+                               fraud_percent=round(fraud_percent, 2),
+                               recent_alerts=data['recent_alerts'],
+                               investigating_alerts=data['investigating_alerts'],
+                               data_age=int(dashboard_aggregates.age() or 0),
+                               refresh_seconds=round(dashboard_aggregates.refresh_seconds or 0, 2)
+                               )
 
-        # Fraud percentage
-        fraud_percent = (fraud_trans / total_trans) * 100 if total_trans > 0 else 0
+    except Exception as e:
+        flash(f"Error loading dashboard: {str(e)}", "danger")
+        return render_template('dashboard.html')
 
-        # Recent fraud alerts
-        cursor.execute("""
-            SELECT t.transaction_id, t.amount, t.transaction_date, 
-                   c.first_name, c.last_name, r.rule_name, fa.status
-            FROM FraudAlerts fa
-            JOIN Transactions t ON fa.transaction_id = t.transaction_id
-            JOIN Accounts a ON t.account_id = a.account_id
-            JOIN Customers c ON a.customer_id = c.customer_id
-            JOIN FraudRules r ON fa.rule_id = r.rule_id
-            WHERE fa.status IN ('confirmed', 'investigating')
-            ORDER BY t.transaction_date DESC
-            LIMIT 5
-        """)
 
-        recent_alerts = cursor.fetchall()
-
-        # Generate fraud vs legit plot
-        cursor.execute("SELECT is_fraud FROM Transactions LIMIT 10000")
-        df = pd.DataFrame(cursor.fetchall())
-        counts = df['is_fraud'].value_counts()
-        fig, ax = plt.subplots()
-        sns.barplot(x=counts.index, y=counts.values, ax=ax)
-        ax.set_xticklabels(['Legit', 'Fraud'])
-        ax.set_title("Fraud vs Legit Transactions")
-        fraud_plot = plot_to_base64(fig)
-
-        # Generate amount distribution plot
-        cursor.execute("SELECT amount, is_fraud FROM Transactions LIMIT 10000")
-        df = pd.DataFrame(cursor.fetchall())
-        fig, ax = plt.subplots(figsize=(10, 5))
-        sns.histplot(df[df['is_fraud'] == 0]['amount'], bins=50, label="Legit",
-                     color='green', log_scale=True, stat='density', ax=ax)
-        sns.histplot(df[df['is_fraud'] == 1]['amount'], bins=50, label="Fraud",
-                     color='red', log_scale=True, stat='density', ax=ax)
-        ax.legend()
-        ax.set_title("Transaction Amount Distribution (Log Scale)")
-        amount_plot = plot_to_base64(fig)
-
-        cursor.execute("SELECT COUNT(*) as investigating FROM FraudAlerts WHERE status = 'investigating'")
-        investigating_alerts = cursor.fetchone()['investigating']
-        # Count fraud alerts by status (for pie chart)
-        cursor.execute("""
-            SELECT status, COUNT(*) as count
-            FROM FraudAlerts
-            GROUP BY status
-        """)
-        status_data = cursor.fetchall()
-        df_status = pd.DataFrame(status_data)
-        fig, ax = plt.subplots()
-        ax.pie(df_status['count'], labels=df_status['status'], autopct='%1.1f%%', startangle=140)
-        ax.set_title("Fraud Alerts by Status")
-        status_pie_plot = plot_to_base64(fig)
-        cursor.execute("""
-            SELECT r.rule_name, COUNT(*) as total_alerts
-            FROM FraudAlerts fa
-            JOIN FraudRules r ON fa.rule_id = r.rule_id
-            GROUP BY fa.rule_id
-        """)
-        df_rules = pd.DataFrame(cursor.fetchall())
+@app.route('/dashboard/refresh')
+@login_required
+def refresh_dashboard():
+    try:
+        dashboard_aggregates.refresh(reseed=True)
+        flash(f"✅ Dashboard data refreshed in {dashboard_aggregates.refresh_seconds:.2f}s", "success")
+    except Exception as e:
+        flash(f"❌ Dashboard refresh failed: {str(e)}", "danger")
+    return redirect(url_for('dashboard'))
+
+
+# Chart series for the dashboard as compact JSON, all at once or one by name.
+# The ETag is a hash of the body, so a browser revalidating an unchanged
+# snapshot gets a 304 with no body.
+@app.route('/api/charts')
+@app.route('/api/charts/<name>')
+@api_auth_required
+def api_charts(name='all'):
+    dashboard_aggregates.start_background_refresh()
+    documents = dashboard_chart_documents()
+    if name not in documents:
+        return jsonify({'error': f"unknown chart '{name}'", 'charts': sorted(documents)}), 404
+    body, etag = documents[name]
+    response = Response(body, mimetype='application/json')
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+
+@app.route('/pool-stats')
+@login_required
+def pool_stats():
+    return jsonify({**db_pool.stats(), 'read_pool': read_pool.stats()})
 
-        fig, ax = plt.subplots()
-        sns.barplot(data=df_rules, x='rule_name', y='total_alerts', ax=ax)
-        ax.set_title("Fraud Alerts by Rule")
-        ax.set_xticklabels(ax.get_xticklabels(), rotation=20)
-        fraud_rule_plot = plot_to_base64(fig)
-        cursor.execute("""
-            SELECT r.severity, COUNT(*) as count
-            FROM FraudAlerts fa
-            JOIN FraudRules r ON fa.rule_id = r.rule_id
-            GROUP BY r.severity
-            ORDER BY r.severity
-        """)
-        df_severity = pd.DataFrame(cursor.fetchall())
 
-        fig, ax = plt.subplots()
-        ax.pie(df_severity['count'], labels=df_severity['severity'], autopct='%1.1f%%')
-        ax.set_title("Fraud Alert Severity Distribution")
-        severity_plot = plot_to_base64(fig)
-        cursor.execute("""
-            SELECT a.account_number, COUNT(*) as alert_count
-            FROM FraudAlerts fa
-            JOIN Transactions t ON fa.transaction_id = t.transaction_id
-            JOIN Accounts a ON t.account_id = a.account_id
-            GROUP BY a.account_number
-            ORDER BY alert_count DESC
-            LIMIT 10
-        """)
-        df_top_accounts = pd.DataFrame(cursor.fetchall())
+# Request duration per endpoint, for every route
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
 
-        fig, ax = plt.subplots(figsize=(15, 6))
-        sns.barplot(data=df_top_accounts, x='account_number', y='alert_count', ax=ax)
-        ax.set_title("Top 10 Accounts with Most Fraud Alerts")
-        top_account_plot = plot_to_base64(fig)
-        # Query top 10 cities by fraud count
-        cursor.execute("""
-            SELECT c.city, COUNT(*) as fraud_count
-            FROM Transactions t
-            JOIN Accounts a ON t.account_id = a.account_id
-            JOIN Customers c ON a.customer_id = c.customer_id
-            WHERE t.is_fraud = 1
-            GROUP BY c.city
-            ORDER BY fraud_count DESC
-            LIMIT 10
-        """)
-        city_data = cursor.fetchall()
-        df_city = pd.DataFrame(city_data)
 
-        # Plot: Top Cities by Fraud Count (Horizontal Bar)
-        fig, ax = plt.subplots(figsize=(6, 4))
-        sns.barplot(y=df_city['city'], x=df_city['fraud_count'], ax=ax)
-        ax.set_title("Top Cities by Fraud Count")
-        ax.set_xlabel("Fraud Count")
-        city_fraud_plot = plot_to_base64(fig)
+@app.after_request
+def record_request_metrics(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        endpoint = request.endpoint or 'unmatched'
+        METRICS.observe('http_request_seconds', time.perf_counter() - started, endpoint=endpoint)
+        METRICS.inc('http_requests_total', endpoint=endpoint, status=response.status_code)
+    return response
 
-        # Generate correlation matrix for high amount transactions
-        cursor.execute("SELECT * FROM Transactions WHERE amount > 800")
-        df_high = pd.DataFrame(cursor.fetchall())
 
-        # Ensure columns are lower case to match keys
-        df_high.columns = [col.lower() for col in df_high.columns]
+# Gauges read at scrape time
+def collect_gauges():
+    for name, value in db_pool.stats().items():
+        yield f'db_pool_{name}', {}, value
+    for name, value in read_pool.stats().items():
+        yield f'db_read_pool_{name}', {}, value
+    age = dashboard_aggregates.age()
+    if age is not None:
+        yield 'dashboard_data_age_seconds', {}, round(age, 3)
+    bundle = model_registry._bundle
+    if bundle is not None:
+        yield 'model_info', {'version': bundle.version}, 1
+    if score_batcher is not None:
+        yield 'score_batcher_max_queue_depth', {}, score_batcher.stats().get('max_queue_depth', 0)
 
-        # Keep only V1–V28 and is_fraud
-        corr_cols = ['v' + str(i) for i in range(1, 29)] + ['is_fraud']
-        df_high = df_high[corr_cols]
 
-        # Compute correlation matrix
-        corr = df_high.corr()
+METRICS.register_collector(collect_gauges)
 
-        # Plot correlation matrix
-        fig, ax = plt.subplots(figsize=(10, 8))
-        sns.heatmap(corr, cmap="coolwarm", center=0, ax=ax)
-        ax.set_title("Feature Correlation Matrix (Amount > $800)")
 
-        # Convert to base64
-        correlation_plot = plot_to_base64(fig)  # make sure this matches the variable you use below
+# Prometheus text format: histograms per query, stage and endpoint, plus pool gauges
+@app.route('/metrics')
+@api_auth_required
+def metrics():
+    return Response(METRICS.render(), mimetype='text/plain; version=0.0.4')
 
-        cursor.close()
-        conn.close()
-        return render_template('dashboard.html',
-                               total_trans=total_trans,
-                               fraud_trans=fraud_trans,
-                               fraud_percent=round(fraud_percent, 2),
-                               recent_alerts=recent_alerts,
-                               fraud_plot=fraud_plot,
-                               amount_plot=amount_plot,
-                               investigating_alerts=investigating_alerts,
-                             status_pie_plot = status_pie_plot,
-                               fraud_rule_plot=fraud_rule_plot,
-                                severity_plot = severity_plot,
-                               top_account_plot=top_account_plot,
-                               city_fraud_plot=city_fraud_plot,
-                               correlation_plot=correlation_plot
-                               )
 
-    except Exception as e:
-        flash(f"Error loading dashboard: {str(e)}", "danger")
-        return render_template('dashboard.html')
+# Named queries slower than SLOW_QUERY_SECONDS, newest first
+@app.route('/metrics/slow-queries')
+@api_auth_required
+def slow_queries():
+    return jsonify({'threshold_seconds': METRICS.slow_query_seconds, 'queries': METRICS.slow_query_log()})
 
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -264,39 +345,45 @@ def logout():
 @login_required
 def transactions():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        page = request.args.get('page', 1, type=int)
-        per_page = 20
-        offset = (page - 1) * per_page
-
-        # Get transactions with pagination
-        cursor.execute(f"""
-            SELECT t.*, c.first_name, c.last_name, 
-                   a.account_number, cc.card_number
-            FROM Transactions t
-            JOIN Accounts a ON t.account_id = a.account_id
-            JOIN Customers c ON a.customer_id = c.customer_id
-            JOIN CreditCards cc ON t.card_id = cc.card_id
-            ORDER BY t.transaction_date DESC
-            LIMIT {per_page} OFFSET {offset}
-        """)
-        transactions = cursor.fetchall()
-
-        # Get total count for pagination
-        cursor.execute("SELECT COUNT(*) as total FROM Transactions")
-        total = cursor.fetchone()['total']
-
-        cursor.close()
-        conn.close()
+        with read_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+
+            per_page = 20
+            after = request.args.get('after')
+            before = request.args.get('before')
+
+            # Keyset pagination on (transaction_date, transaction_id)
+            with METRICS.query('transactions.page'):
+                transactions, next_cursor, prev_cursor = fetch_keyset_page(
+                    cursor,
+                    """
+                    SELECT t.*, c.first_name, c.last_name,
+                           a.account_number, cc.card_number
+                    FROM Transactions t
+                    JOIN Accounts a ON t.account_id = a.account_id
+                    JOIN Customers c ON a.customer_id = c.customer_id
+                    JOIN CreditCards cc ON t.card_id = cc.card_id
+                    """,
+                    [], [],
+                    't.transaction_date', 't.transaction_id',
+                    'transaction_date', 'transaction_id',
+                    per_page, after=after, before=before
+                )
+
+            # Total count is cached rather than recounted on every page
+            total = cached_count(cursor, 'transactions', "SELECT COUNT(*) as total FROM Transactions")
+
+            cursor.close()
 
         return render_template(
             'transactions.html',
             transactions=transactions,
-            page=page,
             per_page=per_page,
-            total=total
+            total=total,
+            after=after,
+            before=before,
+            next_cursor=next_cursor,
+            prev_cursor=prev_cursor
         )
 
     except Exception as e:
@@ -308,58 +395,52 @@ def transactions():
 @login_required
 def fraud_alerts():
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
-
-        status = request.args.get('status', 'new')
-        page = request.args.get('page', 1, type=int)
-        per_page = 60
-        offset = (page - 1) * per_page
-
-        if status == 'new':
-            cursor.execute(f"""
-                SELECT SQL_CALC_FOUND_ROWS fa.*, t.amount, t.transaction_date,
-                       r.rule_name, r.description, r.severity,
-                       c.first_name, c.last_name, a.account_number
-                FROM FraudAlerts fa
-                JOIN Transactions t ON fa.transaction_id = t.transaction_id
-                JOIN FraudRules r ON fa.rule_id = r.rule_id
-                JOIN Accounts a ON t.account_id = a.account_id
-                JOIN Customers c ON a.customer_id = c.customer_id
-                WHERE fa.status IN ('confirmed', 'investigating')
-                ORDER BY fa.alert_date DESC
-                LIMIT {per_page} OFFSET {offset}
-            """)
-        else:
-            cursor.execute(f"""
-                SELECT SQL_CALC_FOUND_ROWS fa.*, t.amount, t.transaction_date,
-                       r.rule_name, r.description, r.severity,
-                       c.first_name, c.last_name, a.account_number
-                FROM FraudAlerts fa
-                JOIN Transactions t ON fa.transaction_id = t.transaction_id
-                JOIN FraudRules r ON fa.rule_id = r.rule_id
-                JOIN Accounts a ON t.account_id = a.account_id
-                JOIN Customers c ON a.customer_id = c.customer_id
-                WHERE fa.status = %s
-                ORDER BY fa.alert_date DESC
-                LIMIT {per_page} OFFSET {offset}
-            """, (status,))
-
-        alerts = cursor.fetchall()
-
-        # Get total rows (use FOUND_ROWS)
-        cursor.execute("SELECT FOUND_ROWS() as total")
-        total = cursor.fetchone()['total']
-
-        cursor.close()
-        conn.close()
+        with read_connection() as conn:
+            cursor = conn.cursor(dictionary=True)
+
+            status = request.args.get('status', 'new')
+            per_page = 60
+            after = request.args.get('after')
+            before = request.args.get('before')
+
+            # One idx_alert_status_date seek per status, merged by the pager
+            statuses = ['confirmed', 'investigating'] if status == 'new' else [status]
+
+            # Keyset pagination on (alert_date, alert_id)
+            with METRICS.query('fraud_alerts.page'):
+                alerts, next_cursor, prev_cursor = fetch_keyset_page(
+                    cursor,
+                    """
+                    SELECT fa.*, t.amount, t.transaction_date,
+                           r.rule_name, r.description, r.severity,
+                           c.first_name, c.last_name, a.account_number
+                    FROM FraudAlerts fa
+                    JOIN Transactions t ON fa.transaction_id = t.transaction_id
+                    JOIN FraudRules r ON fa.rule_id = r.rule_id
+                    JOIN Accounts a ON t.account_id = a.account_id
+                    JOIN Customers c ON a.customer_id = c.customer_id
+                    """,
+                    [], [],
+                    'fa.alert_date', 'fa.alert_id',
+                    'alert_date', 'alert_id',
+                    per_page, after=after, before=before,
+                    branches=[("fa.status = %s", [s]) for s in statuses]
+                )
+
+            total = cached_count(cursor, ('fraud_alerts', status),
+                                 "SELECT COUNT(*) as total FROM FraudAlerts fa WHERE fa.status IN ("
+                                 + ", ".join(['%s'] * len(statuses)) + ")",
+                                 tuple(statuses))
+
+            cursor.close()
 
         return render_template('fraud_alerts.html',
                                alerts=alerts,
                                status=status,
-                               page=page,
                                per_page=per_page,
-                               total=total)
+                               total=total,
+                               next_cursor=next_cursor,
+                               prev_cursor=prev_cursor)
 
     except Exception as e:
         print("❌ Error loading fraud alerts:", str(e))
@@ -376,18 +457,19 @@ def update_alert(alert_id):
         new_status = request.form['status']
         notes = request.form.get('notes', '')
 
-        conn = get_db_connection()
-        cursor = conn.cursor()
+        with db_connection() as conn:
+            cursor = conn.cursor()
 
-        cursor.execute("""
-            UPDATE FraudAlerts
-            SET status = %s, notes = %s
-            WHERE alert_id = %s
-        """, (new_status, notes, alert_id))
+            cursor.execute("""
+                UPDATE FraudAlerts
+                SET status = %s, notes = %s
+                WHERE alert_id = %s
+            """, (new_status, notes, alert_id))
 
-        conn.commit()
-        cursor.close()
-        conn.close()
+            conn.commit()
+            cursor.close()
+        dashboard_aggregates.mark_stale()
+        count_cache.clear()
 
         flash('Alert updated successfully', 'success')
         return redirect(url_for('fraud_alerts'))
@@ -411,93 +493,16 @@ def load_data():
 
         if file and file.filename.endswith('.csv'):
             try:
-                filepath = os.path.join('temp', file.filename)
+                # Kept until the job completes so a failed or cancelled job can resume
+                os.makedirs('temp', exist_ok=True)
+                filepath = os.path.abspath(os.path.join('temp', f"{uuid.uuid4().hex}-{secure_filename(file.filename)}"))
                 file.save(filepath)
 
-                df = pd.read_csv(filepath, nrows=1000)
-                df = df.dropna()
-
-                # Rename and standardize column names
-                df.rename(columns={'Time': 'transaction_time', 'Class': 'is_fraud'}, inplace=True)
-                df.columns = [col.lower() for col in df.columns]
+                ingest_jobs.start()
+                job_id = ingest_jobs.submit(filepath, file.filename)
 
-                # Validate columns
-                kaggle_features = ['transaction_time', 'amount'] + [f'v{i}' for i in range(1, 29)] + ['is_fraud']
-                for col in kaggle_features:
-                    if col not in df.columns:
-                        raise Exception(f"❌ Missing column in CSV: {col}")
-
-                # Connect to DB
-                conn = get_db_connection()
-                conn.autocommit = False  # Explicitly manage transactions
-                cursor = conn.cursor()
-
-                # Get all available account/card pairs
-                cursor.execute("""
-                    SELECT a.account_id, c.card_id
-                    FROM Accounts a
-                    JOIN CreditCards c ON a.account_id = c.account_id
-                """)
-                account_card_pairs = cursor.fetchall()
-
-                if not account_card_pairs:
-                    raise Exception("❌ No account/card pairs available in the database.")
-
-                # Repeat account/card pairs if needed
-                import random
-                while len(account_card_pairs) < len(df):
-                    account_card_pairs += random.sample(account_card_pairs, len(account_card_pairs))
-                account_card_pairs = account_card_pairs[:len(df)]
-
-                acc_df = pd.DataFrame(account_card_pairs, columns=['account_id', 'card_id']).reset_index(drop=True)
-                df = df.reset_index(drop=True)
-                full_data = pd.concat([acc_df, df], axis=1)
-
-                # Final column list (33 columns)
-                expected_cols = ['account_id', 'card_id', 'transaction_time', 'amount'] + \
-                                [f'v{i}' for i in range(1, 29)] + ['is_fraud']
-
-                missing = [col for col in expected_cols if col not in full_data.columns]
-                if missing:
-                    raise Exception(f"❌ Final dataset missing columns: {missing}")
-
-                full_data = full_data.where(pd.notnull(full_data), None)
-                values = [tuple(row) for row in full_data[expected_cols].values]
-
-                insert_sql = """
-                    INSERT INTO Transactions (
-                        account_id, card_id, transaction_time, amount,
-                        v1, v2, v3, v4, v5, v6, v7, v8, v9, v10,
-                        v11, v12, v13, v14, v15, v16, v17, v18, v19, v20,
-                        v21, v22, v23, v24, v25, v26, v27, v28, is_fraud
-                    ) VALUES (
-                        %s, %s, %s, %s,
-                        %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-                        %s, %s, %s, %s, %s, %s, %s, %s, %s, %s,
-                        %s, %s, %s, %s, %s, %s, %s, %s, %s
-                    )
-                """
-
-                # ✅ Batch insert in chunks of 100
-                batch_size = 100
-                for i in range(0, len(values), batch_size):
-                    sub_batch = values[i:i + batch_size]
-                    try:
-                        cursor.executemany(insert_sql, sub_batch)
-                        conn.commit()
-                        print(f"✅ Batch {i // batch_size + 1}: Inserted {len(sub_batch)} transactions.")
-                    except mysql.connector.Error as e:
-                        conn.rollback()
-                        print(f"❌ Batch {i // batch_size + 1} failed: {e}")
-                        flash(f"❌ Batch insert failed: {str(e)}", 'danger')
-                        break
-
-                cursor.close()
-                conn.close()
-                os.remove(filepath)
-
-                flash(f"✅ Successfully loaded {len(values)} transactions.", 'success')
-                return redirect(url_for('dashboard'))
+                flash(f"✅ Upload queued as ingestion job #{job_id}.", 'success')
+                return redirect(url_for('load_data', job_id=job_id))
 
             except Exception as e:
                 flash(f"❌ Error loading data: {str(e)}", 'danger')
@@ -507,7 +512,38 @@ def load_data():
             flash('❌ Only CSV files are allowed', 'danger')
             return redirect(request.url)
 
-    return render_template('load_data.html')
+    try:
+        ingest_jobs.start()
+        jobs = ingest_jobs.recent()
+    except Exception as e:
+        flash(f"Error loading ingestion jobs: {str(e)}", "danger")
+        jobs = []
+    return render_template('load_data.html', jobs=jobs, job_id=request.args.get('job_id', type=int))
+
+
+@app.route('/jobs/<int:job_id>')
+@login_required
+def job_status(job_id):
+    job = ingest_jobs.status(job_id)
+    if job is None:
+        return jsonify({'error': 'job not found'}), 404
+    return jsonify(job)
+
+
+@app.route('/jobs/<int:job_id>/cancel', methods=['POST'])
+@login_required
+def cancel_job(job_id):
+    if not ingest_jobs.cancel(job_id):
+        return jsonify({'error': 'job is not queued or running'}), 409
+    return jsonify(ingest_jobs.status(job_id))
+
+
+@app.route('/jobs/<int:job_id>/resume', methods=['POST'])
+@login_required
+def resume_job(job_id):
+    if not ingest_jobs.resume(job_id):
+        return jsonify({'error': 'only failed or cancelled jobs can be resumed'}), 409
+    return jsonify(ingest_jobs.status(job_id))
 
 
 
@@ -515,157 +551,180 @@ def load_data():
 @app.route('/run-detection')
 @login_required
 def run_detection():
-    import time, os
-    import pandas as pd
-    from joblib import load
+    # Backlog mode scores every unscored transaction in the background
+    if request.args.get('mode') == 'backlog':
+        return start_backlog_detection()
 
-    start = time.time()
+    timer = StageTimer(metric='detection_stage_seconds')
     try:
-        BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-        model = load(os.path.join(BASE_DIR, "fraud_model.pkl"))
-
-        # Try to load scaler
-        try:
-            scaler = load(os.path.join(BASE_DIR, "scaler.pkl"))
-            use_scaler = True
-        except FileNotFoundError:
-            print("⚠️ No scaler found. Using unscaled input.")
-            use_scaler = False
-            scaler = None
+        with timer.stage('load model'):
+            bundle = model_registry.active()
 
         # Connect to DB and extend timeout
-        conn = get_db_connection()
-        conn.autocommit = True
-        cursor = conn.cursor(dictionary=True)
-        cursor.execute("SET innodb_lock_wait_timeout = 120;")
-
-        # Clear temporary alerts
-        cursor.execute("DELETE FROM FraudAlerts WHERE status = 'temporary'")
-
-        # Rule-based alerts (Amount > 800)
-        cursor.execute("""
-            INSERT IGNORE INTO FraudAlerts (transaction_id, rule_id, status)
-            SELECT t.transaction_id, 1, 'new'
-            FROM (
-                SELECT * FROM Transactions ORDER BY transaction_time DESC LIMIT 1000
-            ) t
-            WHERE t.amount > 800
-              AND NOT EXISTS (
-                SELECT 1 FROM FraudAlerts fa
-                WHERE fa.transaction_id = t.transaction_id AND fa.rule_id = 1
-              )
-        """)
-
-        # Load data for ML
-        cursor.execute("""
-            SELECT transaction_id, amount,
-                   v1, v2, v3, v4, v5, v6, v7, v8, v9, v10,
-                   v11, v12, v13, v14, v15, v16, v17, v18, v19, v20,
-                   v21, v22, v23, v24, v25, v26, v27, v28
-            FROM Transactions
-            ORDER BY transaction_time DESC
-            LIMIT 1000
-        """)
-        rows = cursor.fetchall()
-        if not rows:
-            flash("⚠️ No transactions to analyze.", "warning")
-            return redirect(url_for('dashboard'))
+        with db_connection(autocommit=True) as conn:
+            cursor = conn.cursor()
+            cursor.execute("SET innodb_lock_wait_timeout = 120;")
+
+            with timer.stage('rules'):
+                # Clear temporary alerts
+                cursor.execute("DELETE FROM FraudAlerts WHERE status = 'temporary'")
+
+                # Active FraudRules, evaluated on the same rows the model scores
+                rule_engine = RuleEngine.from_db(cursor)
+
+            with detection_scorer(bundle) as scorer:
+                result = run_recent(cursor, bundle, rule_engine, timer, velocity=velocity_alerts,
+                                    debug=DETECTION_DEBUG, scorer=scorer)
+            if result is None:
+                flash("⚠️ No transactions to analyze.", "warning")
+                return redirect(url_for('dashboard'))
 
-        # Create DataFrame with correct lowercase columns
-        df = pd.DataFrame(rows)
-        df.columns = [col.lower() for col in df.columns]
+            cursor.close()
+        dashboard_aggregates.mark_stale()
+        count_cache.clear()
 
-        X = df[[f'v{i}' for i in range(1, 29)] + ['amount']]
+        flash(f"✅ Detection complete: {result['rule_alerts']} rule + {result['velocity_alerts']} velocity + "
+              f"{result['ml_alerts']} ML matches "
+              f"({result['created']} new alerts) on {result['transactions']} transactions "
+              f"in {timer.total():.2f}s ({timer.summary()})", "success")
+        return redirect(url_for('fraud_alerts'))
 
-        if use_scaler:
-            X_scaled = scaler.transform(X)
-        else:
-            X_scaled = X
+    except Exception as e:
+        flash(f"❌ Detection failed: {str(e)}", "danger")
+        return redirect(url_for('dashboard'))
 
-        preds = model.predict(X_scaled)
-        probs = model.predict_proba(X_scaled)[:, 1]
 
-        update_data = []
-        flagged_ml = []
 
-        for idx, row in df.iterrows():
-            tx_id = int(row['transaction_id'])
-            amount = float(row['amount'])
-            prediction = int(preds[idx])
-            confidence = float(probs[idx])
+def start_backlog_detection():
+    def run():
+        try:
+            bundle = model_registry.active()
+            if DETECTION_WORKERS > 1:
+                with ParallelScorer(bundle.version, DETECTION_WORKERS) as scorer:
+                    result = run_backlog(db_connection, bundle, debug=DETECTION_DEBUG, scorer=scorer)
+            else:
+                result = run_backlog(db_connection, bundle, debug=DETECTION_DEBUG)
+            print(f"✅ Backlog detection finished: {result}")
+        except Exception as e:
+            print(f"❌ Backlog detection failed: {e}")
+        finally:
+            dashboard_aggregates.mark_stale()
+            count_cache.clear()
+
+    threading.Thread(target=run, name='backlog-detection', daemon=True).start()
+    flash("✅ Backlog detection started. Progress: /detection-progress", "info")
+    return redirect(url_for('dashboard'))
+
+
+@app.route('/detection-progress')
+@login_required
+def detection_progress():
+    with db_connection() as conn:
+        cursor = conn.cursor(dictionary=True)
+        cursor.execute("""
+            SELECT run_id, status, started_at, updated_at,
+                   last_transaction_id, rows_scored, alerts_created, error
+            FROM DetectionRuns
+            ORDER BY run_id DESC
+            LIMIT 1
+        """)
+        run = cursor.fetchone()
+        cursor.close()
+    return jsonify(run or {})
 
-            print(f"🔍 TX {tx_id} | ${amount:.2f} | ML_PRED: {prediction} | CONF: {confidence:.4f}")
 
-            update_data.append((prediction, confidence, tx_id))
+@app.route('/model/version')
+@login_required
+def model_version():
+    bundle = model_registry.active()
+    return jsonify({**bundle.info(), 'available_versions': model_registry.versions()})
 
-            if prediction == 1 and confidence >= 0.8:
-                flagged_ml.append((tx_id, 99, 'ml_fraud'))
 
-        # Update ML results
-        for i in range(0, len(update_data), 25):
-            cursor.executemany("""
-                UPDATE Transactions
-                SET ml_prediction = %s, ml_confidence = %s
-                WHERE transaction_id = %s
-            """, update_data[i:i + 25])
+@app.route('/predict-transaction/<int:transaction_id>')
+@login_required
+def predict_transaction(transaction_id):
+    # Return to the same keyset page the analyst was on
+    page_args = {k: request.args[k] for k in ('after', 'before') if request.args.get(k)}
+    try:
+        with db_connection() as conn:
+            cursor = conn.cursor()
+            features = online_scorer.fetch_features(cursor, transaction_id)
+            cursor.close()
 
-        # Insert ML alerts
-        if flagged_ml:
-            for i in range(0, len(flagged_ml), 25):
-                cursor.executemany("""
-                    INSERT IGNORE INTO FraudAlerts (transaction_id, rule_id, status)
-                    VALUES (%s, %s, %s)
-                """, flagged_ml[i:i + 25])
+        if not features:
+            flash('Transaction not found', 'danger')
+            return redirect(url_for('transactions', **page_args))
 
-        cursor.close()
-        conn.close()
+        # Same model bundle and preprocessing as run_detection() and /api/score
+        result = online_scorer.score_vector(features)
 
-        runtime = time.time() - start
-        flash(f"✅ Detection complete: Rule + {len(flagged_ml)} ML alerts in {runtime:.2f}s", "success")
-        return redirect(url_for('fraud_alerts'))
+        msg = f"Prediction for Transaction #{transaction_id}: "
+        msg += f"<strong>{result['decision'].upper()}</strong> "
+        msg += f"(Confidence: {result['probability']:.2%}, model {result['model_version']})"
+        flash(msg, 'info')
 
     except Exception as e:
-        flash(f"❌ Detection failed: {str(e)}", "danger")
-        return redirect(url_for('dashboard'))
+        flash(f"Error during prediction: {str(e)}", "danger")
 
+    return redirect(url_for('transactions', **page_args))
 
 
-@app.route('/predict-transaction/<int:transaction_id>')
-@login_required
-def predict_transaction(transaction_id):
-    page = request.args.get('page', 1, type=int)
+# JSON scoring for inline callers: {"features": [v1..v28, amount]} or {"transaction_id": N}
+@app.route('/api/score', methods=['POST'])
+@api_auth_required
+def api_score():
+    payload = request.get_json(silent=True) or {}
     try:
-        conn = get_db_connection()
-        cursor = conn.cursor(dictionary=True)
+        if 'features' in payload:
+            features = [float(x) for x in payload['features']]
+        elif 'transaction_id' in payload:
+            with db_connection() as conn:
+                cursor = conn.cursor()
+                features = online_scorer.fetch_features(cursor, int(payload['transaction_id']))
+                cursor.close()
+            if not features:
+                return jsonify({'error': 'transaction not found'}), 404
+        else:
+            return jsonify({'error': "provide 'features' or 'transaction_id'"}), 400
 
-        cursor.execute("SELECT * FROM Transactions WHERE transaction_id = %s", (transaction_id,))
-        tx = cursor.fetchone()
-        cursor.close()
-        conn.close()
+        return jsonify(online_scorer.score_vector(features))
 
-        if not tx:
-            flash('Transaction not found', 'danger')
-            return redirect(url_for('transactions', page=page))
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': str(e)}), 400
 
-        features = [tx[f'v{i}'] for i in range(1, 29)] + [tx['amount']]
 
-        print("🧪 Features:", features)
-        print("🧪 Length of feature vector:", len(features))
+# NDJSON transaction events (one JSON object per line: Time or transaction_time,
+# V1-V28, Amount, optional Class, account_id + card_id and event_id). Each batch
+# is inserted with its scores and alerts in one transaction; the response has a
+# decision per accepted line. first_line numbers the lines when replaying a file.
+# The dashboard picks the rows up on its next scheduled refresh.
+@app.route('/api/transactions/stream', methods=['POST'])
+@api_auth_required
+def api_transactions_stream():
+    first_line = request.args.get('first_line', 1, type=int)
+    try:
+        return jsonify(stream_intake.process_lines(request.stream, first_line))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
 
-        prediction = model.predict([features])[0]
-        prob = model.predict_proba([features])[0]
 
-        print("🔍 Prediction Probabilities:", prob)  # <-- This should show [0.92, 0.08] etc
+@app.route('/api/transactions/stream/stats')
+@api_auth_required
+def api_transactions_stream_stats():
+    return jsonify(stream_intake.stats())
 
-        msg = f"Prediction for Transaction #{transaction_id}: "
-        msg += f"<strong>{'FRAUD' if prediction == 1 else 'LEGIT'}</strong> "
-        msg += f"(Confidence: {prob[1]:.2%})"
-        flash(msg, 'info')
 
-    except Exception as e:
-        flash(f"Error during prediction: {str(e)}", "danger")
+@app.route('/api/score/latency')
+@api_auth_required
+def api_score_latency():
+    return jsonify(online_scorer.latency.summary())
+
 
-    return redirect(url_for('transactions', page=page))
+# End-to-end latency plus micro-batching queue depth, batch sizes and added wait
+@app.route('/api/score/stats')
+@api_auth_required
+def api_score_stats():
+    return jsonify(online_scorer.stats())
 
 
 
@@ -679,4 +738,5 @@ if __name__ == '__main__':
         os.makedirs('templates')
         # You would need to create your HTML templates here
 
+    # Development server; for production use serve.py (gunicorn, several processes)
     app.run(debug=True)
\ No newline at end of file
@@ -0,0 +1,199 @@
+import argparse
+import operator
+import re
+import time
+
+import mysql.connector
+import numpy as np
+
+from detection import insert_alerts
+
+# Transactions columns a vectorized rule may test
+RULE_COLUMNS = ['transaction_time', 'amount'] + [f'v{i}' for i in range(1, 29)] + ['is_fraud']
+
+# Rules evaluated elsewhere, recognised by the first word of condition_sql
+# (e.g. 'ML fraud_probability >= 0.8' is the model's own rule in detection.py,
+# 'VELOCITY account_id WITHIN 60 COUNT >= 3' a sliding-window rule in velocity.py)
+EXTERNAL_RULE_PREFIXES = ('ML', 'VELOCITY')
+
+# Rows per keyset chunk for a full-table run
+RULE_CHUNK_SIZE = 50000
+
+OPERATORS = {
+    '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+    '=': operator.eq, '!=': operator.ne, '<>': operator.ne,
+}
+
+TERM_RE = re.compile(r'^\s*(?:t\.)?([a-z_][a-z0-9_]*)\s*(<=|>=|<>|!=|=|<|>)\s*(-?\d+(?:\.\d+)?)\s*$', re.I)
+
+
+# 't.v14 < -3.5 AND t.is_fraud = 0' -> [('v14', '<', -3.5), ('is_fraud', '=', 0.0)]
+# Anything else (OR, functions, subqueries, other columns) returns None and the
+# rule is evaluated in SQL instead.
+def parse_condition(condition_sql):
+    terms = []
+    for part in re.split(r'\s+AND\s+', condition_sql.strip(), flags=re.I):
+        match = TERM_RE.match(part)
+        if not match or match.group(1).lower() not in RULE_COLUMNS:
+            return None
+        column, op, value = match.groups()
+        terms.append((column.lower(), op, float(value)))
+    return terms
+
+
+class Rule:
+    def __init__(self, rule_id, name, condition_sql, alert_status='investigating'):
+        self.rule_id = rule_id
+        self.name = name
+        self.condition_sql = condition_sql
+        self.alert_status = alert_status
+        self.terms = parse_condition(condition_sql)
+
+    @property
+    def vectorized(self):
+        return self.terms is not None
+
+    def mask(self, columns, n):
+        matched = np.ones(n, dtype=bool)
+        for column, op, value in self.terms:
+            matched &= OPERATORS[op](columns[column], value)
+        return matched
+
+
+# Evaluates every active FraudRules condition against a chunk of transactions.
+# Simple comparisons are compiled to NumPy masks over columns the caller has
+# already fetched; the remaining rules share one SQL query per chunk, so adding
+# a rule never adds a table scan.
+class RuleEngine:
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.vector_rules = [rule for rule in self.rules if rule.vectorized]
+        self.sql_rules = [rule for rule in self.rules if not rule.vectorized]
+        self.columns = sorted({column for rule in self.vector_rules for column, _, _ in rule.terms},
+                              key=RULE_COLUMNS.index)
+
+    @classmethod
+    def from_db(cls, cursor):
+        cursor.execute("""
+            SELECT rule_id, rule_name, condition_sql, alert_status
+            FROM FraudRules
+            WHERE is_active = TRUE
+            ORDER BY rule_id
+        """)
+        rules = []
+        for rule_id, name, condition_sql, alert_status in cursor.fetchall():
+            if not condition_sql.strip() or condition_sql.split(None, 1)[0].upper() in EXTERNAL_RULE_PREFIXES:
+                continue
+            rule = Rule(rule_id, name, condition_sql, alert_status)
+            if not rule.vectorized and not cls._valid_sql(cursor, rule):
+                continue
+            rules.append(rule)
+        return cls(rules)
+
+    # A broken condition would fail the shared query for every rule, so it is skipped up front
+    @staticmethod
+    def _valid_sql(cursor, rule):
+        try:
+            cursor.execute(f"SELECT ({rule.condition_sql}) FROM Transactions t LIMIT 0")
+            cursor.fetchall()
+            return True
+        except mysql.connector.Error as e:
+            print(f"⚠️ Skipping rule {rule.rule_id} ({rule.name}): {e}")
+            return False
+
+    # (transaction_id, rule_id, status) for every vectorized rule that matches;
+    # columns maps column name -> array aligned with ids
+    def evaluate(self, ids, columns):
+        alerts = []
+        for rule in self.vector_rules:
+            matched = ids[rule.mask(columns, len(ids))].tolist()
+            alerts.extend((tx_id, rule.rule_id, rule.alert_status) for tx_id in matched)
+        return alerts
+
+    # All SQL-only rules in one query over the chunk: an id range for keyset
+    # chunks, an id list when the ids are scattered
+    def evaluate_sql(self, cursor, ids):
+        if not self.sql_rules or len(ids) == 0:
+            return []
+        lo, hi = int(ids.min()), int(ids.max())
+        if hi - lo < 2 * len(ids):
+            where, params = "t.transaction_id BETWEEN %s AND %s", (lo, hi)
+        else:
+            where, params = f"t.transaction_id IN ({', '.join(['%s'] * len(ids))})", tuple(ids.tolist())
+        cursor.execute(f"""
+            SELECT t.transaction_id, {', '.join(f'({rule.condition_sql})' for rule in self.sql_rules)}
+            FROM Transactions t
+            WHERE {where}
+        """, params)
+        wanted = set(ids.tolist())
+        alerts = []
+        for row in cursor.fetchall():
+            if row[0] not in wanted:
+                continue
+            for rule, matched in zip(self.sql_rules, row[1:]):
+                if matched:
+                    alerts.append((row[0], rule.rule_id, rule.alert_status))
+        return alerts
+
+    def alerts(self, cursor, ids, columns):
+        return self.evaluate(ids, columns) + self.evaluate_sql(cursor, ids)
+
+
+# Apply every active rule to the whole table (or to rows after since_id) in one
+# keyset pass; each chunk's alerts are written with one bulk insert
+def run_rules(connection, chunk_size=RULE_CHUNK_SIZE, since_id=0, progress=None):
+    counts = {}
+    rows_checked = 0
+    with connection() as conn:
+        cursor = conn.cursor()
+        engine = RuleEngine.from_db(cursor)
+        # The keyset query needs at least one column besides the id
+        columns = engine.columns or ['amount']
+        last_id = since_id
+        while True:
+            cursor.execute(f"""
+                SELECT transaction_id, {', '.join(columns)}
+                FROM Transactions
+                WHERE transaction_id > %s
+                ORDER BY transaction_id
+                LIMIT %s
+            """, (last_id, chunk_size))
+            rows = cursor.fetchall()
+            if not rows:
+                break
+            data = np.asarray(rows, dtype=np.float64)
+            ids = data[:, 0].astype(np.int64)
+            alerts = engine.alerts(cursor, ids, {col: data[:, i + 1] for i, col in enumerate(columns)})
+            insert_alerts(cursor, alerts)
+            conn.commit()
+
+            for _, rule_id, _ in alerts:
+                counts[rule_id] = counts.get(rule_id, 0) + 1
+            rows_checked += len(ids)
+            last_id = int(ids[-1])
+            if progress:
+                progress(rows_checked, last_id, counts)
+        cursor.close()
+    return {'rows_checked': rows_checked, 'last_transaction_id': last_id, 'matches_by_rule': counts,
+            'vectorized_rules': [rule.rule_id for rule in engine.vector_rules],
+            'sql_rules': [rule.rule_id for rule in engine.sql_rules]}
+
+
+if __name__ == '__main__':
+    from config import DB_CONFIG
+    from db_pool import ConnectionPool
+
+    parser = argparse.ArgumentParser(description="Apply all active FraudRules to Transactions in one pass")
+    parser.add_argument('--chunk-size', type=int, default=RULE_CHUNK_SIZE)
+    parser.add_argument('--since-id', type=int, default=0, help="only check transactions after this id")
+    args = parser.parse_args()
+
+    pool = ConnectionPool(DB_CONFIG, size=1)
+    start = time.time()
+
+    def report(rows_checked, last_id, counts):
+        print(f"✅ {rows_checked} transactions checked, last id {last_id}, "
+              f"{sum(counts.values())} alerts ({rows_checked / (time.time() - start):.0f} rows/s)")
+
+    result = run_rules(pool.connection, chunk_size=args.chunk_size, since_id=args.since_id, progress=report)
+    print(f"✅ Rules finished: {result}")
@@ -0,0 +1,65 @@
+import argparse
+
+from config import SERVE_BIND, SERVE_THREADS, SERVE_TIMEOUT, SERVE_WORKERS
+
+
+# gunicorn with threaded workers. The app is imported in every worker after
+# the fork (no preload), so each process builds its own connection pools,
+# background threads and executors. Threads of a process share them: blocking
+# MySQL calls release the GIL, and batch scoring runs in executor processes
+# (INFERENCE_WORKERS); dashboard charts are drawn in the browser.
+#
+# State the workers must agree on is shared:
+#   - ingest jobs: status, owner, cancel requests and progress in IngestJobs
+#   - dashboard staleness: a counter in CacheVersions, polled by every refresher
+#   - correlation sums: corr_stats.npz, merged under a file lock
+#   - the active model: models/ACTIVE, re-read every few seconds
+# and the rest is per process: dashboard snapshots and chart JSON, the cached
+# page counts (COUNT_CACHE_TTL), velocity windows (caught up from the table),
+# the scoring batcher and /pool-stats, /metrics and stream stats counters.
+def gunicorn_server(bind, workers, threads, timeout):
+    from gunicorn.app.base import BaseApplication
+
+    class FraudDetectionServer(BaseApplication):
+        def load_config(self):
+            for key, value in {
+                'bind': bind,
+                'workers': workers,
+                'threads': threads,
+                'worker_class': 'gthread',
+                'timeout': timeout,
+                'graceful_timeout': 30,
+                'keepalive': 5,
+                'preload_app': False,
+                'accesslog': '-',
+            }.items():
+                self.cfg.set(key, value)
+
+        def load(self):
+            from project1 import app
+            return app
+
+    return FraudDetectionServer()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Serve the web app with several processes and threads")
+    parser.add_argument('--bind', default=SERVE_BIND)
+    parser.add_argument('--workers', type=int, default=SERVE_WORKERS)
+    parser.add_argument('--threads', type=int, default=SERVE_THREADS)
+    parser.add_argument('--timeout', type=int, default=SERVE_TIMEOUT, help="seconds before a stuck worker is restarted")
+    args = parser.parse_args()
+
+    try:
+        server = gunicorn_server(args.bind, args.workers, args.threads, args.timeout)
+    except ImportError:
+        # gunicorn is POSIX-only; fall back to one threaded process
+        from werkzeug.serving import run_simple
+        from project1 import app
+
+        print("⚠️ gunicorn is not installed (pip install gunicorn): serving with one threaded Werkzeug process")
+        host, port = args.bind.rsplit(':', 1)
+        run_simple(host, int(port), app, threaded=True)
+    else:
+        print(f"✅ Serving on {args.bind}: {args.workers} processes x {args.threads} threads")
+        server.run()
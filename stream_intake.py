@@ -0,0 +1,399 @@
+import argparse
+import json
+import secrets
+import threading
+import time
+import urllib.request
+
+import mysql.connector
+import numpy as np
+import pandas as pd
+
+from detection import StageTimer, insert_alerts, ml_alert_rows
+from ingest import INSERT_BATCH_ROWS, INSERT_COLUMNS, fetch_account_card_pairs
+from metrics import METRICS
+from model_registry import FEATURE_COLUMNS
+from rule_engine import RuleEngine
+
+# Events per bulk transaction; bounds the latency of a batch and the rows it locks
+STREAM_BATCH_ROWS = 2000
+
+# Events read from one request body; a longer body is answered with next_line
+# so the client sends the rest in another request
+STREAM_MAX_EVENTS = 50000
+
+# Active FraudRules and account/card pairs are re-read at most this often
+RULE_REFRESH_SECONDS = 30
+PAIR_REFRESH_SECONDS = 300
+
+# Transactions column -> event field (lower case); the Kaggle names Time and Class are accepted too
+EVENT_FIELDS = {'transaction_time': ('transaction_time', 'time'), 'amount': ('amount',),
+                **{f'v{i}': (f'v{i}',) for i in range(1, 29)}, 'is_fraud': ('is_fraud', 'class')}
+VALUE_COLUMNS = list(EVENT_FIELDS)
+REQUIRED_COLUMNS = VALUE_COLUMNS[:-1]
+COMPONENT_COLUMNS = [f'v{i}' for i in range(1, 29)]
+
+# Limits of the DECIMAL columns; a larger value would fail the whole batch's INSERT
+MAX_AMOUNT = 1e13
+MAX_COMPONENT = 1e6
+
+# Intake rows carry their scores, so no UPDATE pass is needed afterwards, and
+# the batch's token, so their ids can be read back
+STREAM_INSERT_COLUMNS = INSERT_COLUMNS + ['ml_prediction', 'ml_confidence', 'intake_batch']
+STREAM_INSERT_SQL = f"""
+    INSERT INTO Transactions ({', '.join(STREAM_INSERT_COLUMNS)})
+    VALUES ({', '.join(['%s'] * len(STREAM_INSERT_COLUMNS))})
+"""
+
+
+def _lookup(fields, names):
+    for name in names:
+        value = fields.get(name)
+        if value is not None:
+            return value
+    return None
+
+
+# One NDJSON line -> (values in VALUE_COLUMNS order, account_id, card_id, event_id).
+# Only the JSON structure is checked here; ranges are checked per batch.
+def parse_event(line):
+    event = json.loads(line)
+    if not isinstance(event, dict):
+        raise ValueError("expected a JSON object")
+    fields = {key.lower(): value for key, value in event.items()}
+    raw = [_lookup(fields, names) for names in EVENT_FIELDS.values()]
+    missing = [column for column, value in zip(REQUIRED_COLUMNS, raw) if value is None]
+    if missing:
+        raise ValueError(f"missing {', '.join(missing)}")
+    values = [float(value) for value in raw[:-1]]
+    values.append(float(raw[-1] or 0))
+    account_id, card_id = fields.get('account_id'), fields.get('card_id')
+    if (account_id is None) != (card_id is None):
+        raise ValueError("give both account_id and card_id, or neither")
+    if account_id is not None:
+        account_id, card_id = int(account_id), int(card_id)
+    return values, account_id, card_id, event.get('event_id')
+
+
+# Parse (line number, line) pairs into one frame of Transactions columns.
+# Returns (frame, [(line, account_id, card_id, event_id)] aligned with it,
+# rejected lines). Values are rounded to the column precision, so the stored
+# row scores the same as the event did.
+def parse_batch(pending):
+    rows, meta, rejected = [], [], []
+    for line_no, line in pending:
+        try:
+            values, account_id, card_id, event_id = parse_event(line)
+        except (ValueError, TypeError) as e:
+            rejected.append({'line': line_no, 'error': str(e)})
+            continue
+        rows.append(values)
+        meta.append((line_no, account_id, card_id, event_id))
+    data = np.asarray(rows, dtype=np.float64).reshape(-1, len(VALUE_COLUMNS))
+
+    problems = [
+        (~np.isfinite(data).all(axis=1), "values must be finite numbers"),
+        (~((data[:, 1] >= 0) & (data[:, 1] < MAX_AMOUNT)), "amount out of range"),
+        ((np.abs(data[:, 2:-1]) >= MAX_COMPONENT).any(axis=1), "V1-V28 must be below 1e6 in magnitude"),
+    ]
+    bad = np.zeros(len(data), dtype=bool)
+    for mask, error in problems:
+        for i in np.flatnonzero(mask & ~bad):
+            rejected.append({'line': meta[i][0], 'error': error})
+        bad |= mask
+    if bad.any():
+        data = data[~bad]
+        meta = [m for m, ok in zip(meta, ~bad) if ok]
+        rejected.sort(key=lambda reject: reject['line'])
+
+    frame = pd.DataFrame(data, columns=VALUE_COLUMNS)
+    frame['transaction_time'] = frame['transaction_time'].astype(np.int64)
+    frame['amount'] = frame['amount'].round(2)
+    frame[COMPONENT_COLUMNS] = frame[COMPONENT_COLUMNS].round(6)
+    frame['is_fraud'] = (frame['is_fraud'] != 0).astype(np.int8)
+    return frame, meta, rejected
+
+
+# The ids read back for a batch do not match the rows inserted
+class IntakeError(Exception):
+    pass
+
+
+# Real-time intake for NDJSON transaction events. Every batch is appended to
+# Transactions with its ml_prediction / ml_confidence, checked against the
+# active FraudRules, and its alerts are written in the same transaction, so a
+# batch is either fully visible with its decisions or not at all. The velocity
+# windows only see committed rows: they are fed after the commit, and their
+# alerts written in a second transaction. Rows other writers commit below an
+# id the windows already passed are fed later from the engine's open gaps. on_batch(frame) is called with every
+# committed batch (the correlation accumulator, as for CSV uploads).
+class StreamIntake:
+    def __init__(self, connection, registry, velocity=None, on_batch=None, batch_rows=STREAM_BATCH_ROWS,
+                 seed=None):
+        self._connect = connection
+        self.registry = registry
+        self.velocity = velocity
+        self.on_batch = on_batch
+        self.batch_rows = batch_rows
+        self._rng = np.random.default_rng(seed)
+        self._lock = threading.Lock()
+        self._rules = None
+        self._rules_loaded = 0.0
+        self._pairs = None
+        self._pairs_loaded = 0.0
+        self.counters = {'accepted': 0, 'rejected': 0, 'failed': 0, 'batches': 0, 'alerts_created': 0,
+                         'velocity_failures': 0}
+
+    def _rule_engine(self, cursor):
+        with self._lock:
+            if self._rules is None or time.time() - self._rules_loaded > RULE_REFRESH_SECONDS:
+                self._rules = RuleEngine.from_db(cursor)
+                self._rules_loaded = time.time()
+            return self._rules
+
+    def _account_card_pairs(self, cursor):
+        with self._lock:
+            if self._pairs is None or time.time() - self._pairs_loaded > PAIR_REFRESH_SECONDS:
+                self._pairs = fetch_account_card_pairs(cursor)
+                self._pairs_loaded = time.time()
+            return self._pairs
+
+    def _count(self, **counts):
+        with self._lock:
+            for key, value in counts.items():
+                self.counters[key] += value
+        for result, value in counts.items():
+            if result in ('accepted', 'rejected', 'failed') and value:
+                METRICS.inc('stream_events_total', value, result=result)
+
+    # Score, insert and alert one parsed batch in one transaction (velocity
+    # alerts follow in a second one). Returns the alerts created and one decision per row, in order.
+    def process_batch(self, frame, meta, timer):
+        with timer.stage('score'):
+            bundle = self.registry.active()
+            preds, probs = bundle.score(frame[FEATURE_COLUMNS].to_numpy(dtype=np.float64))
+            frame['ml_prediction'] = preds
+            frame['ml_confidence'] = probs
+
+        with self._connect() as conn:
+            cursor = conn.cursor()
+            try:
+                with timer.stage('insert'):
+                    accounts = [account_id for _, account_id, _, _ in meta]
+                    cards = [card_id for _, _, card_id, _ in meta]
+                    # Events without an account get one at random, like CSV rows beyond the pairs
+                    unassigned = [i for i, account_id in enumerate(accounts) if account_id is None]
+                    if unassigned:
+                        pairs = self._account_card_pairs(cursor)
+                        with self._lock:
+                            picks = pairs[self._rng.integers(0, len(pairs), len(unassigned))].tolist()
+                        for i, (account_id, card_id) in zip(unassigned, picks):
+                            accounts[i], cards[i] = account_id, card_id
+                    frame['account_id'] = accounts
+                    frame['card_id'] = cards
+                    ids = self._insert(cursor, frame)
+
+                with timer.stage('rules'):
+                    rule_engine = self._rule_engine(cursor)
+                    columns = {col: frame[col].to_numpy(dtype=np.float64) for col in rule_engine.columns}
+                    alerts = rule_engine.alerts(cursor, ids, columns)
+
+                with timer.stage('alerts'):
+                    alerts += ml_alert_rows(ids, preds, probs)
+                    created = insert_alerts(cursor, alerts)
+                    conn.commit()
+            except (mysql.connector.Error, IntakeError):
+                conn.rollback()
+                cursor.close()
+                raise
+
+            # A rolled-back batch never reaches the windows. The batch itself
+            # is committed, so a failure here only loses its velocity alerts.
+            if self.velocity is not None:
+                try:
+                    with timer.stage('velocity'):
+                        velocity_alerts = self.velocity(cursor)
+                        created += insert_alerts(cursor, velocity_alerts)
+                        conn.commit()
+                    alerts += velocity_alerts
+                except mysql.connector.Error as e:
+                    conn.rollback()
+                    self._count(velocity_failures=1)
+                    print(f"⚠️ Velocity alerts for a streamed batch failed: {e}")
+            cursor.close()
+
+        self._count(accepted=len(frame), batches=1, alerts_created=created)
+        if self.on_batch:
+            self.on_batch(frame)
+
+        rules_by_id = {}
+        for tx_id, rule_id, _ in alerts:
+            rules_by_id.setdefault(tx_id, []).append(rule_id)
+        return created, [{'line': line_no, 'event_id': event_id, 'transaction_id': tx_id, 'prediction': pred,
+                          'probability': round(prob, 6), 'decision': 'fraud' if pred == 1 else 'legit',
+                          'alerts': sorted(rules_by_id.get(tx_id, []))}
+                         for (line_no, _, _, event_id), tx_id, pred, prob
+                         in zip(meta, ids.tolist(), preds.tolist(), probs.tolist())]
+
+    # Multi-row INSERTs tagged with a random batch token, then the ids read
+    # back. Concurrent multi-row inserts need not get consecutive ids
+    # (innodb_autoinc_lock_mode = 2), but ids increase in insert order and
+    # none is below the first statement's LAST_INSERT_ID(), so the read back
+    # is a short primary-key range scan over the newest rows.
+    def _insert(self, cursor, frame):
+        token = secrets.randbits(63)
+        frame['intake_batch'] = token
+        columns = [frame[col].tolist() for col in STREAM_INSERT_COLUMNS]
+        rows = list(zip(*columns))
+        first_id = None
+        for i in range(0, len(rows), INSERT_BATCH_ROWS):
+            cursor.executemany(STREAM_INSERT_SQL, rows[i:i + INSERT_BATCH_ROWS])
+            if first_id is None:
+                first_id = cursor.lastrowid
+        cursor.execute("""
+            SELECT transaction_id FROM Transactions
+            WHERE transaction_id >= %s AND intake_batch = %s
+            ORDER BY transaction_id
+        """, (first_id, token))
+        ids = np.asarray([row[0] for row in cursor.fetchall()], dtype=np.int64)
+        if len(ids) != len(rows):
+            raise IntakeError(f"Read back {len(ids)} ids for {len(rows)} inserted rows")
+        return ids
+
+    # Parse NDJSON lines and process them in batches of batch_rows.
+    # Malformed lines are rejected one by one; a batch the database refuses
+    # (e.g. an unknown account_id) is reported as failed with its first line.
+    # Stops after max_events lines and returns next_line to continue from.
+    def process_lines(self, lines, first_line=1, max_events=STREAM_MAX_EVENTS):
+        timer = StageTimer(metric='stream_stage_seconds')
+        start = time.perf_counter()
+        decisions, rejected, failed = [], [], []
+        alerts_created = 0
+        next_line = None
+
+        def flush(pending):
+            nonlocal alerts_created
+            with timer.stage('parse'):
+                frame, meta, batch_rejected = parse_batch(pending)
+            rejected.extend(batch_rejected)
+            if not meta:
+                return
+            try:
+                created, batch_decisions = self.process_batch(frame, meta, timer)
+            except (mysql.connector.Error, IntakeError) as e:
+                self._count(failed=len(meta))
+                failed.append({'line': meta[0][0], 'events': len(meta), 'error': str(e)})
+                return
+            alerts_created += created
+            decisions.extend(batch_decisions)
+
+        pending, read = [], 0
+        for line_no, line in enumerate(lines, first_line):
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            if not line.strip():
+                continue
+            if read >= max_events:
+                next_line = line_no
+                break
+            pending.append((line_no, line))
+            read += 1
+            if len(pending) >= self.batch_rows:
+                flush(pending)
+                pending = []
+        if pending:
+            flush(pending)
+        self._count(rejected=len(rejected))
+
+        seconds = time.perf_counter() - start
+        return {
+            'accepted': len(decisions),
+            'rejected': rejected,
+            'failed': failed,
+            'alerts_created': alerts_created,
+            'model_version': self.registry.active().version,
+            'next_line': next_line,
+            'seconds': round(seconds, 4),
+            'events_per_sec': round(len(decisions) / seconds, 1) if seconds else 0.0,
+            'timings': {name: round(value, 4) for name, value in timer.stages.items()},
+            'decisions': decisions,
+        }
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counters)
+
+
+# Send a file to the intake batch_lines lines at a time; send(lines,
+# first_line) returns the intake's result. Yields (running totals, result).
+def replay(path, send, batch_lines=STREAM_BATCH_ROWS, start_line=1):
+    totals = {'accepted': 0, 'rejected': 0, 'failed': 0, 'alerts_created': 0}
+    # A request never carries more lines than the endpoint reads
+    batch_lines = min(batch_lines, STREAM_MAX_EVENTS)
+    with open(path, encoding='utf-8') as f:
+        chunk, first_line = [], start_line
+        for line_no, line in enumerate(f, 1):
+            if line_no < start_line:
+                continue
+            chunk.append(line)
+            if len(chunk) >= batch_lines:
+                yield _tally(totals, send(chunk, first_line))
+                chunk, first_line = [], line_no + 1
+        if chunk:
+            yield _tally(totals, send(chunk, first_line))
+
+
+# POST lines to the /api/transactions/stream endpoint
+def http_sender(url, api_key=''):
+    def send(lines, first_line):
+        request = urllib.request.Request(f"{url}?first_line={first_line}", data=''.join(lines).encode(),
+                                         headers={'Content-Type': 'application/x-ndjson', 'X-API-Key': api_key})
+        with urllib.request.urlopen(request) as response:
+            return json.load(response)
+    return send
+
+
+def _tally(totals, result):
+    totals['accepted'] += result['accepted']
+    totals['rejected'] += len(result['rejected'])
+    totals['failed'] += sum(batch['events'] for batch in result['failed'])
+    totals['alerts_created'] += result['alerts_created']
+    return dict(totals), result
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Replay an NDJSON file of transaction events through the intake")
+    parser.add_argument('path', help="one JSON event per line (Time/transaction_time, V1-V28, Amount, ...)")
+    parser.add_argument('--url', help="POST to this /api/transactions/stream URL instead of writing to MySQL directly")
+    parser.add_argument('--api-key', default='', help="X-API-Key for --url")
+    parser.add_argument('--batch-lines', type=int, default=STREAM_BATCH_ROWS)
+    parser.add_argument('--start-line', type=int, default=1, help="resume from this line")
+    parser.add_argument('--velocity', action='store_true', help="also evaluate the velocity rules (local mode)")
+    args = parser.parse_args()
+
+    if args.url:
+        send = http_sender(args.url, args.api_key)
+    else:
+        from config import DB_CONFIG
+        from db_pool import ConnectionPool
+        from model_registry import ModelRegistry
+        from velocity import VelocityEngine
+
+        pool = ConnectionPool(DB_CONFIG, size=1)
+        engine = None
+        if args.velocity:
+            with pool.connection() as conn:
+                cursor = conn.cursor()
+                engine = VelocityEngine.from_db(cursor)
+                engine.warm_start(cursor)
+                cursor.close()
+        intake = StreamIntake(pool.connection, ModelRegistry(), velocity=engine.catch_up if engine else None)
+        send = intake.process_lines
+
+    start = time.time()
+    totals = {}
+    for totals, result in replay(args.path, send, args.batch_lines, args.start_line):
+        last = result['decisions'][-1]['line'] if result['decisions'] else None
+        print(f"✅ {totals['accepted']} accepted, {totals['rejected']} rejected, {totals['failed']} failed, "
+              f"{totals['alerts_created']} alerts (line {last}, {totals['accepted'] / (time.time() - start):.0f} events/s)")
+    print(f"✅ Replay finished: {totals}")
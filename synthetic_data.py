@@ -0,0 +1,242 @@
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from model_registry import FEATURE_COLUMNS
+
+# Benchmark scales: transactions plus the customers / accounts they are spread over
+SCALES = {
+    '10k': {'transactions': 10000, 'customers': 1000, 'accounts': 2000},
+    '1m': {'transactions': 1000000, 'customers': 50000, 'accounts': 100000},
+    '10m': {'transactions': 10000000, 'customers': 500000, 'accounts': 1000000},
+}
+
+# Transactions are generated in fixed chunks, each from its own seeded stream,
+# so the data depends only on (seed, rows) and not on how the caller reads it
+GENERATOR_CHUNK_ROWS = 100000
+
+# Kaggle creditcard.csv: 0.172% fraud, about one transaction every 0.6 seconds
+FRAUD_RATE = 0.00172
+MEAN_INTERARRIVAL_SECONDS = 0.6
+
+# Mean shift of the components that separate fraud in the Kaggle data
+# (strongly negative V14, V12, V10, V17, V3; positive V4, V11), so models and
+# rules trained on the synthetic rows have something to find
+FRAUD_SHIFT = {'v14': -6.0, 'v12': -5.0, 'v10': -4.5, 'v17': -4.0, 'v3': -4.0, 'v4': 3.5, 'v11': 3.0}
+
+# Same pools as GenerateRandomCustomers() in project.sql
+FIRST_NAMES = ['James', 'Mary', 'John', 'Patricia', 'Robert', 'Jennifer', 'Michael', 'Linda', 'William', 'Elizabeth',
+               'David', 'Barbara', 'Richard', 'Susan', 'Joseph', 'Jessica', 'Thomas', 'Sarah', 'Charles', 'Karen',
+               'Christopher', 'Nancy', 'Daniel', 'Lisa', 'Matthew', 'Margaret', 'Anthony', 'Betty', 'Donald',
+               'Sandra']
+LAST_NAMES = ['Smith', 'Johnson', 'Williams', 'Brown', 'Jones', 'Miller', 'Davis', 'Garcia', 'Rodriguez', 'Wilson',
+              'Martinez', 'Anderson', 'Taylor', 'Thomas', 'Hernandez', 'Moore', 'Martin', 'Jackson', 'Thompson',
+              'White', 'Lopez', 'Lee', 'Gonzalez', 'Harris', 'Clark', 'Lewis', 'Robinson', 'Walker', 'Perez', 'Hall']
+CITIES = [('New York', 'NY'), ('Los Angeles', 'CA'), ('Chicago', 'IL'), ('Houston', 'TX'), ('Phoenix', 'AZ'),
+          ('Philadelphia', 'PA'), ('San Antonio', 'TX'), ('Toronto', 'ON'), ('Dallas', 'TX'), ('Vancouver', 'BC')]
+STREET_TYPES = ['St', 'Ave', 'Blvd', 'Dr', 'Ln']
+
+# Independent streams per table, so e.g. more customers never changes the transactions
+_STREAM_CUSTOMERS, _STREAM_ACCOUNTS, _STREAM_CARDS, _STREAM_TRANSACTIONS = range(4)
+
+# Rows per multi-row INSERT while seeding the reference tables
+SEED_BATCH_ROWS = 5000
+
+
+def _rng(seed, stream, chunk=0):
+    return np.random.default_rng([seed, stream, chunk])
+
+
+# Kaggle-shaped transactions in chunks: Time, V1..V28, Amount, Class (the
+# creditcard.csv header). Time keeps increasing across chunks.
+def generate_transactions(rows, seed=0):
+    time_offset = 0
+    for chunk, start in enumerate(range(0, rows, GENERATOR_CHUNK_ROWS)):
+        rng = _rng(seed, _STREAM_TRANSACTIONS, chunk)
+        n = min(GENERATOR_CHUNK_ROWS, rows - start)
+        fraud = rng.random(n) < FRAUD_RATE
+        V = rng.normal(size=(n, 28))
+        for col, shift in FRAUD_SHIFT.items():
+            V[fraud, int(col[1:]) - 1] += shift
+        # Fraud amounts are spread wider: many small test charges and some large ones
+        amount = np.where(fraud, rng.lognormal(3.5, 1.8, n), rng.gamma(1.5, 60, n))
+        times = time_offset + np.cumsum(rng.exponential(MEAN_INTERARRIVAL_SECONDS, n))
+        time_offset = times[-1]
+
+        df = pd.DataFrame(V.round(6), columns=[f'V{i}' for i in range(1, 29)])
+        df.insert(0, 'Time', times.astype(np.int64))
+        df['Amount'] = amount.round(2)
+        df['Class'] = fraud.astype(np.int8)
+        yield df
+
+
+def write_kaggle_csv(path, rows, seed=0):
+    with open(path, 'w', newline='') as out:
+        for i, df in enumerate(generate_transactions(rows, seed)):
+            df.to_csv(out, header=i == 0, index=False, lineterminator='\n')
+
+
+# The same transactions as NDJSON events for stream_intake.py, one Kaggle-keyed
+# object per line with an event_id
+def ndjson_lines(rows, seed=0):
+    event_id = 0
+    for df in generate_transactions(rows, seed):
+        df.insert(0, 'event_id', np.arange(event_id, event_id + len(df)))
+        event_id += len(df)
+        yield from df.to_json(orient='records', lines=True).splitlines()
+
+
+def write_ndjson(path, rows, seed=0):
+    with open(path, 'w', newline='') as out:
+        for line in ndjson_lines(rows, seed):
+            out.write(line + '\n')
+
+
+# Features in FEATURE_COLUMNS order (float32) and labels (int8), as prediction.py trains on them
+def training_arrays(rows, seed=0):
+    X = np.empty((rows, len(FEATURE_COLUMNS)), dtype=np.float32)
+    y = np.empty(rows, dtype=np.int8)
+    filled = 0
+    for df in generate_transactions(rows, seed):
+        df.columns = [col.lower() for col in df.columns]
+        X[filled:filled + len(df)] = df[FEATURE_COLUMNS].to_numpy(dtype=np.float32)
+        y[filled:filled + len(df)] = df['class'].to_numpy()
+        filled += len(df)
+    return X, y
+
+
+# Customers rows; unique values (email) are derived from the id
+def generate_customers(first_id, count, seed=0):
+    rng = _rng(seed, _STREAM_CUSTOMERS, first_id)
+    ids = np.arange(first_id, first_id + count)
+    first = np.asarray(FIRST_NAMES)[rng.integers(0, len(FIRST_NAMES), count)]
+    last = np.asarray(LAST_NAMES)[rng.integers(0, len(LAST_NAMES), count)]
+    city = rng.integers(0, len(CITIES), count)
+    street = rng.integers(1, 10000, count)
+    street_type = np.asarray(STREET_TYPES)[rng.integers(0, len(STREET_TYPES), count)]
+    phone = rng.integers(0, 10000000, count)
+    zip_code = rng.integers(0, 100000, count)
+    return [(int(i), f, l, f'{f.lower()}.{l.lower()}.{i}@example.com', f'555-{p // 10000:03d}-{p % 10000:04d}',
+             f'{s} {l} {t}', CITIES[c][0], CITIES[c][1], f'{z:05d}')
+            for i, f, l, p, s, t, c, z in zip(ids, first, last, phone, street, street_type, city, zip_code)]
+
+
+# Accounts rows spread over customer ids [1, customers]; the type mix and
+# balances follow GenerateRandomAccounts()
+def generate_accounts(first_id, count, customers, seed=0):
+    rng = _rng(seed, _STREAM_ACCOUNTS, first_id)
+    ids = np.arange(first_id, first_id + count)
+    customer = rng.integers(1, customers + 1, count)
+    draw = rng.random(count)
+    account_type = np.where(draw < 0.6, 'checking', np.where(draw < 0.8, 'savings', 'credit'))
+    balance = (rng.random(count) * 10000).round(2)
+    credit_limit = np.where(rng.random(count) < 0.2, (5000 + rng.random(count) * 15000).round(2), 0.0)
+    return [(int(i), int(c), t, f'{i:010d}', float(b), float(cl))
+            for i, c, t, b, cl in zip(ids, customer, account_type, balance, credit_limit)]
+
+
+# One card per account (ingest assigns transactions to account/card pairs, so
+# every account needs one; GenerateRandomAccounts only gives cards to credit accounts)
+def generate_cards(first_id, account_ids, seed=0):
+    rng = _rng(seed, _STREAM_CARDS, first_id)
+    count = len(account_ids)
+    cvv = rng.integers(0, 1000, count)
+    expiry = pd.Timestamp.today().normalize() + pd.to_timedelta(rng.integers(30, 3 * 365, count), unit='D')
+    return [(first_id + k, int(a), f'4{first_id + k:015d}', e.date(), f'{v:03d}')
+            for k, (a, e, v) in enumerate(zip(account_ids, expiry, cvv))]
+
+
+def _insert(cursor, sql, rows, batch_size=SEED_BATCH_ROWS):
+    for i in range(0, len(rows), batch_size):
+        cursor.executemany(sql, rows[i:i + batch_size])
+
+
+def _max_id(cursor, table, column):
+    cursor.execute(f"SELECT COALESCE(MAX({column}), 0) FROM {table}")
+    return cursor.fetchone()[0]
+
+
+# Top up Customers, Accounts and CreditCards to the requested counts (the
+# Python counterpart of GenerateRandomCustomers / GenerateRandomAccounts).
+# Existing rows are kept, so running it again is cheap. Returns the rows added.
+def seed_reference_data(conn, customers, accounts, seed=0, batch_size=SEED_BATCH_ROWS):
+    cursor = conn.cursor()
+    added = {}
+    cursor.execute("SELECT COUNT(*) FROM Customers")
+    missing = customers - cursor.fetchone()[0]
+    first_id = _max_id(cursor, 'Customers', 'customer_id') + 1
+    rows = generate_customers(first_id, max(missing, 0), seed)
+    _insert(cursor, """
+        INSERT INTO Customers (customer_id, first_name, last_name, email, phone, address, city, state, zip_code)
+        VALUES (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+    """, rows, batch_size)
+    added['customers'] = len(rows)
+
+    max_customer = _max_id(cursor, 'Customers', 'customer_id')
+    cursor.execute("SELECT COUNT(*) FROM Accounts")
+    missing = accounts - cursor.fetchone()[0]
+    first_id = _max_id(cursor, 'Accounts', 'account_id') + 1
+    rows = generate_accounts(first_id, max(missing, 0), max_customer, seed)
+    _insert(cursor, """
+        INSERT INTO Accounts (account_id, customer_id, account_type, account_number, balance, credit_limit)
+        VALUES (%s, %s, %s, %s, %s, %s)
+    """, rows, batch_size)
+    added['accounts'] = len(rows)
+
+    cursor.execute("""
+        SELECT a.account_id
+        FROM Accounts a
+        LEFT JOIN CreditCards c ON c.account_id = a.account_id
+        WHERE c.card_id IS NULL
+        ORDER BY a.account_id
+    """)
+    without_card = [row[0] for row in cursor.fetchall()]
+    rows = generate_cards(_max_id(cursor, 'CreditCards', 'card_id') + 1, without_card, seed)
+    _insert(cursor, """
+        INSERT INTO CreditCards (card_id, account_id, card_number, expiry_date, cvv)
+        VALUES (%s, %s, %s, %s, %s)
+    """, rows, batch_size)
+    added['cards'] = len(rows)
+    conn.commit()
+    cursor.close()
+    return added
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description="Generate seeded Kaggle-shaped transactions and reference data")
+    parser.add_argument('--scale', choices=list(SCALES), default='10k')
+    parser.add_argument('--rows', type=int, help="transactions (default: the scale's)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--csv', help="write the transactions to this Kaggle-format CSV")
+    parser.add_argument('--ndjson', help="write the transactions to this file as NDJSON events")
+    parser.add_argument('--reference', action='store_true',
+                        help="top up Customers, Accounts and CreditCards in MySQL to the scale's counts")
+    args = parser.parse_args()
+
+    scale = SCALES[args.scale]
+    rows = args.rows or scale['transactions']
+    if args.csv:
+        start = time.perf_counter()
+        os.makedirs(os.path.dirname(args.csv) or '.', exist_ok=True)
+        write_kaggle_csv(args.csv, rows, args.seed)
+        seconds = time.perf_counter() - start
+        print(f"✅ {rows} transactions written to {args.csv} in {seconds:.1f}s ({rows / seconds:,.0f} rows/s)")
+    if args.ndjson:
+        start = time.perf_counter()
+        os.makedirs(os.path.dirname(args.ndjson) or '.', exist_ok=True)
+        write_ndjson(args.ndjson, rows, args.seed)
+        seconds = time.perf_counter() - start
+        print(f"✅ {rows} events written to {args.ndjson} in {seconds:.1f}s ({rows / seconds:,.0f} rows/s)")
+    if args.reference:
+        import mysql.connector
+        from config import DB_CONFIG
+
+        conn = mysql.connector.connect(**DB_CONFIG)
+        added = seed_reference_data(conn, scale['customers'], scale['accounts'], args.seed)
+        conn.close()
+        print(f"✅ Added {added['customers']} customers, {added['accounts']} accounts, {added['cards']} cards")
+    if not args.csv and not args.ndjson and not args.reference:
+        parser.error("nothing to do: pass --csv, --ndjson and/or --reference")
@@ -0,0 +1,254 @@
+import argparse
+import hashlib
+import itertools
+import json
+import math
+import os
+import time
+
+import numpy as np
+from joblib import Parallel, delayed
+from sklearn.ensemble import RandomForestClassifier
+from sklearn.metrics import average_precision_score, precision_score, recall_score
+from sklearn.model_selection import StratifiedKFold, train_test_split
+from sklearn.preprocessing import StandardScaler
+from imblearn.over_sampling import SMOTE
+
+from detection import ML_ALERT_CONFIDENCE
+from model_registry import MODELS_DIR, forest_predict_proba
+
+# smote_ratio: fraud/legit ratio after oversampling the training folds (None = no SMOTE)
+SEARCH_SPACE = {
+    'smote_ratio': [None, 0.1, 0.5, 1.0],
+    'n_estimators': [50, 100, 200],
+    'max_depth': [None, 10, 20],
+    'max_features': ['sqrt', 0.5],
+}
+
+TUNING_CACHE_DIR = os.path.join(MODELS_DIR, 'tuning_cache')
+
+# Rows in the first successive-halving rung; each later rung has eta times more
+TUNING_MIN_ROWS = 20000
+
+# Repetitions behind the single-row latency figure (median)
+LATENCY_REPEATS = 50
+
+
+def config_grid(space=SEARCH_SPACE):
+    names = list(space)
+    return [dict(zip(names, values)) for values in itertools.product(*(space[name] for name in names))]
+
+
+def config_label(config):
+    return ' '.join(f'{name}={value}' for name, value in config.items())
+
+
+# Identifies the training data, so cached results are never reused for other rows
+def data_fingerprint(X, y):
+    digest = hashlib.sha1()
+    digest.update(np.ascontiguousarray(X).data)
+    digest.update(np.ascontiguousarray(y).data)
+    return digest.hexdigest()
+
+
+# One CV fold of one config, in a worker process: scale, resample, fit, then
+# score the held-out fold at the alert threshold and time inference
+def evaluate_fold(X, y, train_idx, test_idx, config, seed):
+    scaler = StandardScaler()
+    X_train = scaler.fit_transform(X[train_idx])
+    X_test = scaler.transform(X[test_idx])
+    y_train, y_test = y[train_idx], y[test_idx]
+
+    if config['smote_ratio'] is not None:
+        try:
+            X_train, y_train = SMOTE(sampling_strategy=config['smote_ratio'],
+                                     random_state=seed).fit_resample(X_train, y_train)
+        except ValueError:
+            # The fold already has at least this fraud ratio (or too few fraud rows to interpolate)
+            pass
+
+    start = time.perf_counter()
+    clf = RandomForestClassifier(n_estimators=config['n_estimators'], max_depth=config['max_depth'],
+                                 max_features=config['max_features'], n_jobs=1, random_state=seed)
+    clf.fit(X_train, y_train)
+    fit_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    probs = clf.predict_proba(X_test)[:, list(clf.classes_).index(1)]
+    batch_seconds = time.perf_counter() - start
+
+    # The online path (ModelBundle.predict_proba for a single row)
+    row = np.ascontiguousarray(X_test[:1])
+    timings = []
+    for _ in range(LATENCY_REPEATS):
+        start = time.perf_counter()
+        forest_predict_proba(clf, row)
+        timings.append(time.perf_counter() - start)
+
+    preds = probs >= ML_ALERT_CONFIDENCE
+    return {
+        'average_precision': float(average_precision_score(y_test, probs)),
+        'precision': float(precision_score(y_test, preds, zero_division=0)),
+        'recall': float(recall_score(y_test, preds, zero_division=0)),
+        'fit_seconds': fit_seconds,
+        'batch_us_per_row': batch_seconds / len(test_idx) * 1e6,
+        'single_row_ms': float(np.median(timings)) * 1e3,
+    }
+
+
+# evaluate_fold tagged with the index of its config, so fold results can be
+# grouped by config whatever order they come back in
+def evaluate_tagged_fold(tag, *args):
+    return tag, evaluate_fold(*args)
+
+
+# Results of finished evaluations, one JSON file per (config, rows, folds, data)
+class ResultCache:
+    def __init__(self, path=TUNING_CACHE_DIR):
+        self.path = path
+        os.makedirs(path, exist_ok=True)
+
+    @staticmethod
+    def key(config, rows, folds, seed, fingerprint):
+        payload = json.dumps({'config': config, 'rows': rows, 'folds': folds, 'seed': seed, 'data': fingerprint},
+                             sort_keys=True)
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    def get(self, key):
+        try:
+            with open(os.path.join(self.path, key + '.json')) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+
+    def put(self, key, result):
+        tmp = os.path.join(self.path, key + '.json.tmp')
+        with open(tmp, 'w') as f:
+            json.dump(result, f)
+        os.replace(tmp, os.path.join(self.path, key + '.json'))
+
+
+# Configs no other config beats on recall, precision and single-row latency at once
+def pareto_front(results):
+    def dominates(a, b):
+        better_or_equal = (a['recall'] >= b['recall'] and a['precision'] >= b['precision']
+                           and a['single_row_ms'] <= b['single_row_ms'])
+        strictly = (a['recall'] > b['recall'] or a['precision'] > b['precision']
+                    or a['single_row_ms'] < b['single_row_ms'])
+        return better_or_equal and strictly
+
+    return [r for r in results if not any(dominates(other, r) for other in results if other is not r)]
+
+
+# Successive halving: every config is cross-validated on a small stratified
+# sample, the best 1/eta (by mean metric) move on to a sample eta times larger,
+# until one rung uses all rows. (config, fold) pairs run in parallel on n_jobs
+# cores; each forest fits single-threaded so the pool is not oversubscribed.
+def successive_halving(X, y, configs, folds=3, eta=3, min_rows=TUNING_MIN_ROWS, metric='average_precision',
+                       n_jobs=-1, seed=42, cache=None, progress=print):
+    fingerprint = data_fingerprint(X, y)
+    n = len(y)
+    rungs = []
+    budget = min(min_rows, n)
+    survivors = list(configs)
+    with Parallel(n_jobs=n_jobs) as parallel:
+        while True:
+            if budget < n:
+                rows = np.sort(train_test_split(np.arange(n), train_size=budget, stratify=y, random_state=seed)[0])
+            else:
+                rows = np.arange(n)
+            X_rung, y_rung = X[rows], y[rows]
+            splits = list(StratifiedKFold(folds, shuffle=True, random_state=seed).split(X_rung, y_rung))
+
+            keys = [cache.key(config, budget, folds, seed, fingerprint) if cache else None for config in survivors]
+            cached = [cache.get(key) if cache else None for key in keys]
+            pending = [i for i, result in enumerate(cached) if result is None]
+            start = time.perf_counter()
+            fold_results = {i: [] for i in pending}
+            for i, fold in parallel(delayed(evaluate_tagged_fold)(i, X_rung, y_rung, train_idx, test_idx,
+                                                                  survivors[i], seed)
+                                    for i in pending for train_idx, test_idx in splits):
+                fold_results[i].append(fold)
+
+            results = []
+            for i, config in enumerate(survivors):
+                if cached[i] is None:
+                    per_fold = fold_results[i]
+                    result = {'config': config, 'rows': budget,
+                              **{name: float(np.mean([fold[name] for fold in per_fold])) for name in per_fold[0]}}
+                    if cache:
+                        cache.put(keys[i], result)
+                    cached[i] = result
+                results.append(cached[i])
+            results.sort(key=lambda r: r[metric], reverse=True)
+            for result in pareto_front(results):
+                result['pareto'] = True
+            rungs.append({'rows': budget, 'configs': len(survivors), 'evaluated': len(pending),
+                          'seconds': round(time.perf_counter() - start, 3), 'results': results})
+            if progress:
+                progress(f"✅ Rung {len(rungs)}: {len(survivors)} configs on {budget} rows "
+                         f"({len(survivors) - len(pending)} cached) in {rungs[-1]['seconds']:.1f}s, "
+                         f"best {metric} {results[0][metric]:.4f}")
+
+            if budget >= n or len(survivors) == 1:
+                return rungs
+            survivors = [r['config'] for r in results[:max(1, math.ceil(len(results) / eta))]]
+            budget = min(budget * eta, n)
+
+
+# The largest rung that still compares several configs
+def print_report(rungs, metric):
+    final = next((rung for rung in reversed(rungs) if len(rung['results']) > 1), rungs[-1])
+    print(f"\nRung {rungs.index(final) + 1} ({final['rows']} rows), ranked by {metric}; * = Pareto-optimal "
+          f"(recall, precision at confidence >= {ML_ALERT_CONFIDENCE} vs single-row latency)")
+    print(f"{'':2}{metric:>18} {'recall':>7} {'precision':>9} {'1-row ms':>9} {'batch us/row':>12}  config")
+    for r in final['results']:
+        print(f"{'*' if r.get('pareto') else ' ':2}{r[metric]:>18.4f} {r['recall']:>7.3f} {r['precision']:>9.3f} "
+              f"{r['single_row_ms']:>9.3f} {r['batch_us_per_row']:>12.2f}  {config_label(r['config'])}")
+
+
+if __name__ == '__main__':
+    import mysql.connector
+    from config import DB_CONFIG
+    from feature_store import FeatureStore
+    from prediction import FULL_ORDER, FULL_WHERE, load_training_data
+
+    parser = argparse.ArgumentParser(description="Search forest and resampling settings with successive halving")
+    parser.add_argument('--from-store', action='store_true', help="read the local feature store instead of MySQL")
+    parser.add_argument('--rows', type=int, help="cap on labeled rows (the most recent ones)")
+    parser.add_argument('--folds', type=int, default=3)
+    parser.add_argument('--eta', type=int, default=3, help="keep 1/eta of the configs per rung")
+    parser.add_argument('--min-rows', type=int, default=TUNING_MIN_ROWS)
+    parser.add_argument('--metric', default='average_precision', choices=['average_precision', 'recall', 'precision'])
+    parser.add_argument('--n-jobs', type=int, default=-1)
+    parser.add_argument('--cache-dir', default=TUNING_CACHE_DIR)
+    parser.add_argument('--no-cache', action='store_true')
+    parser.add_argument('--report', default=os.path.join(MODELS_DIR, 'tuning_report.json'))
+    args = parser.parse_args()
+
+    conn = mysql.connector.connect(**DB_CONFIG)
+    if args.from_store:
+        store = FeatureStore()
+        store.refresh(conn)
+        X, y = store.training_arrays(args.rows)
+    else:
+        X, y = load_training_data(conn, where=FULL_WHERE, order=FULL_ORDER, limit=args.rows)
+    conn.close()
+    print(f"✅ Loaded {len(y)} labeled rows, {int(y.sum())} fraud")
+
+    configs = config_grid()
+    cache = None if args.no_cache else ResultCache(args.cache_dir)
+    start = time.perf_counter()
+    rungs = successive_halving(X, y, configs, folds=args.folds, eta=args.eta, min_rows=args.min_rows,
+                               metric=args.metric, n_jobs=args.n_jobs, cache=cache)
+    print_report(rungs, args.metric)
+
+    best = rungs[-1]['results'][0]['config']
+    print(f"\n✅ Search finished in {time.perf_counter() - start:.1f}s; best config: {config_label(best)}")
+    print(f"   python prediction.py --full --params {args.report}")
+
+    os.makedirs(os.path.dirname(args.report) or '.', exist_ok=True)
+    with open(args.report, 'w') as f:
+        json.dump({'rows': int(len(y)), 'fraud': int(y.sum()), 'metric': args.metric, 'folds': args.folds,
+                   'eta': args.eta, 'alert_confidence': ML_ALERT_CONFIDENCE, 'best': best, 'rungs': rungs}, f, indent=2)
+    print(f"✅ Report written to {args.report}")